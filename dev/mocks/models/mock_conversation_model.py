@@ -13,6 +13,13 @@ class MockConversationModel(ConversationModelProtocol):
         self.client = client  # Not used in mock but kept for compatibility
         self.messages = []
         self.is_responding = False
+        # Messages dropped by limit_messages(), for message_count
+        self._trimmed_count = 0
+
+    @property
+    def message_count(self) -> int:
+        """Number of messages added since the last reset, including trimmed ones."""
+        return self._trimmed_count + len(self.messages)
 
     async def generate_response(self, user_message: str) -> AsyncGenerator[str, None]:
         """
@@ -47,7 +54,14 @@ class MockConversationModel(ConversationModelProtocol):
         else:
             return f"「{user_message}」についてお答えします。これはテスト環境での模擬応答です。"
 
-    async def respond_to_user_message(self, user_message: str) -> str:
+    async def respond_to_user_message(
+        self,
+        user_message: str,
+        summary: str = "",
+        vector_search_content: str = "",
+        page_content: str = "",
+        cancel_token=None,
+    ) -> str:
         """
         Generate a response to user message with automatic state management.
         """
@@ -58,6 +72,32 @@ class MockConversationModel(ConversationModelProtocol):
         finally:
             self.is_responding = False
 
+    async def stream_response_to_user_message(
+        self,
+        user_message: str,
+        summary: str = "",
+        vector_search_content: str = "",
+        page_content: str = "",
+        cancel_token=None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Mock streaming of the visible answer.
+        """
+        self.is_responding = True
+        try:
+            response = ""
+            async for chunk in self.generate_response(user_message):
+                response += chunk
+                yield response.strip()
+        finally:
+            self.is_responding = False
+
+    def schedule_compaction(self):
+        """
+        Mock compaction (nothing to summarize).
+        """
+        return None
+
     def add_user_message(self, content: str) -> None:
         """
         Add a user message to the chat history.
@@ -70,12 +110,19 @@ class MockConversationModel(ConversationModelProtocol):
         """
         self.messages.append({"role": "ai", "content": content})
 
+    def cancel(self, reason: str = "cancelled") -> None:
+        """
+        Mock cancellation (nothing is running remotely).
+        """
+        self.is_responding = False
+
     def reset(self) -> None:
         """
         Reset the chat history.
         """
         self.messages = []
         self.is_responding = False
+        self._trimmed_count = 0
 
     def should_respond(self) -> bool:
         """
@@ -107,4 +154,5 @@ class MockConversationModel(ConversationModelProtocol):
         Limit the number of messages in the conversation.
         """
         if len(self.messages) > max_messages:
+            self._trimmed_count += len(self.messages) - max_messages
             self.messages = self.messages[-max_messages:]
@@ -0,0 +1,24 @@
+import hashlib
+
+import numpy as np
+
+
+class MockEmbeddingModel:
+    """
+    Deterministic stand-in for SentenceTransformer, so benchmarks and load tests
+    run offline.
+
+    Produces unit vectors of the same dimension as all-MiniLM-L6-v2.
+    """
+
+    dimension = 384
+
+    def __init__(self, model_name_or_path: str = None):
+        self.model_name_or_path = model_name_or_path  # Not used in mock
+
+    def encode(self, texts: list[str], **kwargs) -> np.ndarray:
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8")).digest()[:8])
+            vectors[i] = np.random.default_rng(seed).standard_normal(self.dimension)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
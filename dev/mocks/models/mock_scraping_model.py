@@ -73,10 +73,23 @@ class MockScrapingModel(ScrapingModelProtocol):
         if "blocked.com" in url:
             raise ValueError("指定のホストは許可されていません。")
 
-    def scrape(self, url: str, timeout: tuple = (10, 30)) -> str:
+    def scrape(self, url: str, timeout: tuple = (30, 90)) -> str:
         """
         Mock scraping that returns predefined content.
 
+        Args:
+            url: The URL to scrape
+            timeout: Ignored in mock
+
+        Returns:
+            Mock content for the URL
+        """
+        return self.fetch(url, timeout=timeout)
+
+    def fetch(self, url: str, timeout: tuple = (30, 90)) -> str:
+        """
+        Mock retrieval of the page text, as used by the ingestion jobs.
+
         Args:
             url: The URL to scrape
             timeout: Ignored in mock
@@ -1,9 +1,43 @@
-import asyncio
+import functools
 import html
+import logging
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 from src.models import ConversationModel
+from src.services import (
+    GenerationCancelledError,
+    IngestionOrchestrator,
+    RenderScheduler,
+    StageState,
+    asset_registry,
+    async_runtime,
+    disconnect_watcher,
+    llm_scheduler,
+    metrics,
+    session_memory,
+    tracer,
+)
+
+logger = logging.getLogger(__name__)
+
+QUERY_PAGE_CSS = ("css/query_page.css",)
+
+STAGE_LABELS = {
+    "scrape": "取得",
+    "summarize": "要約",
+    "embed": "解析",
+}
+
+STATE_ICONS = {
+    StageState.PENDING: "⏸️",
+    StageState.RUNNING: "⏳",
+    StageState.DONE: "✅",
+    StageState.FAILED: "⚠️",
+    StageState.CANCELLED: "⏹️",
+}
 
 
 def render_query_page():
@@ -16,15 +50,11 @@ def render_query_page():
     # Get models from session_state
     summarization_model = st.session_state.get("summarization_model")
     scraping_model = st.session_state.get("scraping_model")
-    vector_store = st.session_state.get("vector_store")
+    orchestrator = st.session_state.get("ingestion_orchestrator")
+    session_id = st.session_state.get("session_id", "")
 
-    # Load CSS for query page styling
-    try:
-        with open("src/static/css/query_page.css", "r", encoding="utf-8") as f:
-            css_content = f.read()
-        st.markdown(f"<style>{css_content}</style>", unsafe_allow_html=True)
-    except FileNotFoundError:
-        pass  # CSS file not found, continue without styling
+    # Inject the query page styles (cached in memory, one <style> block)
+    st.markdown(asset_registry.style_tag(*QUERY_PAGE_CSS), unsafe_allow_html=True)
 
     st.title("Query Page")
 
@@ -43,10 +73,14 @@ def render_query_page():
         else:
             st.markdown(f"**対象URL**: [{target_url}]({target_url})")
 
+    # Display per-stage ingestion status (summary and embedding run in parallel)
+    status_placeholder = st.empty()
+    if orchestrator:
+        _render_ingestion_status(status_placeholder, orchestrator)
+
     # Debug component: Display scraped content
     if scraped_content:
-        with st.expander("取得したコンテンツ", expanded=False):
-            st.write(scraped_content)
+        _render_scraped_content()
 
     # Display thinking content if available
     if current_thinking.strip():
@@ -72,53 +106,51 @@ def render_query_page():
                 # Create placeholders for streaming content
                 thinking_placeholder = st.empty()
                 summary_placeholder = st.empty()
+                if orchestrator:
+                    orchestrator.mark_running("summarize")
+
+                # 連続するチャンクをまとめて、一定間隔でのみ描画する
+                scheduler = _create_render_scheduler(
+                    _make_summary_renderer(
+                        thinking_placeholder,
+                        summary_placeholder,
+                        conversation_model,
+                    )
+                )
 
-                # Create new event loop for synchronous processing
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-
-                try:
-                    # Get async generator
-                    async_gen = summarization_model.stream_summary(scraped_content)
-
-                    # Process each chunk synchronously
-                    while True:
-                        try:
-                            thinking_content, summary_content = loop.run_until_complete(
-                                anext(async_gen)
-                            )
-
-                            # Update placeholders with streamed content
-                            if thinking_content.strip():
-                                with thinking_placeholder.container():
-                                    st.markdown("### 🤔 思考過程")
-                                    with st.expander("思考プロセス", expanded=True):
-                                        st.markdown(thinking_content)
-
-                            if summary_content.strip():
-                                with summary_placeholder.container():
-                                    st.markdown("### 📝 要約コンテンツ")
-                                    _, clean_summary_content = (
-                                        conversation_model.extract_think_content(
-                                            summary_content
-                                        )
-                                    )
-                                    st.markdown(clean_summary_content)
-
-                            # Small delay to allow UI updates
-                            import time
-
-                            time.sleep(0.01)
-
-                        except StopAsyncIteration:
-                            break
-
-                finally:
-                    loop.close()
+                # Process each chunk synchronously
+                queue_placeholder = st.empty()
+                # 取り込みと同じ相関IDで要約のスパンを記録する
+                job = orchestrator.get_job() if orchestrator else None
+                with (
+                    tracer.trace("summarize", trace_id=job.job_id if job else None),
+                    disconnect_watcher.watch(
+                        _client_id(),
+                        functools.partial(summarization_model.cancel, "disconnected"),
+                    ),
+                ):
+                    for thinking_content, summary_content in async_runtime.iterate(
+                        summarization_model.stream_summary(scraped_content),
+                        on_wait=_make_queue_notice(queue_placeholder, session_id),
+                    ):
+                        if orchestrator and (thinking_content or summary_content):
+                            orchestrator.mark_first_output("summarize")
+                        scheduler.update(thinking_content, summary_content)
+
+                scheduler.close()
+                _record_render_stats(scheduler)
+                if orchestrator:
+                    orchestrator.mark_done("summarize")
+                    _render_ingestion_status(status_placeholder, orchestrator)
+            except GenerationCancelledError:
+                # New URL などで中断された場合はエラーを表示しない
+                logger.info("Summary generation was cancelled")
             except Exception as e:
                 summarization_model.last_error = (
                     f"要約の生成中にエラーが発生しました: {str(e)}"
                 )
+                if orchestrator:
+                    orchestrator.mark_failed("summarize", str(e))
                 st.error(summarization_model.last_error)
 
     # Add divider before chat if we have content
@@ -126,86 +158,419 @@ def render_query_page():
         st.markdown("---")
 
     # --- Chat Logic --- #
-    _render_chat_messages(
-        conversation_model.messages, is_thinking=conversation_model.is_responding
-    )
+    _render_chat_history()
+    _render_chat_area()
 
-    prompt = st.chat_input(
-        "このWebページへの質問", disabled=conversation_model.is_responding
-    )
 
-    if prompt:
-        conversation_model.add_user_message(prompt)
-        st.rerun()
+@st.fragment
+def _render_scraped_content():
+    """
+    Show the scraped page text on demand, one page at a time.
+
+    Nothing is sent to the browser until the viewer is opened, and opening it or
+    changing the page reruns only this fragment. The full text is attached to the
+    download button only after the user asks for it, until the viewer is closed.
+    """
+    # 表示の切り替えやページ移動はこのフラグメントだけを再実行するため、
+    # 退避されたセッションはここで復元する
+    session_memory.touch(st.session_state.get("session_id", ""))
+    # フラグメントの引数はStreamlitに保持されるため、本文は引数で受け取らない
+    # (退避されたセッションの本文がメモリに残ってしまう)
+    scraping_model = st.session_state.get("scraping_model")
+    scraped_content = scraping_model.content if scraping_model else None
+    if not scraped_content:
+        return
+    if not st.toggle(
+        "取得したコンテンツを表示",
+        key="show_scraped_content",
+        # 閉じたら準備済みの全文も送らないようにする
+        on_change=_set_scraped_content_download_ready,
+        args=(False,),
+    ):
+        return
+
+    page_size = int(st.secrets.get("SCRAPED_CONTENT_PAGE_SIZE", 5000))
+    page_count = max(1, -(-len(scraped_content) // page_size))
+    with st.container(border=True):
+        page = 1
+        if page_count > 1:
+            page = st.number_input(
+                f"ページ (全{page_count}ページ)",
+                min_value=1,
+                max_value=page_count,
+                step=1,
+                key="scraped_content_page",
+            )
+        st.write(scraped_content[(page - 1) * page_size : page * page_size])
+        # 全文はダウンロードを求められた時だけ渡し、表示中の再実行では送らない
+        if st.session_state.get("scraped_content_download_ready"):
+            st.download_button(
+                "全文をダウンロード",
+                data=scraped_content,
+                file_name="scraped_content.txt",
+                mime="text/plain",
+                key="download_scraped_content",
+                on_click="ignore",
+            )
+        else:
+            st.button(
+                "全文のダウンロードを準備",
+                key="prepare_scraped_content_download",
+                on_click=_set_scraped_content_download_ready,
+                args=(True,),
+            )
+
+
+def _set_scraped_content_download_ready(ready: bool):
+    st.session_state.scraped_content_download_ready = ready
+
+
+def _render_chat_history():
+    """
+    Render the chat history once per full script run.
 
-    # If the last message is from the user and we should respond
-    if conversation_model.should_respond():
+    The history is outside the chat fragment, so answering a question (a fragment
+    rerun) does not send it to the browser again. The chat fragment shows the
+    messages added since this run.
+    """
+    conversation_model: ConversationModel = st.session_state.get("conversation_model")
+
+    # 長い会話は直近のメッセージだけを表示し、古いものは必要な時に読み込む
+    window_size = int(st.secrets.get("CHAT_WINDOW_SIZE", 20))
+    visible_count = st.session_state.get("chat_visible_messages", window_size)
+    messages = conversation_model.messages
+    hidden_count = max(0, len(messages) - visible_count)
+    if hidden_count:
+        st.button(
+            f"以前のメッセージを表示 (残り{hidden_count}件)",
+            key="load_older_messages",
+            use_container_width=True,
+            on_click=_show_older_messages,
+            args=(visible_count + window_size,),
+        )
+    _render_chat_messages(st.container(gap=None), messages[hidden_count:])
+    st.session_state.chat_rendered_until = conversation_model.message_count
+
+
+@st.fragment
+def _render_chat_area():
+    """
+    Render the chat input and answer new questions.
+
+    Runs as a fragment: submitting a question reruns only the chat area, and the
+    answer is generated and rendered in that same run instead of through several
+    full-page reruns. Only the messages added since the last full run are sent;
+    once there are CHAT_FRAGMENT_MAX_MESSAGES of them, one full run moves them
+    into the history.
+    """
+    metrics.increment("chat_fragment_runs_total")
+    # フラグメントの再実行ではinitialize_sessionを通らないため、ここで利用を記録する
+    session_memory.touch(st.session_state.get("session_id", ""))
+    conversation_model: ConversationModel = st.session_state.get("conversation_model")
+
+    # ページ全体の実行より後に追加されたメッセージ
+    new_messages_container = st.container(gap=None)
+    # 回答中は思考中バブルを表示し、ストリーミングで回答に置き換える
+    response_placeholder = st.empty()
+    queue_placeholder = st.empty()
+
+    # 回答は同じ実行でストリーミングするため、入力欄を描画する前に回答中にする
+    # (回答中に送信されるとフラグメントが再実行され、回答が途中で止まる)
+    respond = conversation_model.should_respond()
+    if respond:
         conversation_model.is_responding = True
-        st.rerun()
+    st.chat_input(
+        "このWebページへの質問",
+        key="chat_prompt",
+        disabled=conversation_model.is_responding,
+        on_submit=_add_question,
+    )
+
+    try:
+        _render_chat_messages(
+            new_messages_container, _messages_since_full_run(conversation_model)
+        )
 
-    # Handle AI response generation
-    if conversation_model.is_responding:
+        # If the last message is from the user and we should respond
+        if respond:
+            count_before = conversation_model.message_count
+            response_placeholder.markdown(
+                _chat_container_html(_thinking_bubble_html()), unsafe_allow_html=True
+            )
+            _answer_last_message(
+                conversation_model, response_placeholder, queue_placeholder
+            )
+            queue_placeholder.empty()
+            response_placeholder.empty()
+            answered = conversation_model.message_count - count_before
+            _render_chat_messages(
+                new_messages_container,
+                conversation_model.messages[
+                    len(conversation_model.messages) - answered :
+                ],
+            )
+    finally:
+        # 描画中の例外で入力欄が無効のまま残らないようにする
+        if respond:
+            conversation_model.is_responding = False
+    if respond:
+        max_new_messages = int(st.secrets.get("CHAT_FRAGMENT_MAX_MESSAGES", 6))
+        if len(_messages_since_full_run(conversation_model)) >= max_new_messages:
+            # 溜まったメッセージを履歴に移し、フラグメントの再実行を軽く保つ
+            st.rerun()
+        # 無効のまま描画した入力欄を、チャット部分だけ再実行して有効に戻す
         try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            # ページ全体の実行中に回答した場合はページごと再実行する
+            st.rerun()
+
+
+def _messages_since_full_run(conversation_model: ConversationModel) -> list[dict]:
+    """The messages added after the history was last rendered by a full run."""
+    messages = conversation_model.messages
+    message_count = conversation_model.message_count
+    rendered_until = st.session_state.get("chat_rendered_until", 0)
+    if rendered_until > message_count:
+        # リセットで件数が巻き戻った場合は、残っているメッセージをすべて返す
+        rendered_until = 0
+    new_count = min(len(messages), message_count - rendered_until)
+    return messages[len(messages) - new_count :]
+
+
+def _add_question():
+    """on_submit callback: add the question before the chat fragment reruns."""
+    prompt = st.session_state.get("chat_prompt")
+    if prompt:
+        st.session_state.conversation_model.add_user_message(prompt)
+
+
+def _show_older_messages(visible_count: int):
+    st.session_state.chat_visible_messages = visible_count
+
+
+def _answer_last_message(
+    conversation_model: ConversationModel, response_placeholder, queue_placeholder
+):
+    """Generate the answer to the last user message and add it to the history."""
+    scraping_model = st.session_state.get("scraping_model")
+    summarization_model = st.session_state.get("summarization_model")
+    vector_store = st.session_state.get("vector_store")
+    orchestrator = st.session_state.get("ingestion_orchestrator")
+    session_id = st.session_state.get("session_id", "")
+    page_summary = summarization_model.summary if summarization_model else ""
+
+    conversation_model.is_responding = True
+    try:
+        # 質問ごとの相関IDで検索から生成までのスパンをまとめる
+        with tracer.trace("question", session=session_id):
             user_query = conversation_model.messages[-1]["content"]
             # Get page content from scraping model
             page_content = scraping_model.content if scraping_model else ""
-            # Retrieve relevant context from vector search
-            searched_content = ""
-            if vector_store:
-                searched_content = vector_store.search(user_query)
-
-            response = asyncio.run(
-                conversation_model.respond_to_user_message(
-                    user_query,
-                    summary=page_summary,
-                    vector_search_content=searched_content,
-                    page_content=page_content,
-                )
-            )
-            _, clean_response = conversation_model.extract_think_content(response)
-            conversation_model.add_ai_message(clean_response)
-        except Exception as e:
-            error_message = f"エラーが発生しました: {e}"
-            conversation_model.last_error = error_message
-            _, clean_error = conversation_model.extract_think_content(error_message)
-            conversation_model.add_ai_message(clean_error)
-        finally:
-            conversation_model.is_responding = False
-            st.rerun()
 
+            # 会話履歴に依存しない質問は、ページ単位の回答キャッシュを参照する
+            answer_cache = st.session_state.get("answer_cache")
+            cache_page_key = None
+            query_vec = None
+            cached_answer = None
+            if (
+                answer_cache
+                and vector_store
+                and answer_cache.is_history_independent(user_query)
+            ):
+                cache_page_key = answer_cache.page_key(
+                    page_content, namespace=vector_store.model_name
+                )
+                query_vec = vector_store.encode_query(user_query)
+                cached_answer = answer_cache.lookup(cache_page_key, query_vec)
+
+            if cached_answer is not None:
+                conversation_model.add_ai_message(cached_answer)
+            else:
+                # Retrieve relevant context from vector search
+                searched_content = ""
+                if vector_store:
+                    # 埋め込みがまだ作成中であれば完了を待つ
+                    if orchestrator and not orchestrator.wait_for_embeddings(timeout=0):
+                        with (
+                            st.spinner("ページの解析を完了しています..."),
+                            tracer.span("wait_for_embeddings"),
+                        ):
+                            orchestrator.wait_for_embeddings(
+                                timeout=float(
+                                    st.secrets.get("EMBEDDING_WAIT_TIMEOUT", 60)
+                                )
+                            )
+                    searched_content = vector_store.search(
+                        user_query, query_vec=query_vec
+                    )
+
+                with disconnect_watcher.watch(
+                    _client_id(),
+                    functools.partial(conversation_model.cancel, "disconnected"),
+                ):
+                    response = _stream_chat_response(
+                        response_placeholder,
+                        conversation_model.stream_response_to_user_message(
+                            user_query,
+                            summary=page_summary,
+                            vector_search_content=searched_content,
+                            page_content=page_content,
+                        ),
+                        on_wait=_make_queue_notice(queue_placeholder, session_id),
+                    ).strip()
+                conversation_model.add_ai_message(response)
+
+                # 履歴なしで生成した回答のみ共有キャッシュに保存する
+                is_first_question = len(conversation_model.messages) == 2
+                if cache_page_key and is_first_question and response:
+                    answer_cache.store(cache_page_key, user_query, query_vec, response)
+
+            # 回答を表示した後、古い会話をバックグラウンドで要約しておく
+            conversation_model.schedule_compaction()
+    except GenerationCancelledError:
+        logger.info("Chat answer was cancelled")
+    except Exception as e:
+        error_message = f"エラーが発生しました: {e}"
+        conversation_model.last_error = error_message
+        _, clean_error = conversation_model.extract_think_content(error_message)
+        conversation_model.add_ai_message(clean_error)
+    finally:
+        conversation_model.is_responding = False
+
+
+def _render_ingestion_status(placeholder, orchestrator: IngestionOrchestrator):
+    """Render the status of each ingestion stage on a single caption line."""
+    parts = []
+    for stage in IngestionOrchestrator.STAGES:
+        status = orchestrator.get_status(stage)
+        parts.append(f"{STATE_ICONS[status.state]} {STAGE_LABELS[stage]}")
+    placeholder.caption(" ・ ".join(parts))
+
+
+def _make_summary_renderer(
+    thinking_placeholder, summary_placeholder, conversation_model
+):
+    """
+    Build the render callback for streamed summaries.
 
-def _render_chat_messages(messages, is_thinking=False):
+    Only the parts that changed since the previous flush are re-rendered, and the
+    number of bytes sent to the browser is returned for instrumentation.
     """
-    Render all chat messages with a single style block by building a single HTML string.
-    Also renders the thinking bubble if is_thinking is True.
+    rendered = {"thinking": "", "summary": ""}
+
+    def render(thinking_content: str, summary_content: str) -> int:
+        bytes_sent = 0
+        if thinking_content.strip() and thinking_content != rendered["thinking"]:
+            with thinking_placeholder.container():
+                st.markdown("### 🤔 思考過程")
+                with st.expander("思考プロセス", expanded=True):
+                    st.markdown(thinking_content)
+            rendered["thinking"] = thinking_content
+            bytes_sent += len(thinking_content.encode("utf-8"))
+
+        if summary_content.strip() and summary_content != rendered["summary"]:
+            with summary_placeholder.container():
+                st.markdown("### 📝 要約コンテンツ")
+                _, clean_summary_content = conversation_model.extract_think_content(
+                    summary_content
+                )
+                st.markdown(clean_summary_content)
+            rendered["summary"] = summary_content
+            bytes_sent += len(clean_summary_content.encode("utf-8"))
+
+        return bytes_sent
+
+    return render
+
+
+def _record_render_stats(scheduler: RenderScheduler):
+    """Record flush and payload statistics of a streamed summary."""
+    metrics.increment("summary_renders_total")
+    metrics.increment("summary_render_flushes_total", scheduler.flush_count)
+    metrics.increment("summary_render_bytes_total", scheduler.bytes_sent)
+    st.session_state.summary_render_stats = {
+        "chunks": scheduler.chunk_count,
+        "flushes": scheduler.flush_count,
+        "bytes_sent": scheduler.bytes_sent,
+    }
+    logger.info(
+        "Summary rendered: %d chunks, %d flushes, %d bytes",
+        scheduler.chunk_count,
+        scheduler.flush_count,
+        scheduler.bytes_sent,
+    )
+
+
+def _client_id() -> str:
+    """Id of the browser session running this script, for the disconnect watcher."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else ""
+
+
+def _make_queue_notice(placeholder, session_id: str):
+    """Build an on_wait callback showing how many LLM requests are ahead."""
+
+    def show_position():
+        ahead = llm_scheduler.position(session_id)
+        if ahead:
+            placeholder.caption(f"⏳ 順番待ち中: 前に{ahead}件のリクエストがあります")
+        else:
+            placeholder.empty()
+
+    return show_position
+
+
+def _create_render_scheduler(render) -> RenderScheduler:
+    """Create a RenderScheduler using the configured flush thresholds."""
+    return RenderScheduler(
+        render,
+        flush_interval_ms=int(st.secrets.get("STREAM_FLUSH_INTERVAL_MS", 100)),
+        flush_chars=int(st.secrets.get("STREAM_FLUSH_CHARS", 200)),
+    )
+
+
+def _stream_chat_response(placeholder, answer_stream, on_wait=None) -> str:
     """
-    messages_html_list = []
-    for msg in messages:
-        if msg["role"] == "user":
-            messages_html_list.append(
-                f"""
-    <div class="user-message">
-        <div class="user-content">
-            {html.escape(msg["content"]).replace(chr(10), '<br>')}
-        </div>
-    </div>
+    Stream an answer into the chat bubble placeholder.
+
+    Args:
+        placeholder: The st.empty() slot holding the answer bubble
+        answer_stream: Async generator yielding the visible answer so far
+        on_wait: Called periodically while waiting for the next part of the answer
+
+    Returns:
+        str: The complete visible answer
     """
-            )
-        else:
-            messages_html_list.append(
-                f"""
-    <div class="ai-message">
-        <div class="ai-content">
-            {html.escape(msg["content"]).replace(chr(10), '<br>')}
+
+    def render(answer: str) -> int:
+        answer_html = _chat_container_html(_message_html("ai", answer))
+        placeholder.markdown(answer_html, unsafe_allow_html=True)
+        return len(answer_html.encode("utf-8"))
+
+    scheduler = _create_render_scheduler(render)
+    answer = ""
+    for answer in async_runtime.iterate(answer_stream, on_wait=on_wait):
+        scheduler.update(answer)
+    scheduler.close()
+    return answer
+
+
+def _message_html(role: str, content: str) -> str:
+    """Build the HTML of a single chat bubble."""
+    css_class = "user" if role == "user" else "ai"
+    return f"""
+    <div class="{css_class}-message">
+        <div class="{css_class}-content">
+            {html.escape(content).replace(chr(10), '<br>')}
         </div>
     </div>
     """
-            )
 
-    # is_thinkingがTrueの場合、思考中バブルをリストの末尾に追加
-    if is_thinking:
-        messages_html_list.append(
-            """
+
+def _thinking_bubble_html() -> str:
+    """Build the HTML of the bubble shown while waiting for the first token."""
+    return """
     <div class="thinking-message">
         <div class="thinking-content">
             <div style="display: flex; align-items: center;">
@@ -216,14 +581,23 @@ def _render_chat_messages(messages, is_thinking=False):
         </div>
     </div>
     """
-        )
 
-    messages_html_string = "".join(messages_html_list)
 
-    full_html = f"""
+def _chat_container_html(messages_html: str) -> str:
+    return f"""
     <div class="chat-container">
-    {messages_html_string}
+    {messages_html}
     </div>
     """
 
-    st.markdown(full_html, unsafe_allow_html=True)
+
+def _render_chat_messages(container, messages):
+    """
+    Append the given chat messages to the container, one element per message.
+    """
+    for message in messages:
+        container.markdown(
+            _chat_container_html(_message_html(message["role"], message["content"])),
+            unsafe_allow_html=True,
+        )
+    metrics.increment("chat_messages_rendered_total", len(messages))
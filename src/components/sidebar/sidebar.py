@@ -30,7 +30,7 @@ def render_sidebar(page: Page = None):
                 key="new_chat_btn",
                 use_container_width=True,
             ):
-                st.session_state.conversation_model.reset()
+                app_router.reset_chat()
                 st.rerun()
 
         elif current_page == Page.INPUT:
@@ -1,5 +1,18 @@
+import time
+
 import streamlit as st
 
+from src.services import StageState, asset_registry, session_memory
+
+URL_INPUT_PAGE_CSS = (
+    "css/base/root.css",
+    "css/url_input_page.css",
+    "css/base/custom-button.css",
+)
+
+# Interval at which the ingestion job status is polled (seconds)
+JOB_POLL_INTERVAL = 0.5
+
 
 def render_url_input_page():
     """Render complete URL input page with header, description, form, and footer"""
@@ -17,37 +30,28 @@ def render_url_input_form():
     """URL入力フォームを描画し、状態に基づいて処理を制御する"""
     app_router = st.session_state.app_router
     scraping_model = st.session_state.scraping_model
+    orchestrator = st.session_state.ingestion_orchestrator
+    # 結果をまだ画面に反映していないジョブ(完了・失敗・キャンセル時に外される)
+    job_id = st.session_state.get("ingestion_job_id")
+    job = orchestrator.get_job(job_id) if job_id else None
+    is_ingesting = job is not None
 
-    # Load CSS for URL input page styling
-    css_files = [
-        "src/static/css/base/root.css",
-        "src/static/css/url_input_page.css",
-        "src/static/css/base/custom-button.css",
-    ]
-
-    for css_file in css_files:
-        try:
-            with open(css_file, "r", encoding="utf-8") as f:
-                css_content = f.read()
-            st.markdown(f"<style>{css_content}</style>", unsafe_allow_html=True)
-        except FileNotFoundError:
-            pass  # CSS file not found, continue without styling
+    # Inject the page styles as a single combined <style> block
+    st.markdown(asset_registry.style_tag(*URL_INPUT_PAGE_CSS), unsafe_allow_html=True)
 
     with st.container():
         # URL入力フィールド(処理中は無効化)
         target_url = st.session_state.get("target_url", "")
         url_value = (
-            target_url
-            if scraping_model.is_scraping
-            else st.session_state.get("url_input", "")
+            target_url if is_ingesting else st.session_state.get("url_input", "")
         )
 
         st.text_input(
-            "URLを入力してください" if not scraping_model.is_scraping else "URL",
+            "URLを入力してください" if not is_ingesting else "URL",
             placeholder="https://example.com",
             value=url_value,
             key="url_input",
-            disabled=scraping_model.is_scraping,
+            disabled=is_ingesting,
             label_visibility="collapsed",
         )
 
@@ -71,40 +75,18 @@ def render_url_input_form():
                 scraping_model.last_error = str(e)
 
         # ボタンのテキストと状態を動的に設定
-        button_text = (
-            "ページの内容を取得中..." if scraping_model.is_scraping else "要約を開始"
-        )
-        button_disabled = scraping_model.is_scraping
+        button_text = "ページの内容を取得中..." if is_ingesting else "要約を開始"
 
         st.button(
             button_text,
             use_container_width=True,
-            disabled=button_disabled,
-            on_click=on_summarize_click if not scraping_model.is_scraping else None,
+            disabled=is_ingesting,
+            on_click=on_summarize_click if not is_ingesting else None,
         )
 
-        # 処理中の場合のスクレイピング処理
-        if scraping_model.is_scraping:
-            target_url = st.session_state.get("target_url", "")
-            if not target_url:
-                scraping_model.is_scraping = False
-                scraping_model.last_error = "URLが未設定です。もう一度お試しください。"
-                st.rerun()
-                return
-            try:
-                scraping_model.scrape(target_url)
-
-                # スクレイピング完了後、遷移前にembeddingを作成
-                vector_store = st.session_state.get("vector_store")
-                if vector_store and scraping_model.content:
-                    vector_store.create_embeddings(scraping_model.content)
-
-                app_router.go_to_chat_page()
-                st.rerun()
-            except Exception as e:
-                scraping_model.is_scraping = False
-                scraping_model.last_error = f"スクレイピングに失敗しました: {e}"
-                st.rerun()
+        # 取得はワーカーで実行し、進捗はフラグメントでポーリングする
+        if is_ingesting:
+            render_ingestion_job(job.job_id)
 
         if st.secrets.get("DEBUG"):
             st.info("現在Mockが使用されています。")
@@ -115,7 +97,45 @@ def render_url_input_form():
             st.session_state.should_start_scraping = False
             target_url = st.session_state.get("target_url_to_scrape", "")
 
-            # 処理開始
+            # 処理開始(スクリプトスレッドをブロックしないようジョブとして投入する)
             app_router.set_target_url(target_url)
-            scraping_model.is_scraping = True
+            st.session_state.ingestion_job_id = orchestrator.start_ingestion(
+                scraping_model, st.session_state.get("vector_store"), target_url
+            )
             st.rerun()  # メインループでのst.rerun()は有効
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_ingestion_job(job_id: str):
+    """取り込みジョブの進捗を定期的に確認し、完了したらページ全体を再実行する"""
+    # ポーリング中も利用中のセッションとして扱い、退避されないようにする
+    session_memory.touch(st.session_state.get("session_id", ""))
+    orchestrator = st.session_state.ingestion_orchestrator
+    job = orchestrator.get_job(job_id)
+    if job is None:
+        return
+
+    if not job.is_active:
+        st.session_state.pop("ingestion_job_id", None)
+        if job.state == StageState.DONE:
+            st.session_state.app_router.go_to_chat_page()
+        elif job.state == StageState.FAILED:
+            st.session_state.scraping_model.last_error = (
+                f"スクレイピングに失敗しました: {job.error}"
+            )
+        st.rerun()
+
+    elapsed = time.monotonic() - job.submitted_at
+    label = (
+        "順番待ち中です..."
+        if job.state == StageState.PENDING
+        else "ページの内容を取得中です..."
+    )
+    st.caption(f"⏳ {label} ({elapsed:.0f}秒経過)")
+    st.button(
+        "キャンセル",
+        key="cancel_ingestion",
+        use_container_width=True,
+        on_click=orchestrator.cancel_job,
+        args=(job_id,),
+    )
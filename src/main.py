@@ -1,5 +1,8 @@
+import functools
+import logging
 import os
 import sys
+import uuid
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if project_root not in sys.path:
@@ -7,6 +10,8 @@ if project_root not in sys.path:
 
 import streamlit as st  # noqa: E402
 from sdk.olm_api_client import MockOllamaApiClient, OllamaApiClient  # noqa: E402
+from sentence_transformers import SentenceTransformer  # noqa: E402
+from streamlit.runtime import Runtime  # noqa: E402
 
 from src.components.query_page.query_page import render_query_page  # noqa: E402
 from src.components.sidebar.sidebar import render_sidebar  # noqa: E402
@@ -18,12 +23,75 @@ from src.models import (  # noqa: E402
     VectorStore,
 )
 from src.router import AppRouter, Page  # noqa: E402
+from src.services import (  # noqa: E402
+    IngestionOrchestrator,
+    LoadBalancedClient,
+    Priority,
+    ScheduledClient,
+    SemanticAnswerCache,
+    SessionClient,
+    SingleFlightClient,
+    asset_registry,
+    configure_json_logging,
+    disconnect_watcher,
+    llm_scheduler,
+    metrics,
+    metrics_exporter,
+    profiler,
+    session_memory,
+    warm_up_steps,
+    warmup,
+)
+from src.services.profiler import DEFAULT_PROFILE_DIR  # noqa: E402
+from src.services.session_memory import DEFAULT_SPILL_DIR  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+@st.cache_resource
+def load_llm_client(
+    is_debug: bool,
+    endpoints: tuple[str, ...],
+    single_flight: bool,
+    eject_after_failures: int,
+    eject_seconds: float,
+    hedge_percentile: float | None,
+    mock_token_delay: float = 0.01,
+):
+    """LLMクライアント(HTTP接続やエンドポイントの状態)をプロセス全体で共有する"""
+    if is_debug:
+        client = MockOllamaApiClient(token_delay=mock_token_delay)
+    elif len(endpoints) == 1:
+        client = OllamaApiClient(api_url=endpoints[0])
+    else:
+        # 複数のGPUサーバーに負荷を分散し、障害時は他のサーバーに切り替える
+        client = LoadBalancedClient(
+            list(endpoints),
+            client_factory=OllamaApiClient,
+            eject_after_failures=eject_after_failures,
+            eject_seconds=eject_seconds,
+            hedge_percentile=hedge_percentile,
+        )
+
+    # 同時に実行する生成の数を制限し、セッション間で公平に順番待ちさせる
+    client = ScheduledClient(client)
+
+    # 同じプロンプトの同時リクエストは1つの生成を共有する
+    if single_flight:
+        client = SingleFlightClient(client)
+    return client
+
 
+@st.cache_resource
+def load_embedding_model(model_name: str) -> SentenceTransformer:
+    """埋め込みモデルは読み込みが重いため、プロセス全体で1つだけ保持する"""
+    return SentenceTransformer(model_name)
 
-@st.cache_data
-def load_model(model_class, _client):
-    """モデルをセッション毎にキャッシュしてロードする"""
-    return model_class(_client)
+
+@st.cache_resource
+def load_answer_cache(threshold: float, ttl_seconds: float) -> SemanticAnswerCache:
+    """回答キャッシュをプロセス全体で共有する"""
+    return SemanticAnswerCache(threshold=threshold, ttl_seconds=ttl_seconds)
 
 
 st.set_page_config(
@@ -40,8 +108,12 @@ def main():
 
     initialize_session()
 
+    current_page = st.session_state.app_router.current_page
+    # 全体の再実行回数(フラグメントのみの再実行は含まない)
+    metrics.increment("script_runs_total", page=current_page.value)
+
     # Route based on page state using AppRouter and Page Enum
-    if st.session_state.app_router.current_page == Page.CHAT:
+    if current_page == Page.CHAT:
         render_query_page()
         render_sidebar(Page.CHAT)
     else:  # default to Page.INPUT
@@ -54,50 +126,169 @@ def initialize_session():
     if "app_router" not in st.session_state:
         st.session_state.app_router = AppRouter()
 
-    # セッション初期化を確実にするため、アプリケーション開始時の状態確認
-    if "session_initialized" not in st.session_state:
-        st.session_state.session_initialized = True
-        # 既存のキャッシュされたデータをクリア
-        st.cache_data.clear()
+    # LLMリクエストの公平なスケジューリングに使うセッションID
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+
+    # 構造化ログ(JSON)とメトリクスの出力はプロセスごとに一度だけ設定する
+    if st.secrets.get("LOG_FORMAT", "text") == "json":
+        configure_json_logging()
+    metrics_port = st.secrets.get("METRICS_PORT")
+    try:
+        metrics_exporter.start(
+            file_path=st.secrets.get("METRICS_EXPORT_FILE"),
+            interval=float(st.secrets.get("METRICS_EXPORT_INTERVAL", 15)),
+            port=int(metrics_port) if metrics_port is not None else None,
+        )
+    except OSError as e:
+        # ポートが使用中でもアプリは止めず、エンドポイントなしで続ける
+        logger.warning("Failed to serve metrics on port %s: %s", metrics_port, e)
+
+    # 開発時はCSSなどの変更をファイルの更新時刻で検知して読み直す
+    asset_registry.configure(reload=bool(st.secrets.get("ASSET_RELOAD", False)))
+
+    # Process-wide limits of concurrent LLM generations
+    llm_scheduler.configure(
+        max_concurrency=int(st.secrets.get("LLM_MAX_CONCURRENCY", 2)),
+        max_queue_size=int(st.secrets.get("LLM_MAX_QUEUE_SIZE", 100)),
+    )
+
+    # LLMの応答待ちの間はタブを閉じてもスクリプトが止まらないため、切断を検知して生成を止める
+    disconnect_watcher.configure(
+        is_connected=_is_client_connected,
+        grace_seconds=float(st.secrets.get("DISCONNECT_GRACE_SECONDS", 5)),
+    )
 
     # Client should be initialized regardless of the page
     if "ollama_client" not in st.session_state:
-        is_debug = st.secrets.get("DEBUG", False)
-        if is_debug:
-            st.session_state.ollama_client = MockOllamaApiClient(token_delay=0.01)
-        else:
-            ollama_api_endpoint = st.secrets.get("OLM_API_ENDPOINT")
-            if not ollama_api_endpoint:
-                raise ValueError(
-                    "OLM_API_ENDPOINT is not configured in Streamlit secrets."
-                )
-
-            st.session_state.ollama_client = OllamaApiClient(
-                api_url=ollama_api_endpoint
-            )
+        is_debug = bool(st.secrets.get("DEBUG", False))
+        ollama_api_endpoints = list(st.secrets.get("OLM_API_ENDPOINTS", []))
+        if not ollama_api_endpoints and st.secrets.get("OLM_API_ENDPOINT"):
+            ollama_api_endpoints = [st.secrets.get("OLM_API_ENDPOINT")]
+        if not is_debug and not ollama_api_endpoints:
+            raise ValueError("OLM_API_ENDPOINT is not configured in Streamlit secrets.")
+
+        hedge_percentile = st.secrets.get("LLM_HEDGE_PERCENTILE")
+        st.session_state.ollama_client = load_llm_client(
+            is_debug,
+            tuple(ollama_api_endpoints),
+            bool(st.secrets.get("LLM_SINGLE_FLIGHT", True)),
+            int(st.secrets.get("LLM_EJECT_AFTER_FAILURES", 3)),
+            float(st.secrets.get("LLM_EJECT_SECONDS", 30)),
+            float(hedge_percentile) if hedge_percentile else None,
+            float(st.secrets.get("LLM_MOCK_TOKEN_DELAY", 0.01)),
+        )
+
+    # プロセスごとに一度だけ、エンコーダーとLLMを温めてから準備完了にする
+    if not warmup.is_started:
+        embedding_model_name = st.secrets.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        warmup.start(
+            warm_up_steps(
+                st.session_state.ollama_client,
+                lambda: load_embedding_model(embedding_model_name),
+                [
+                    st.secrets.get("SUMMARY_MODEL", "qwen3:0.6b"),
+                    st.secrets.get("QUESTION_MODEL", "qwen3:0.6b"),
+                ],
+                float(st.secrets.get("WARMUP_LLM_TIMEOUT", 120)),
+            ),
+            readiness_file=st.secrets.get("READINESS_FILE"),
+        )
 
     # Initialize summarization model
     if "summarization_model" not in st.session_state:
         if "ollama_client" in st.session_state:
-            st.session_state.summarization_model = load_model(
-                SummarizationModel, st.session_state.ollama_client
+            st.session_state.summarization_model = SummarizationModel(
+                SessionClient(
+                    st.session_state.ollama_client,
+                    session_id=st.session_state.session_id,
+                    priority=Priority.SUMMARY,
+                ),
             )
 
     # Initialize conversation model
     if "conversation_model" not in st.session_state:
         if "ollama_client" in st.session_state:
-            st.session_state.conversation_model = load_model(
-                ConversationModel, st.session_state.ollama_client
+            st.session_state.conversation_model = ConversationModel(
+                SessionClient(
+                    st.session_state.ollama_client,
+                    session_id=st.session_state.session_id,
+                    priority=Priority.INTERACTIVE,
+                ),
             )
 
     # Initialize scraping model
     if "scraping_model" not in st.session_state:
         st.session_state.scraping_model = ScrapingModel()
 
-    # Initialize vector store and load the embedding model
+    # Initialize vector store with the shared embedding model
     if "vector_store" not in st.session_state:
-        st.session_state.vector_store = VectorStore()
+        model_name = st.secrets.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        st.session_state.vector_store = VectorStore(
+            model_name=model_name, model=load_embedding_model(model_name)
+        )
+
+    # Shared answer cache (same instance for every session)
+    if "answer_cache" not in st.session_state:
+        st.session_state.answer_cache = load_answer_cache(
+            float(st.secrets.get("ANSWER_CACHE_THRESHOLD", 0.92)),
+            float(st.secrets.get("ANSWER_CACHE_TTL_SECONDS", 3600)),
+        )
+
+    # Initialize ingestion orchestrator (scrape -> summarize / embed in parallel)
+    if "ingestion_orchestrator" not in st.session_state:
+        # 埋め込みはワーカーで完了するため、公開時にセッションのメモリを測り直す
+        st.session_state.ingestion_orchestrator = IngestionOrchestrator(
+            on_embedded=functools.partial(
+                session_memory.measure, st.session_state.session_id
+            )
+        )
+
+    # セッションごとのメモリ使用量を記録し、予算超過時は放置されたセッションを退避する
+    session_memory.configure(
+        budget_bytes=int(st.secrets.get("SESSION_MEMORY_BUDGET_MB", 512)) * 1024 * 1024,
+        idle_seconds=float(st.secrets.get("SESSION_IDLE_SECONDS", 300)),
+        spill_dir=st.secrets.get("SESSION_SPILL_DIR", DEFAULT_SPILL_DIR),
+    )
+    session_memory.register(
+        st.session_state.session_id,
+        scraping_model=st.session_state.scraping_model,
+        vector_store=st.session_state.vector_store,
+        summarization_model=st.session_state.get("summarization_model"),
+        conversation_model=st.session_state.get("conversation_model"),
+    )
+    session_memory.enforce_budget()
+
+
+def _is_client_connected(client_id: str) -> bool:
+    """Whether the browser session is still connected to this server."""
+    if not Runtime.exists():
+        return True
+    return Runtime.instance().is_active_session(client_id)
+
+
+def _setting(name: str, default):
+    """環境変数が設定されていればsecretsより優先する(稼働中の環境でのプロファイル用)"""
+    return os.environ.get(name, st.secrets.get(name, default))
+
+
+def run_profiled():
+    """Run main(), profiling the rerun when it is sampled (PROFILE_SAMPLE_EVERY)."""
+    profiler.configure(
+        sample_every=int(_setting("PROFILE_SAMPLE_EVERY", 0)),
+        directory=_setting("PROFILE_DIR", DEFAULT_PROFILE_DIR),
+        max_runs=int(_setting("PROFILE_MAX_RUNS", 20)),
+        trace_memory=str(_setting("PROFILE_TRACEMALLOC", False)).lower()
+        in ("1", "true"),
+    )
+    if not profiler.enabled:
+        main()
+        return
+    router = st.session_state.get("app_router")
+    page = router.current_page if router else Page.INPUT
+    with profiler.profile(page.value):
+        main()
 
 
 if __name__ == "__main__":
-    main()
+    run_profiled()
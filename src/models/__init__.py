@@ -1,12 +1,18 @@
+from .chat_history import ChatHistory
 from .conversation_model import ConversationModel
+from .salience_selector import SalienceSelector
 from .scraping_model import ScrapingModel
 from .summarization_model import SummarizationModel, SummarizationModelError
+from .think_stream_filter import ThinkStreamFilter
 from .vector_store import VectorStore
 
 __all__ = [
+    "ChatHistory",
     "ConversationModel",
+    "SalienceSelector",
     "ScrapingModel",
     "SummarizationModel",
     "SummarizationModelError",
+    "ThinkStreamFilter",
     "VectorStore",
 ]
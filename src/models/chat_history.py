@@ -0,0 +1,128 @@
+from bisect import bisect_left
+
+
+class ChatHistory:
+    """
+    Chat messages with their prompt-formatted strings and running lengths.
+
+    Each message is formatted once when it is added, and prefix sums of the formatted
+    lengths make it possible to find the longest suffix that fits a character budget
+    with a binary search. Memory is bounded by max_messages.
+    """
+
+    def __init__(self, max_messages: int = 200):
+        self.max_messages = max_messages
+        self.messages: list[dict] = []
+        self._formatted: list[str] = []
+        # _cumulative[i] is the total length of _formatted[:i]
+        self._cumulative: list[int] = [0]
+        # Absolute index of messages[0] since the history was created or cleared
+        self.start_index = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    @property
+    def end_index(self) -> int:
+        """Absolute index one past the last message."""
+        return self.start_index + len(self.messages)
+
+    @staticmethod
+    def format_message(message: dict) -> str:
+        role = "ユーザー" if message["role"] == "user" else "あなた"
+        return f'{role}: {message["content"]}\n'
+
+    def append(self, role: str, content: str):
+        """
+        Add a message and format it for prompts.
+
+        Args:
+            role: "user" or "ai"
+            content: The message text
+        """
+        message = {"role": role, "content": content}
+        formatted = self.format_message(message)
+        self.messages.append(message)
+        self._formatted.append(formatted)
+        self._cumulative.append(self._cumulative[-1] + len(formatted))
+        if len(self.messages) > self.max_messages:
+            self.trim(self.max_messages)
+
+    def replace(self, messages: list[dict]):
+        """Replace the whole history with the given messages."""
+        self.clear()
+        for message in messages:
+            self.append(message["role"], message["content"])
+
+    def trim(self, max_messages: int):
+        """
+        Drop the oldest messages so that at most max_messages remain.
+        """
+        excess = len(self.messages) - max_messages
+        if excess <= 0:
+            return
+        self.messages = self.messages[excess:]
+        self._formatted = self._formatted[excess:]
+        offset = self._cumulative[excess]
+        self._cumulative = [total - offset for total in self._cumulative[excess:]]
+        self.start_index += excess
+
+    def clear(self):
+        self.messages = []
+        self._formatted = []
+        self._cumulative = [0]
+        self.start_index = 0
+
+    def suffix_start(self, max_length: int, exclude_last: bool = True) -> int:
+        """
+        Find where the longest suffix fitting in max_length begins.
+
+        Args:
+            max_length: Character budget for the formatted suffix
+            exclude_last: Leave out the newest message (the pending question)
+
+        Returns:
+            int: Absolute index of the first message of the suffix
+        """
+        end = len(self.messages) - 1 if exclude_last else len(self.messages)
+        if end <= 0:
+            return self.start_index + max(end, 0)
+        start = bisect_left(
+            self._cumulative, self._cumulative[end] - max_length, 0, end + 1
+        )
+        return self.start_index + start
+
+    def format_suffix(
+        self, max_length: int, exclude_last: bool = True, min_start: int = 0
+    ) -> str:
+        """
+        Format the most recent messages that fit in max_length characters.
+
+        Args:
+            max_length: Character budget for the formatted history
+            exclude_last: Leave out the newest message (the pending question)
+            min_start: Absolute index before which messages are never included
+
+        Returns:
+            str: The formatted history, oldest message first
+        """
+        end = len(self.messages) - 1 if exclude_last else len(self.messages)
+        if end <= 0:
+            return ""
+        start = max(self.suffix_start(max_length, exclude_last), min_start)
+        return self.format_range(start, self.start_index + end)
+
+    def format_range(self, start: int, end: int) -> str:
+        """
+        Format the messages between two absolute indices.
+
+        Args:
+            start: Absolute index of the first message
+            end: Absolute index one past the last message
+
+        Returns:
+            str: The formatted messages, oldest first
+        """
+        start = max(start - self.start_index, 0)
+        end = max(end - self.start_index, 0)
+        return "".join(self._formatted[start:end]).strip()
@@ -1,21 +1,80 @@
+import logging
 import os
 import re
+import threading
+import time
+from concurrent.futures import Future
 from string import Template
 from typing import AsyncGenerator
 
 import streamlit as st
 from sdk.olm_api_client import OllamaClientProtocol
 
+from src.models.chat_history import ChatHistory
+from src.models.prompt_templates import shared_prompt_template
+from src.models.think_stream_filter import ThinkStreamFilter
 from src.protocols.models.conversation_model_protocol import ConversationModelProtocol
+from src.services.async_runtime import async_runtime
+from src.services.cancellation import (
+    CancellationToken,
+    GenerationCancelledError,
+    cancellable_call,
+    cancellable_stream,
+)
+from src.services.llm_scheduler import Priority, scheduling_priority
+from src.services.metrics import metrics
+from src.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 質問文のために会話履歴の予算から確保しておく文字数
+QUESTION_RESERVE_LENGTH = 300
+# 質問・履歴・関連情報の予算を縮めてでも、ページ本文に残すプロンプトの割合
+PAGE_MIN_SHARE = 0.3
 
 
 class ConversationModel(ConversationModelProtocol):
-    def __init__(self, client: OllamaClientProtocol):
+    def __init__(self, client: OllamaClientProtocol, max_history_messages: int = 200):
         self.client = client
-        self.messages = []
+        self._history = ChatHistory(max_messages=max_history_messages)
         self.is_responding = False
         self.last_error = None
-        self._qa_prompt_template = self._load_qa_prompt_template()
+        self.last_ttft = None
+        self._cancel_token = CancellationToken()
+        # Running summary of the turns that no longer fit in the history window
+        self.memory = ""
+        # Absolute index of the first message that is not part of the memory
+        self._compacted_until = 0
+        self._compaction_lock = threading.Lock()
+        self._compaction_future: Future | None = None
+        self._compaction_token = CancellationToken()
+        # Incremented on reset so that stale compactions are discarded
+        self._generation = 0
+        # テンプレートは全セッションで共有し、モデルの生成を軽くする
+        self._qa_prompt_template = shared_prompt_template(
+            "web_page_qa_prompt.md", self._load_qa_prompt_template
+        )
+        self._qa_turn_prompt_template = shared_prompt_template(
+            "web_page_qa_turn_prompt.md", self._load_qa_turn_prompt_template
+        )
+        self._compaction_prompt_template = shared_prompt_template(
+            "conversation_compaction_prompt.md",
+            lambda: self._load_prompt_template("conversation_compaction_prompt.md"),
+        )
+
+    @property
+    def messages(self) -> list[dict]:
+        """The chat messages, oldest first."""
+        return self._history.messages
+
+    @messages.setter
+    def messages(self, messages: list[dict]):
+        self._history.replace(messages)
+
+    @property
+    def message_count(self) -> int:
+        """Number of messages added since the last reset, including trimmed ones."""
+        return self._history.end_index
 
     def _truncate_prompt(self, prompt: str, max_chars: int = None) -> str:
         """
@@ -34,9 +93,12 @@ class ConversationModel(ConversationModelProtocol):
             return prompt
         return prompt[:max_chars]
 
-    def _load_qa_prompt_template(self) -> Template:
+    def _load_prompt_template(self, filename: str) -> Template:
         """
-        Load the Web Page Q&A prompt template from the static file.
+        Load a prompt template from the static prompts directory.
+
+        Args:
+            filename: The template file name
 
         Returns:
             Template: The prompt template object
@@ -48,11 +110,35 @@ class ConversationModel(ConversationModelProtocol):
             os.path.dirname(os.path.dirname(__file__)),
             "static",
             "prompts",
-            "web_page_qa_prompt.md",
+            filename,
         )
         with open(prompt_path, "r", encoding="utf-8") as f:
             return Template(f.read())
 
+    def _load_qa_prompt_template(self) -> Template:
+        """
+        Load the page-stable part of the Web Page Q&A prompt (instructions, summary, page content).
+
+        Returns:
+            Template: The prompt template object
+
+        Raises:
+            FileNotFoundError: If the prompt template file is not found
+        """
+        return self._load_prompt_template("web_page_qa_prompt.md")
+
+    def _load_qa_turn_prompt_template(self) -> Template:
+        """
+        Load the per-turn part of the Web Page Q&A prompt (retrieved context, history, question).
+
+        Returns:
+            Template: The prompt template object
+
+        Raises:
+            FileNotFoundError: If the prompt template file is not found
+        """
+        return self._load_prompt_template("web_page_qa_turn_prompt.md")
+
     async def generate_response(self, user_message: str) -> AsyncGenerator[str, None]:
         """
         Generates a response from the client as an asynchronous stream.
@@ -94,93 +180,368 @@ class ConversationModel(ConversationModelProtocol):
         """
         self.messagesをLLMプロンプト用の文字列にフォーマットする。
         古いメッセージから削除して、指定された最大長を超えないようにする。
+        (最後のユーザーメッセージは除く。要約済みのメッセージも除く)
+        """
+        return self._history.format_suffix(max_length, min_start=self._compacted_until)
+
+    def _prompt_budgets(self, summary: str) -> tuple[int, int, int]:
         """
-        if not self.messages:
-            return ""
+        Split MAX_PROMPT_LENGTH between the page content and the per-turn parts.
+
+        CONTEXT_MAX_LENGTH and RETRIEVAL_MAX_LENGTH are scaled down together when
+        they would leave the page content less than PAGE_MIN_SHARE of the room
+        left by the templates and the summary. The result only depends on the
+        settings and the summary, so it is the same for every turn on a page.
+
+        Args:
+            summary: The page summary
+
+        Returns:
+            tuple[int, int, int]: Character budgets of the page content, the
+                question and history, and the retrieved chunks
+        """
+        max_prompt_length = int(st.secrets.get("MAX_PROMPT_LENGTH", 4000))
+        context_max_length = int(st.secrets.get("CONTEXT_MAX_LENGTH", 1500))
+        retrieval_max_length = int(st.secrets.get("RETRIEVAL_MAX_LENGTH", 1500))
+
+        template_length = len(
+            self._qa_turn_prompt_template.safe_substitute(
+                conversation_memory="",
+                vector_search_content="",
+                chat_history="",
+                user_message="",
+            )
+        ) + len(
+            self._qa_prompt_template.safe_substitute(summary=summary, page_content="")
+        )
+        available = max(0, max_prompt_length - template_length)
+
+        # 設定された比率を保ったまま、ページ本文の最低限の割合を確保する
+        turn_limit = available - int(available * PAGE_MIN_SHARE)
+        requested = context_max_length + retrieval_max_length
+        if requested > turn_limit:
+            context_max_length = context_max_length * turn_limit // requested
+            retrieval_max_length = retrieval_max_length * turn_limit // requested
+
+        page_budget = available - context_max_length - retrieval_max_length
+        return page_budget, context_max_length, retrieval_max_length
+
+    def _build_stable_prefix(
+        self, summary: str, page_content: str, page_budget: int = None
+    ) -> str:
+        """
+        Build the part of the Q&A prompt that only depends on the page.
+
+        The page content is cut to a budget that does not depend on the current turn,
+        so the prefix is byte-identical for every question on the same page and the
+        LLM server can reuse its prompt cache across turns.
+
+        Args:
+            summary: The page summary
+            page_content: The scraped page content
+            page_budget: Characters of page content to keep (from _prompt_budgets)
+
+        Returns:
+            str: The stable prompt prefix
+        """
+        if page_budget is None:
+            page_budget, _, _ = self._prompt_budgets(summary)
+        return self._qa_prompt_template.safe_substitute(
+            summary=summary, page_content=page_content[:page_budget]
+        )
+
+    def _build_turn_suffix(
+        self,
+        user_message: str,
+        vector_search_content: str,
+        context_max_length: int,
+        retrieval_max_length: int,
+    ) -> str:
+        """
+        Build the per-turn part of the Q&A prompt, appended after the stable prefix.
+
+        Args:
+            user_message: The user's question
+            vector_search_content: Chunks retrieved for this question
+            context_max_length: Characters for the question, memory and history
+            retrieval_max_length: Characters for the retrieved chunks
+
+        Returns:
+            str: The per-turn prompt suffix
+        """
+        # ユーザーメッセージが長すぎる場合はカット
+        truncated_user_message = self._truncate_user_message(
+            user_message, max_length=context_max_length
+        )
+
+        # 会話履歴の最大長を計算（会話の要約もこの予算に含める）
+        memory = self.memory
+        history_max_length = max(
+            0, context_max_length - len(truncated_user_message) - len(memory)
+        )
 
-        history = []
-        current_length = 0
-        # 新しいメッセージから遡って履歴を構築 (最後のユーザーメッセージは除く)
-        for msg in reversed(self.messages[:-1]):
-            role = "ユーザー" if msg["role"] == "user" else "あなた"
-            formatted_message = f'{role}: {msg["content"]}\n'
+        # 会話履歴をフォーマットする
+        chat_history = self._format_chat_history(max_length=history_max_length)
 
-            # メッセージを追加すると最大長を超える場合はループを終了
-            if current_length + len(formatted_message) > max_length:
-                break
+        return self._qa_turn_prompt_template.safe_substitute(
+            conversation_memory=memory,
+            vector_search_content=vector_search_content[:retrieval_max_length],
+            chat_history=chat_history,
+            user_message=truncated_user_message,
+        )
 
-            history.insert(0, formatted_message)
-            current_length += len(formatted_message)
+    @tracer.traced("build_prompt")
+    def _build_qa_prompt(
+        self,
+        user_message: str,
+        summary: str = "",
+        vector_search_content: str = "",
+        page_content: str = "",
+    ) -> str:
+        """
+        Assemble the Web Page Q&A prompt: page-stable prefix first, per-turn parts last.
 
-        return "".join(history).strip()
+        Returns:
+            str: The complete prompt
+        """
+        page_budget, context_max_length, retrieval_max_length = self._prompt_budgets(
+            summary
+        )
+        qa_prompt = self._build_stable_prefix(summary, page_content, page_budget)
+        qa_prompt += self._build_turn_suffix(
+            user_message,
+            vector_search_content,
+            context_max_length,
+            retrieval_max_length,
+        )
+
+        # プロンプト全体の最終的な切り詰め（安全策）
+        return self._truncate_prompt(qa_prompt)
 
+    @tracer.traced("respond_to_user_message")
     async def respond_to_user_message(
         self,
         user_message: str,
         summary: str = "",
         vector_search_content: str = "",
         page_content: str = "",
+        cancel_token: CancellationToken = None,
     ) -> str:
         """
         WebページのQ&A形式を使用して、自動状態管理でユーザーメッセージへの応答を生成します。
+        cancel_tokenがキャンセルされるとGenerationCancelledErrorを送出します。
         """
         self.is_responding = True
+        cancel_token = cancel_token or CancellationToken()
+        self._cancel_token = cancel_token
         try:
-            CONTEXT_MAX_LENGTH = int(st.secrets.get("CONTEXT_MAX_LENGTH", 1500))
-
-            # ユーザーメッセージが長すぎる場合はカット
-            truncated_user_message = self._truncate_user_message(
-                user_message, max_length=CONTEXT_MAX_LENGTH
+            # WebページのQ&Aプロンプトを構築する
+            truncated_qa_prompt = self._build_qa_prompt(
+                user_message,
+                summary=summary,
+                vector_search_content=vector_search_content,
+                page_content=page_content,
             )
 
-            # 会話履歴の最大長を計算
-            history_max_length = max(
-                0, CONTEXT_MAX_LENGTH - len(truncated_user_message)
+            question_model = st.secrets.get("QUESTION_MODEL", "qwen3:0.6b")
+            response = await cancellable_call(
+                self.client.gen_batch(truncated_qa_prompt, model=question_model),
+                cancel_token,
+                operation="chat",
             )
+            return response
+        except GenerationCancelledError:
+            raise
+        except Exception:
+            self.last_error = "応答の生成に失敗しました。"
+            raise
+        finally:
+            self.is_responding = False
 
-            # 会話履歴をフォーマットする
-            chat_history = self._format_chat_history(max_length=history_max_length)
+    @tracer.traced("respond_to_user_message")
+    async def stream_response_to_user_message(
+        self,
+        user_message: str,
+        summary: str = "",
+        vector_search_content: str = "",
+        page_content: str = "",
+        cancel_token: CancellationToken = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream the answer to a user message, hiding <think> content as it arrives.
 
-            # WebページのQ&Aプロンプトを構築する
-            qa_prompt = self._qa_prompt_template.safe_substitute(
+        Records the time to the first visible token in last_ttft.
+
+        Args:
+            user_message: The user's question
+            summary: The page summary
+            vector_search_content: Chunks retrieved for this question
+            page_content: The scraped page content
+            cancel_token: Token that stops the generation (a new one is created if None)
+
+        Yields:
+            str: The visible answer accumulated so far
+
+        Raises:
+            GenerationCancelledError: If the generation is cancelled
+        """
+        self.is_responding = True
+        self.last_error = None
+        self.last_ttft = None
+        cancel_token = cancel_token or CancellationToken()
+        self._cancel_token = cancel_token
+        started_at = time.monotonic()
+        think_filter = ThinkStreamFilter()
+        try:
+            qa_prompt = self._build_qa_prompt(
+                user_message,
                 summary=summary,
-                user_message=truncated_user_message,
-                chat_history=chat_history,
                 vector_search_content=vector_search_content,
                 page_content=page_content,
             )
 
-            # プロンプト全体の最終的な切り詰め（安全策）
-            truncated_qa_prompt = self._truncate_prompt(qa_prompt)
-
             question_model = st.secrets.get("QUESTION_MODEL", "qwen3:0.6b")
-            response = await self.client.gen_batch(
-                truncated_qa_prompt, model=question_model
-            )
-            return response
+            async for chunk in cancellable_stream(
+                self.client.gen_stream(qa_prompt, model=question_model),
+                cancel_token,
+                operation="chat",
+            ):
+                if think_filter.feed(chunk):
+                    if self.last_ttft is None:
+                        self._record_ttft(started_at)
+                    yield think_filter.visible
+
+            if think_filter.flush():
+                if self.last_ttft is None:
+                    self._record_ttft(started_at)
+                yield think_filter.visible
+        except GenerationCancelledError:
+            raise
         except Exception:
             self.last_error = "応答の生成に失敗しました。"
             raise
         finally:
             self.is_responding = False
 
+    def _record_ttft(self, started_at: float):
+        """Record the time to the first visible token of the current answer."""
+        self.last_ttft = time.monotonic() - started_at
+        metrics.observe("chat_time_to_first_visible_token_seconds", self.last_ttft)
+        logger.info("Chat answer TTFT: %.3fs", self.last_ttft)
+
+    def schedule_compaction(self) -> Future | None:
+        """
+        Summarize the turns that are about to leave the history window, in the background.
+
+        Call this after an answer has been delivered. The oldest turns that do not fit
+        in the history budget are merged into self.memory by the LLM, so later prompts
+        keep a bounded size without losing the earlier context. The result is
+        discarded if the conversation was reset in the meantime.
+
+        Returns:
+            Future | None: The pending compaction, or None if nothing needs compacting
+        """
+        # プロンプトで実際に使える履歴の予算に合わせる(要約の長さは含めない上限)
+        _, context_max_length, _ = self._prompt_budgets(summary="")
+        memory_max_length = int(st.secrets.get("CONVERSATION_MEMORY_MAX_LENGTH", 400))
+        question_model = st.secrets.get("QUESTION_MODEL", "qwen3:0.6b")
+
+        # 要約・次の質問を除いた残りの予算に収まらないメッセージを要約対象にする
+        keep_length = max(
+            0, context_max_length - memory_max_length - QUESTION_RESERVE_LENGTH
+        )
+        with self._compaction_lock:
+            if (
+                self._compaction_future is not None
+                and not self._compaction_future.done()
+            ):
+                return self._compaction_future
+            start = max(self._compacted_until, self._history.start_index)
+            end = self._history.suffix_start(keep_length, exclude_last=False)
+            if end <= start:
+                return None
+            turns = self._history.format_range(start, end)
+            prompt = self._compaction_prompt_template.safe_substitute(
+                max_length=memory_max_length, memory=self.memory, turns=turns
+            )
+            self._compaction_token = CancellationToken()
+            # 会話の要約は、他のユーザーの回答や要約より後回しにする
+            with scheduling_priority(Priority.BACKGROUND):
+                future = async_runtime.submit(
+                    self._compact(
+                        self._compaction_token,
+                        prompt,
+                        question_model,
+                        memory_max_length,
+                        self._generation,
+                        end,
+                    )
+                )
+            self._compaction_future = future
+        return future
+
+    async def _compact(
+        self,
+        cancel_token: CancellationToken,
+        prompt: str,
+        model: str,
+        max_length: int,
+        generation: int,
+        compacted_until: int,
+    ):
+        started_at = time.monotonic()
+        try:
+            response = await cancellable_call(
+                self.client.gen_batch(prompt, model=model),
+                cancel_token,
+                operation="compaction",
+            )
+        except GenerationCancelledError:
+            return
+        except Exception:
+            logger.exception("Conversation compaction failed")
+            metrics.increment("conversation_compactions_total", result="error")
+            return
+        _, memory = self.extract_think_content(response)
+
+        with self._compaction_lock:
+            if generation != self._generation:
+                return
+            self.memory = memory[:max_length]
+            self._compacted_until = compacted_until
+        metrics.increment("conversation_compactions_total", result="ok")
+        metrics.observe(
+            "conversation_compaction_seconds", time.monotonic() - started_at
+        )
+
     def add_user_message(self, content: str):
         """
         Add a user message to the chat history.
         """
-        self.messages.append({"role": "user", "content": content})
+        self._history.append("user", content)
 
     def add_ai_message(self, content: str):
         """
         Add an AI message to the chat history.
         """
-        self.messages.append({"role": "ai", "content": content})
+        self._history.append("ai", content)
+
+    def cancel(self, reason: str = "cancelled"):
+        """Stop the in-flight answer generation and compaction, if any."""
+        self._cancel_token.cancel(reason)
+        self._compaction_token.cancel(reason)
 
     def reset(self):
         """
         Reset the chat history.
         """
-        self.messages = []
+        self.cancel("reset")
+        with self._compaction_lock:
+            self._history.clear()
+            self.memory = ""
+            self._compacted_until = 0
+            self._compaction_future = None
+            self._generation += 1
         self.is_responding = False
         self.last_error = None
 
@@ -220,5 +581,4 @@ class ConversationModel(ConversationModelProtocol):
         """
         Limit the number of messages stored in the model.
         """
-        if len(self.messages) > max_messages:
-            self.messages = self.messages[-max_messages:]
+        self._history.trim(max_messages)
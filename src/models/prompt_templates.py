@@ -0,0 +1,25 @@
+import threading
+from string import Template
+from typing import Callable
+
+# Process-wide: templates are immutable, so every session shares one instance
+_templates: dict[str, Template] = {}
+_lock = threading.Lock()
+
+
+def shared_prompt_template(filename: str, load: Callable[[], Template]) -> Template:
+    """
+    Return the prompt template of the given file, loading it only on first use.
+
+    Args:
+        filename: The template file name, used as the cache key
+        load: Reads the template when it is not cached yet
+
+    Returns:
+        Template: The shared prompt template object
+    """
+    with _lock:
+        template = _templates.get(filename)
+        if template is None:
+            template = _templates[filename] = load()
+        return template
@@ -0,0 +1,144 @@
+import re
+
+import numpy as np
+
+# 文末記号で文を区切る（英文のピリオドは後続の空白がある場合のみ）
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[。！？!?])\s*|(?<=\.)\s+|\s*\n+\s*")
+# 英数字の単語、またはひらがな・カタカナ・漢字の連続
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+")
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]")
+
+
+class SalienceSelector:
+    """
+    Extractive pre-pass that picks the most representative sentences of a page.
+
+    Sentences are scored by TF-IDF cosine similarity to the document centroid,
+    and the best ones are kept in document order until the character budget is
+    filled.
+    """
+
+    def __init__(self, separator: str = " "):
+        self.separator = separator
+
+    def split_sentences(self, text: str) -> list[str]:
+        """
+        Split text into non-empty sentences.
+
+        Args:
+            text: The text to split
+
+        Returns:
+            list[str]: Sentences in document order
+        """
+        sentences = SENTENCE_SPLIT_PATTERN.split(text)
+        return [sentence.strip() for sentence in sentences if sentence.strip()]
+
+    def _tokenize(self, sentence: str) -> list[str]:
+        """
+        Tokenize a sentence into words (Latin scripts) and character bigrams (Japanese).
+        """
+        tokens = []
+        for run in TOKEN_PATTERN.findall(sentence.lower()):
+            if CJK_PATTERN.match(run):
+                if len(run) == 1:
+                    tokens.append(run)
+                else:
+                    tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+            else:
+                tokens.append(run)
+        return tokens
+
+    def score_sentences(self, sentences: list[str]) -> np.ndarray:
+        """
+        Score sentences by cosine similarity between their TF-IDF vector and the centroid.
+
+        The term matrix is kept in coordinate form, so the cost is linear in the
+        number of tokens rather than sentences x vocabulary.
+
+        Args:
+            sentences: Sentences to score
+
+        Returns:
+            np.ndarray: One score per sentence (higher is more salient)
+        """
+        n_sentences = len(sentences)
+        vocabulary: dict[str, int] = {}
+        rows, cols = [], []
+        for row, sentence in enumerate(sentences):
+            for token in self._tokenize(sentence):
+                cols.append(vocabulary.setdefault(token, len(vocabulary)))
+                rows.append(row)
+
+        if not cols:
+            return np.zeros(n_sentences, dtype=np.float64)
+
+        n_terms = len(vocabulary)
+        # 同じ (文, 語) の組を集約して出現頻度を求める
+        keys, term_freq = np.unique(
+            np.asarray(rows, dtype=np.int64) * n_terms
+            + np.asarray(cols, dtype=np.int64),
+            return_counts=True,
+        )
+        rows_arr = keys // n_terms
+        cols_arr = keys % n_terms
+
+        doc_freq = np.bincount(cols_arr, minlength=n_terms)
+        idf = np.log((1 + n_sentences) / (1 + doc_freq)) + 1.0
+        values = term_freq * idf[cols_arr]
+
+        norms = np.sqrt(np.bincount(rows_arr, weights=values**2, minlength=n_sentences))
+        values = values / norms[rows_arr]
+
+        centroid = (
+            np.bincount(cols_arr, weights=values, minlength=n_terms) / n_sentences
+        )
+        centroid_norm = np.linalg.norm(centroid)
+        if centroid_norm == 0:
+            return np.zeros(n_sentences, dtype=np.float64)
+
+        return (
+            np.bincount(
+                rows_arr, weights=values * centroid[cols_arr], minlength=n_sentences
+            )
+            / centroid_norm
+        )
+
+    def select(self, text: str, max_chars: int) -> str:
+        """
+        Build a digest of the most salient sentences that fits in max_chars.
+
+        Args:
+            text: The full page text
+            max_chars: Character budget for the digest
+
+        Returns:
+            str: Selected sentences joined in document order
+        """
+        if max_chars <= 0:
+            return ""
+        if len(text) <= max_chars:
+            return text
+
+        sentences = self.split_sentences(text)
+        if not sentences:
+            return text[:max_chars]
+
+        scores = self.score_sentences(sentences)
+        lengths = np.fromiter((len(s) for s in sentences), dtype=np.int64)
+
+        # スコアの高い順に予算内に収まる文を貪欲に選択する
+        selected = []
+        used = 0
+        for index in np.argsort(-scores, kind="stable"):
+            cost = lengths[index] + (len(self.separator) if selected else 0)
+            if used + cost > max_chars:
+                continue
+            selected.append(index)
+            used += cost
+
+        if not selected:
+            return text[:max_chars]
+
+        selected.sort()
+        return self.separator.join(sentences[i] for i in selected)
@@ -6,6 +6,7 @@ import requests
 from bs4 import BeautifulSoup
 
 from src.protocols.models.scraping_model_protocol import ScrapingModelProtocol
+from src.services.tracing import tracer
 
 
 class ScrapingModel(ScrapingModelProtocol):
@@ -14,6 +15,7 @@ class ScrapingModel(ScrapingModelProtocol):
         self.is_scraping = False
         self.last_error = None
 
+    @tracer.traced("validate_url")
     def validate_url(self, url: str) -> None:
         parsed = urlparse(url)
         if parsed.scheme not in ("http", "https"):
@@ -55,6 +57,26 @@ class ScrapingModel(ScrapingModelProtocol):
         self.is_scraping = True
         self.last_error = None
 
+        try:
+            content = self.fetch(url, timeout=timeout)
+            self.content = content
+            return content
+        except ValueError as e:
+            self.last_error = str(e)
+            raise
+        finally:
+            self.is_scraping = False
+
+    @tracer.traced("scrape")
+    def fetch(self, url: str, timeout=(30, 90)) -> str:
+        """
+        Download the page and extract its text without touching the model state.
+
+        Safe to call from worker threads; scrape() is the stateful variant.
+
+        Raises:
+            ValueError: If the URL is not allowed or the page cannot be retrieved
+        """
         try:
             self.validate_url(url)
 
@@ -62,42 +84,45 @@ class ScrapingModel(ScrapingModelProtocol):
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
             }
             try:
-                response = requests.get(
-                    url, headers=headers, timeout=timeout, allow_redirects=False
-                )
-                response.raise_for_status()
+                with tracer.span("download") as span:
+                    response = requests.get(
+                        url, headers=headers, timeout=timeout, allow_redirects=False
+                    )
+                    response.raise_for_status()
+                    span.set_attribute("bytes", len(response.content))
             except requests.RequestException as e:
-                error_msg = f"コンテンツ取得に失敗しました: {e}"
-                self.last_error = error_msg
-                raise ValueError(error_msg) from e
+                raise ValueError(f"コンテンツ取得に失敗しました: {e}") from e
 
             # 明らかに非 HTML のレスポンスは早期リターン
             ctype = (response.headers.get("Content-Type") or "").lower()
             if not ("html" in ctype or ctype.startswith("text/")):
-                self.content = ""
                 return ""
 
-            soup = BeautifulSoup(response.content, "html.parser")
-            for element in soup(
-                ["script", "style", "header", "footer", "nav", "aside"]
-            ):
-                element.decompose()
-            if soup.body:
-                content = soup.body.get_text(separator=" ", strip=True)
-            else:
-                content = ""
-
-            self.content = content
-            return content
+            return self.extract_text(response.content)
         except Exception as e:
             # 予期しないエラーの場合
             if not isinstance(e, ValueError):
-                error_msg = f"予期しないエラーが発生しました: {str(e)}"
-                self.last_error = error_msg
-                raise ValueError(error_msg) from e
+                raise ValueError(f"予期しないエラーが発生しました: {str(e)}") from e
             raise
-        finally:
-            self.is_scraping = False
+
+    @staticmethod
+    @tracer.traced("extract_text")
+    def extract_text(html: bytes | str) -> str:
+        """
+        Extract the readable text of an HTML document.
+
+        Scripts, styles and page chrome (header, footer, navigation, asides) are
+        dropped.
+
+        Returns:
+            str: The body text, or an empty string if the document has no body
+        """
+        soup = BeautifulSoup(html, "html.parser")
+        for element in soup(["script", "style", "header", "footer", "nav", "aside"]):
+            element.decompose()
+        if soup.body:
+            return soup.body.get_text(separator=" ", strip=True)
+        return ""
 
     def reset(self):
         """Reset the scraping model state."""
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import re
@@ -6,10 +7,21 @@ from string import Template
 import streamlit as st
 from sdk.olm_api_client import OllamaClientProtocol
 
+from src.models.prompt_templates import shared_prompt_template
+from src.models.salience_selector import SalienceSelector
 from src.protocols.models.summarization_model_protocol import SummarizationModelProtocol
+from src.services.cancellation import (
+    CancellationToken,
+    GenerationCancelledError,
+    cancellable_stream,
+)
+from src.services.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on the page text fed to the summarization prompt
+SUMMARY_INPUT_MAX_LENGTH = 10000
+
 
 class SummarizationModelError(Exception):
     """A custom exception for errors during the summarization process."""
@@ -28,7 +40,11 @@ class SummarizationModel(SummarizationModelProtocol):
         self.thinking = ""
         self.is_summarizing = False
         self.last_error = None
-        self._summarization_prompt_template = self._load_summarization_prompt_template()
+        self._summarization_prompt_template = shared_prompt_template(
+            "summarization_prompt.md", self._load_summarization_prompt_template
+        )
+        self._salience_selector = SalienceSelector()
+        self._cancel_token = CancellationToken()
 
     def _truncate_prompt(self, prompt: str, max_chars: int = None) -> str:
         """
@@ -108,20 +124,56 @@ class SummarizationModel(SummarizationModelProtocol):
 
         return thinking_content, cleaned_text
 
-    async def stream_summary(self, scraped_content: str):
+    def _select_summary_input(self, scraped_content: str) -> str:
+        """
+        Select the part of the scraped content that is sent to the LLM.
+
+        With SUMMARY_SALIENCE_SELECTION enabled (default), the most salient sentences
+        of the whole page are kept in document order, sized so that the final prompt
+        fits in MAX_PROMPT_LENGTH. Otherwise the head of the content is used.
+
+        Args:
+            scraped_content: The scraped content to summarize.
+
+        Returns:
+            str: The content to substitute into the summarization prompt
+        """
+        if not st.secrets.get("SUMMARY_SALIENCE_SELECTION", True):
+            return scraped_content[:SUMMARY_INPUT_MAX_LENGTH]
+
+        max_prompt_length = int(st.secrets.get("MAX_PROMPT_LENGTH", 4000))
+        template_length = len(
+            self._summarization_prompt_template.safe_substitute(content="")
+        )
+        budget = min(SUMMARY_INPUT_MAX_LENGTH, max_prompt_length - template_length)
+        return self._salience_selector.select(scraped_content, budget)
+
+    @tracer.traced("stream_summary")
+    async def stream_summary(
+        self, scraped_content: str, cancel_token: CancellationToken = None
+    ):
         """
         Handle stream generation from scraped content and yield thinking/summary content.
 
         Args:
             scraped_content: The scraped content to summarize.
+            cancel_token: Token that stops the generation (a new one is created if None)
 
         Yields:
             tuple[str, str]: (thinking_content, summary_content) for each chunk
+
+        Raises:
+            GenerationCancelledError: If the generation is cancelled
         """
         self.is_summarizing = True
         self.last_error = None
+        cancel_token = cancel_token or CancellationToken()
+        self._cancel_token = cancel_token
 
-        truncated_content = scraped_content[:10000]
+        # 文の選択はCPUを使うため、共有のイベントループを止めないようスレッドで行う
+        truncated_content = await asyncio.to_thread(
+            self._select_summary_input, scraped_content
+        )
         prompt = self._summarization_prompt_template.safe_substitute(
             content=truncated_content
         )
@@ -133,8 +185,10 @@ class SummarizationModel(SummarizationModelProtocol):
 
         try:
             summary_model = st.secrets.get("SUMMARY_MODEL", "qwen3:0.6b")
-            async for chunk in self.llm_client.gen_stream(
-                truncated_prompt, model=summary_model
+            async for chunk in cancellable_stream(
+                self.llm_client.gen_stream(truncated_prompt, model=summary_model),
+                cancel_token,
+                operation="summary",
             ):
                 stream_parts.append(chunk)
                 current_response = "".join(stream_parts)
@@ -144,6 +198,9 @@ class SummarizationModel(SummarizationModelProtocol):
                 yield thinking_content, summary_content
             final_response = "".join(stream_parts)
 
+        except GenerationCancelledError:
+            logger.info("Summarization cancelled: %s", cancel_token.reason)
+            raise
         except Exception as e:
             logger.error(f"Streaming summarization failed: {e}")
             error_msg = "要約のストリーミング生成に失敗しました。"
@@ -161,8 +218,13 @@ class SummarizationModel(SummarizationModelProtocol):
 
         yield thinking_content, summary_content
 
+    def cancel(self, reason: str = "cancelled"):
+        """Stop the in-flight summary generation, if any."""
+        self._cancel_token.cancel(reason)
+
     def reset(self):
         """Reset the summarization model state."""
+        self.cancel("reset")
         self.summary = ""
         self.thinking = ""
         self.is_summarizing = False
@@ -0,0 +1,81 @@
+class ThinkStreamFilter:
+    """
+    Incrementally separates <think> content from the visible answer of a token stream.
+
+    Tags may be split across chunks, so a trailing fragment that could be the start
+    of a tag is held back until the next chunk arrives.
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self.thinking = ""
+        self.visible = ""
+        self._in_think = False
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        """
+        Process the next chunk of the stream.
+
+        Args:
+            chunk: Raw text chunk from the LLM
+
+        Returns:
+            str: The newly visible text (may be empty)
+        """
+        text = self._pending + chunk
+        self._pending = ""
+        visible_delta = []
+
+        while text:
+            tag = self.CLOSE_TAG if self._in_think else self.OPEN_TAG
+            index = text.find(tag)
+            if index >= 0:
+                self._append(text[:index], visible_delta)
+                text = text[index + len(tag) :]
+                self._in_think = not self._in_think
+                continue
+
+            # 末尾がタグの途中かもしれない場合は次のチャンクまで保留する
+            held = self._partial_tag_length(text, tag)
+            self._append(text[: len(text) - held], visible_delta)
+            self._pending = text[len(text) - held :]
+            break
+
+        return "".join(visible_delta)
+
+    def flush(self) -> str:
+        """
+        Release any held-back text at the end of the stream.
+
+        Returns:
+            str: The newly visible text (may be empty)
+        """
+        visible_delta = []
+        self._append(self._pending, visible_delta)
+        self._pending = ""
+        return "".join(visible_delta)
+
+    def _append(self, segment: str, visible_delta: list[str]):
+        if not segment:
+            return
+        if self._in_think:
+            self.thinking += segment
+            return
+        # 回答の先頭の空白（</think>直後の改行など）は表示しない
+        if not self.visible:
+            segment = segment.lstrip()
+            if not segment:
+                return
+        self.visible += segment
+        visible_delta.append(segment)
+
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        """Length of the longest suffix of text that is a proper prefix of tag."""
+        for length in range(min(len(tag) - 1, len(text)), 0, -1):
+            if tag.startswith(text[-length:]):
+                return length
+        return 0
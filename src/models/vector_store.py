@@ -1,21 +1,60 @@
+from typing import NamedTuple
+
 import numpy as np
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from sentence_transformers import SentenceTransformer
 
+from src.services.tracing import set_span_attribute, tracer
+
+
+class _Index(NamedTuple):
+    """Chunks and their embeddings, always replaced together."""
+
+    texts: list[str]
+    embeddings: np.ndarray | None
+
+
+EMPTY_INDEX = _Index([], None)
+
 
 class VectorStore:
     """
     Class to manage text vectorization and search
     """
 
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
+    def __init__(
+        self, model_name="all-MiniLM-L6-v2", model: SentenceTransformer = None
+    ):
+        """
+        Args:
+            model_name: Name of the sentence-transformers embedding model
+            model: An already loaded embedding model to share between sessions
+                (loaded from model_name if None)
+        """
         self.model_name = model_name
-        self.model = SentenceTransformer(self.model_name)
-        self.texts = []
-        self.embeddings = None
+        self.model = model if model is not None else SentenceTransformer(model_name)
+        self._index = EMPTY_INDEX
         self.is_creating = False
         self.last_error = None
 
+    @property
+    def texts(self) -> list[str]:
+        return self._index.texts
+
+    @property
+    def embeddings(self) -> np.ndarray | None:
+        return self._index.embeddings
+
+    def set_index(self, texts: list[str], embeddings: np.ndarray | None):
+        """
+        Replace the chunks and their embeddings in a single assignment.
+
+        search() may run concurrently from another thread and must never see new
+        chunks with old embeddings.
+        """
+        self._index = _Index(texts, embeddings)
+
+    @tracer.traced("create_embeddings")
     def create_embeddings(self, text: str, chunk_size=1000, chunk_overlap=200):
         """
         Split text into chunks, vectorize, and store
@@ -25,6 +64,28 @@ class VectorStore:
             chunk_size: Size of each chunk
             chunk_overlap: Overlap between chunks
         """
+        index = self.compute_index(text, chunk_size, chunk_overlap)
+        if index is not None:
+            self.set_index(*index)
+
+    def compute_index(
+        self, text: str, chunk_size=1000, chunk_overlap=200
+    ) -> _Index | None:
+        """
+        Split text into chunks and vectorize them without publishing the result.
+
+        The caller decides whether the index is still wanted and passes it to
+        set_index(); a page replaced in the meantime is then never published.
+
+        Args:
+            text: Scraped content
+            chunk_size: Size of each chunk
+            chunk_overlap: Overlap between chunks
+
+        Returns:
+            _Index | None: The chunks and their embeddings, or None on error
+                (last_error is set)
+        """
         self.is_creating = True
         self.last_error = None
         try:
@@ -33,39 +94,59 @@ class VectorStore:
                 chunk_overlap=chunk_overlap,
                 length_function=len,
             )
-            self.texts = text_splitter.split_text(text)
-            self.embeddings = self.model.encode(self.texts)
+            with tracer.span("chunk"):
+                texts = text_splitter.split_text(text)
+            set_span_attribute("chunks", len(texts))
+            with tracer.span("encode", chunks=len(texts)):
+                embeddings = self.model.encode(texts)
+            return _Index(texts, embeddings)
         except Exception as e:
             self.last_error = f"Error occurred during vectorization: {e}"
+            return None
         finally:
             self.is_creating = False
 
-    def search(self, query: str, top_k=5) -> str:
-        """Search for the most similar text chunks to the query and return the concatenated result"""
-        if self.embeddings is None or not self.texts:
+    @tracer.traced("encode_query")
+    def encode_query(self, query: str) -> np.ndarray:
+        """Vectorize a query with the embedding model"""
+        return self.model.encode([query])[0]
+
+    @tracer.traced("search")
+    def search(self, query: str, top_k=5, query_vec: np.ndarray = None) -> str:
+        """
+        Search for the most similar text chunks to the query and return the concatenated result
+
+        Args:
+            query: The query text
+            top_k: Number of chunks to return
+            query_vec: Precomputed query embedding (from encode_query) to avoid encoding twice
+        """
+        # 作成中の置き換えと混ざらないよう、索引は一度だけ読む
+        texts, embeddings = self._index
+        if embeddings is None or not texts:
             return ""
 
-        query_vec = self.model.encode([query])[0]
+        if query_vec is None:
+            query_vec = self.encode_query(query)
 
         # Calculate cosine similarity using numpy
-        dot_product = np.dot(self.embeddings, query_vec)
+        dot_product = np.dot(embeddings, query_vec)
         query_norm = np.linalg.norm(query_vec)
-        embedding_norms = np.linalg.norm(self.embeddings, axis=1)
+        embedding_norms = np.linalg.norm(embeddings, axis=1)
         similarities = dot_product / (query_norm * embedding_norms)
 
         # Get top-k indices sorted by similarity in descending order
         top_indices = np.argsort(similarities)[::-1][:top_k]
 
         # Always return top-k chunks
-        relevant_texts = [self.texts[i] for i in top_indices]
+        relevant_texts = [texts[i] for i in top_indices]
         return "\n\n".join(relevant_texts)
 
     def reset(self):
         """
         Reset the state of the vector store
         """
-        self.texts = []
-        self.embeddings = None
+        self._index = EMPTY_INDEX
         self.is_creating = False
         self.last_error = None
         # Keep the model cached
@@ -1,5 +1,7 @@
 from typing import AsyncGenerator, Protocol
 
+from src.services.cancellation import CancellationToken
+
 
 class ConversationModelProtocol(Protocol):
     """
@@ -30,18 +32,61 @@ class ConversationModelProtocol(Protocol):
         """
         ...
 
-    async def respond_to_user_message(self, user_message: str) -> str:
+    async def respond_to_user_message(
+        self,
+        user_message: str,
+        summary: str = "",
+        vector_search_content: str = "",
+        page_content: str = "",
+        cancel_token: CancellationToken = None,
+    ) -> str:
         """
         Generate a response to user message with automatic state management.
 
         Args:
             user_message: The user's message to respond to
+            summary: The page summary
+            vector_search_content: Chunks retrieved for this question
+            page_content: The scraped page content
+            cancel_token: Token that stops the generation (a new one is created if None)
 
         Returns:
             str: The AI's response
         """
         ...
 
+    async def stream_response_to_user_message(
+        self,
+        user_message: str,
+        summary: str = "",
+        vector_search_content: str = "",
+        page_content: str = "",
+        cancel_token: CancellationToken = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream the visible answer to a user message, without <think> content.
+
+        Args:
+            user_message: The user's message to respond to
+            summary: The page summary
+            vector_search_content: Chunks retrieved for this question
+            page_content: The scraped page content
+            cancel_token: Token that stops the generation (a new one is created if None)
+
+        Returns:
+            AsyncGenerator[str, None]: Stream of the answer accumulated so far
+        """
+        ...
+
+    def schedule_compaction(self):
+        """
+        Summarize old turns into the conversation memory in the background.
+
+        Returns:
+            Future | None: The pending compaction, or None if nothing needs compacting
+        """
+        ...
+
     def add_user_message(self, content: str) -> None:
         """
         Add a user message to the chat history.
@@ -60,12 +105,29 @@ class ConversationModelProtocol(Protocol):
         """
         ...
 
+    def cancel(self, reason: str = "cancelled") -> None:
+        """
+        Stop the in-flight answer generation, if any.
+
+        Args:
+            reason: Why the generation was cancelled
+        """
+        ...
+
     def reset(self) -> None:
         """
         Reset the chat history.
         """
         ...
 
+    @property
+    def message_count(self) -> int:
+        """
+        Number of messages added since the last reset, including the ones trimmed
+        from the history. Used as an absolute position to render only new messages.
+        """
+        ...
+
     def should_respond(self) -> bool:
         """
         Check if AI should respond based on the internal message state.
@@ -6,7 +6,7 @@ class ScrapingModelProtocol(Protocol):
     Protocol for web scraping models.
     """
 
-    def scrape(self, url: str, timeout: tuple = (10, 30)) -> str:
+    def scrape(self, url: str, timeout: tuple = (30, 90)) -> str:
         """
         Scrape content from a web page.
 
@@ -22,6 +22,22 @@ class ScrapingModelProtocol(Protocol):
         """
         ...
 
+    def fetch(self, url: str, timeout: tuple = (30, 90)) -> str:
+        """
+        Retrieve the text content of a web page without changing the model state.
+
+        Args:
+            url: The URL to scrape.
+            timeout: Request timeout tuple (connect, read).
+
+        Returns:
+            Extracted text content from the web page.
+
+        Raises:
+            ValueError: If URL is invalid or scraping fails.
+        """
+        ...
+
     def validate_url(self, url: str) -> None:
         """
         Validate URL format and security.
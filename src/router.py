@@ -44,6 +44,14 @@ class AppRouter:
 
         st.session_state.page = Page.INPUT
 
+    def reset_chat(self):
+        """Stop the in-flight answer and clear the conversation."""
+        if "conversation_model" in st.session_state:
+            st.session_state.conversation_model.reset()
+        # 表示するメッセージ数の設定も初期状態に戻す
+        st.session_state.pop("chat_visible_messages", None)
+        st.session_state.pop("chat_rendered_until", None)
+
     def go_to_chat_page(self):
         """Navigate to chat page."""
         st.session_state.page = Page.CHAT
@@ -58,10 +66,18 @@ class AppRouter:
 
     def _reset_all_model_states(self):
         """Reset all model states to ensure clean session start"""
+        # 実行中の生成を先に止めて、LLMサーバーの処理を解放する
+        self._cancel_generations("new_url")
+
         # Reset conversation model if exists
         if "conversation_model" in st.session_state:
             st.session_state.conversation_model.reset()
 
+        # Reset ingestion orchestrator first so a running embedding cannot
+        # publish the old page's index after the vector store is cleared
+        if "ingestion_orchestrator" in st.session_state:
+            st.session_state.ingestion_orchestrator.reset()
+
         # Reset vector store if exists
         if "vector_store" in st.session_state:
             st.session_state.vector_store.reset()
@@ -74,6 +90,12 @@ class AppRouter:
         if "scraping_model" in st.session_state:
             st.session_state.scraping_model.reset()
 
+    def _cancel_generations(self, reason: str):
+        """Cancel in-flight LLM generations of the session."""
+        for key in ("summarization_model", "conversation_model"):
+            if key in st.session_state:
+                st.session_state[key].cancel(reason)
+
 
 # Initialize app_router only if it doesn't exist
 if "app_router" not in st.session_state:
@@ -0,0 +1,71 @@
+from .answer_cache import SemanticAnswerCache
+from .asset_registry import AssetRegistry, asset_registry
+from .async_runtime import AsyncRuntime, async_runtime
+from .cancellation import CancellationToken, GenerationCancelledError
+from .disconnect_watcher import DisconnectWatcher, disconnect_watcher
+from .ingestion_orchestrator import (
+    IngestionJob,
+    IngestionOrchestrator,
+    StageState,
+    StageStatus,
+)
+from .llm_scheduler import (
+    LLMScheduler,
+    Priority,
+    ScheduledClient,
+    SchedulerQueueFullError,
+    SessionClient,
+    llm_scheduler,
+    scheduling_priority,
+)
+from .load_balancer import LoadBalancedClient
+from .metrics import MetricsRegistry, metrics
+from .metrics_exporter import MetricsExporter, metrics_exporter
+from .profiler import RerunProfiler, profiler
+from .render_scheduler import RenderScheduler
+from .session_memory import SessionMemoryAccountant, SpillStore, session_memory
+from .single_flight import SingleFlightClient
+from .tracing import Span, Tracer, configure_json_logging, tracer
+from .warmup import Warmup, warm_up_steps, warmup
+
+__all__ = [
+    "AssetRegistry",
+    "AsyncRuntime",
+    "CancellationToken",
+    "DisconnectWatcher",
+    "GenerationCancelledError",
+    "IngestionJob",
+    "IngestionOrchestrator",
+    "LLMScheduler",
+    "LoadBalancedClient",
+    "MetricsExporter",
+    "MetricsRegistry",
+    "Priority",
+    "RenderScheduler",
+    "RerunProfiler",
+    "ScheduledClient",
+    "SchedulerQueueFullError",
+    "SemanticAnswerCache",
+    "SessionClient",
+    "SessionMemoryAccountant",
+    "SingleFlightClient",
+    "Span",
+    "SpillStore",
+    "StageState",
+    "StageStatus",
+    "Tracer",
+    "Warmup",
+    "asset_registry",
+    "async_runtime",
+    "configure_json_logging",
+    "disconnect_watcher",
+    "llm_scheduler",
+    "metrics",
+    "metrics_exporter",
+    "profiler",
+    "scheduling_priority",
+    "session_memory",
+    "tracer",
+    "warm_up_steps",
+    "warmup",
+]
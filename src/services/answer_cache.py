@@ -0,0 +1,176 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from src.services.metrics import metrics
+
+# 直前の会話を参照している質問（指示語・続きの要求など）
+# 英語の指示代名詞は文頭か単独で使われた場合のみ対象にする
+# （"What is this page about?" のように名詞を修飾する場合は履歴に依存しない）
+CONTEXT_DEPENDENT_PATTERN = re.compile(
+    r"(それ(?!ぞれ)|あれ|これ(?!から|まで)"
+    r"|(その|あの|この)(?!ページ|記事|サイト|文章|内容)"
+    r"|さっき|先ほど|(?<!名)前の|上記|続き|他には|もっと|詳しく)"
+    r"|\b(it|they|them)\b"
+    r"|^\s*(this|that|these|those)\b"
+    r"|\b(this|that|these|those)(\s+ones?)?\s*([?.!,]|$)"
+    r"|\b(the above|previous (answer|question|response|reply)"
+    r"|(you|we) (just )?(said|mentioned|discussed)|(said|say|mention(ed)?) earlier"
+    r"|tell me more|more (details|detail|info|information)|anything else|what else)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class CachedAnswer:
+    """An answer stored for a question on a given page"""
+
+    question: str
+    embedding: np.ndarray
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Process-wide cache of answers, keyed by page content and question meaning.
+
+    A stored answer is returned when the cosine similarity between the new question
+    and a cached question on the same page exceeds the threshold. Entries expire
+    after ttl_seconds; pages are evicted least-recently-used.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        ttl_seconds: float = 3600,
+        max_pages: int = 256,
+        max_entries_per_page: int = 64,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_pages = max_pages
+        self.max_entries_per_page = max_entries_per_page
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pages: OrderedDict[str, list[CachedAnswer]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def page_key(page_content: str, namespace: str = "") -> str:
+        """
+        Build the cache key of a page.
+
+        Args:
+            page_content: The scraped page content
+            namespace: Distinguishes incompatible question embeddings (e.g. model name)
+
+        Returns:
+            str: Hex digest identifying the page
+        """
+        digest = hashlib.sha256(namespace.encode("utf-8"))
+        digest.update(page_content.encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def is_history_independent(question: str) -> bool:
+        """
+        Check whether a question can be answered without the conversation history.
+        """
+        return not CONTEXT_DEPENDENT_PATTERN.search(question)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, page_key: str, question_embedding) -> str | None:
+        """
+        Find a cached answer for a semantically equivalent question.
+
+        Args:
+            page_key: Key returned by page_key()
+            question_embedding: Embedding of the new question
+
+        Returns:
+            str | None: The cached answer, or None on a miss
+        """
+        query = self._normalize(question_embedding)
+        now = self._clock()
+        answer = None
+        with self._lock:
+            entries = self._pages.get(page_key)
+            if entries:
+                entries[:] = [
+                    e for e in entries if now - e.created_at < self.ttl_seconds
+                ]
+            if entries:
+                self._pages.move_to_end(page_key)
+                similarities = np.stack([e.embedding for e in entries]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    answer = entries[best].answer
+            elif entries is not None:
+                del self._pages[page_key]
+
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        metrics.increment(
+            "answer_cache_requests_total", result="hit" if answer else "miss"
+        )
+        return answer
+
+    def store(self, page_key: str, question: str, question_embedding, answer: str):
+        """
+        Store the answer to a history-independent question.
+
+        Args:
+            page_key: Key returned by page_key()
+            question: The question text
+            question_embedding: Embedding of the question
+            answer: The visible answer given to the user
+        """
+        entry = CachedAnswer(
+            question=question,
+            embedding=self._normalize(question_embedding),
+            answer=answer,
+            created_at=self._clock(),
+        )
+        with self._lock:
+            entries = self._pages.setdefault(page_key, [])
+            self._pages.move_to_end(page_key)
+            entries.append(entry)
+            if len(entries) > self.max_entries_per_page:
+                del entries[0]
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the number of cached answers."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "pages": len(self._pages),
+                "entries": sum(len(entries) for entries in self._pages.values()),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,147 @@
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STATIC_ROOT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static"
+)
+ASSET_EXTENSIONS = (".css", ".svg")
+
+CSS_COMMENT_PATTERN = re.compile(r"/\*.*?\*/", re.DOTALL)
+CSS_WHITESPACE_PATTERN = re.compile(r"\s+")
+# コロンの前の空白はセレクタ(例: "div :hover")で意味を持つため残す
+CSS_PUNCTUATION_PATTERN = re.compile(r"\s*([{};,>])\s*")
+
+
+def minify_css(css: str) -> str:
+    """
+    Remove comments and redundant whitespace from a stylesheet.
+
+    Args:
+        css: The stylesheet source
+
+    Returns:
+        str: The minified stylesheet
+    """
+    css = CSS_COMMENT_PATTERN.sub("", css)
+    css = CSS_WHITESPACE_PATTERN.sub(" ", css)
+    css = CSS_PUNCTUATION_PATTERN.sub(r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+@dataclass
+class _Asset:
+    content: str
+    mtime: float
+
+
+class AssetRegistry:
+    """
+    In-memory cache of the static assets (CSS and SVG files).
+
+    Every asset under the static directory is read once, so script reruns do no
+    disk I/O. Combined, minified stylesheets are cached per set of files. With
+    reload enabled (for development), a file is read again when its mtime changes.
+    """
+
+    def __init__(self, root: str = STATIC_ROOT, reload: bool = False):
+        """
+        Args:
+            root: Directory holding the static assets
+            reload: Re-read files whose modification time has changed
+        """
+        self.root = root
+        self.reload = reload
+        self._lock = threading.Lock()
+        self._assets: dict[str, _Asset] = {}
+        self._stylesheets: dict[tuple[str, ...], str] = {}
+        self._load_all()
+
+    def configure(self, reload: bool = False):
+        """Enable or disable reloading of modified files."""
+        self.reload = reload
+
+    def _load_all(self):
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(ASSET_EXTENSIONS):
+                    path = os.path.join(directory, filename)
+                    self._load(os.path.relpath(path, self.root).replace(os.sep, "/"))
+
+    def _load(self, name: str) -> _Asset | None:
+        path = os.path.join(self.root, name)
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, "r", encoding="utf-8") as f:
+                asset = _Asset(f.read(), mtime)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._assets[name] = asset
+            # 結合済みのスタイルシートは作り直す
+            self._stylesheets.clear()
+        metrics.increment("static_asset_loads_total")
+        return asset
+
+    def _is_stale(self, name: str, asset: _Asset) -> bool:
+        try:
+            return os.path.getmtime(os.path.join(self.root, name)) != asset.mtime
+        except FileNotFoundError:
+            return False
+
+    def get(self, name: str) -> str | None:
+        """
+        Return the content of an asset.
+
+        Args:
+            name: Path relative to the static directory, e.g. "css/query_page.css"
+
+        Returns:
+            str | None: The file content, or None if the asset does not exist
+        """
+        with self._lock:
+            asset = self._assets.get(name)
+        if asset is None or (self.reload and self._is_stale(name, asset)):
+            asset = self._load(name)
+        return asset.content if asset else None
+
+    def stylesheet(self, *names: str) -> str:
+        """
+        Return the given CSS files combined into one minified stylesheet.
+
+        Missing files are skipped with a warning.
+        """
+        if self.reload:
+            for name in names:
+                self.get(name)
+        with self._lock:
+            cached = self._stylesheets.get(names)
+        if cached is not None:
+            return cached
+
+        parts = []
+        for name in names:
+            content = self.get(name)
+            if content is None:
+                logger.warning(f"Stylesheet not found: {name}")
+                continue
+            parts.append(minify_css(content))
+        combined = "".join(parts)
+        with self._lock:
+            self._stylesheets[names] = combined
+        return combined
+
+    def style_tag(self, *names: str) -> str:
+        """Return the combined stylesheet wrapped in a single <style> element."""
+        return f"<style>{self.stylesheet(*names)}</style>"
+
+
+# Process-wide registry, loaded once at startup
+asset_registry = AssetRegistry()
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Callable, Coroutine, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Markers passed from the event loop to the consuming thread
+_ITEM = "item"
+_END = "end"
+_ERROR = "error"
+
+
+class AsyncRuntime:
+    """
+    A single long-lived asyncio event loop running in a daemon thread.
+
+    Synchronous code (the Streamlit script threads, worker threads) hands coroutines
+    and async generators to this loop instead of creating and tearing down a loop
+    per call, so connection pools and other loop-bound resources of async clients
+    survive between calls.
+
+    Coroutines run on a shared loop: they must not block. Move CPU-bound work to a
+    thread with asyncio.to_thread().
+    """
+
+    def __init__(self, name: str = "async-runtime"):
+        self._name = name
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running loop, started on first use."""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._start()
+            return self._loop
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(started.set)
+            loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name=self._name, daemon=True)
+        self._thread.start()
+        started.wait()
+        self._loop = loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """
+        Schedule a coroutine on the loop.
+
+        The coroutine runs in a copy of the caller's contextvars context.
+
+        Returns:
+            Future: A concurrent.futures.Future with the coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: float = None):
+        """Run a coroutine on the loop and block until it returns."""
+        return self.submit(coro).result(timeout=timeout)
+
+    def iterate(
+        self,
+        async_gen: AsyncIterator,
+        on_wait: Callable[[], None] = None,
+        wait_interval: float = 0.5,
+    ) -> Iterator:
+        """
+        Iterate an async generator from synchronous code.
+
+        The generator is closed on the loop when iteration stops early, so the
+        underlying stream is released.
+
+        Args:
+            async_gen: The async generator to iterate
+            on_wait: Called every wait_interval seconds while waiting for an item, and
+                once more when the awaited item arrives
+            wait_interval: Seconds between two on_wait calls
+
+        Yields:
+            The items of the async generator
+        """
+        items: queue.Queue = queue.Queue()
+        finished = threading.Event()
+
+        async def pump():
+            try:
+                async for item in async_gen:
+                    items.put((_ITEM, item))
+                items.put((_END, None))
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                items.put((_ERROR, e))
+            finally:
+                try:
+                    await async_gen.aclose()
+                finally:
+                    finished.set()
+
+        future = self.submit(pump())
+        waited = False
+        try:
+            while True:
+                try:
+                    kind, value = items.get(timeout=wait_interval if on_wait else None)
+                except queue.Empty:
+                    waited = True
+                    on_wait()
+                    continue
+                if waited:
+                    waited = False
+                    on_wait()
+                if kind == _END:
+                    return
+                if kind == _ERROR:
+                    raise value
+                yield value
+        finally:
+            if not finished.is_set():
+                future.cancel()
+                if not finished.wait(timeout=5):
+                    logger.warning("Async generator did not close within 5 seconds")
+
+
+# Process-wide runtime shared by every session
+async_runtime = AsyncRuntime()
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+from src.services.metrics import metrics
+from src.services.tracing import set_span_attribute
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets for the number of streamed chunks (≈ tokens) of a generation
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class GenerationCancelledError(Exception):
+    """Raised when an LLM generation is stopped through its CancellationToken"""
+
+
+class CancellationToken:
+    """
+    Thread-safe flag used to stop an in-flight LLM generation.
+
+    Callbacks registered with add_callback run once when the token is cancelled, so
+    a generation blocked on the network can be interrupted without waiting for the
+    next chunk.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks: list[Callable[[], None]] = []
+        self.reason = ""
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancel the token and run the registered callbacks (only the first call)."""
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Cancellation callback failed")
+
+    def raise_if_cancelled(self):
+        """
+        Raises:
+            GenerationCancelledError: If the token has been cancelled
+        """
+        if self._cancelled:
+            raise GenerationCancelledError(self.reason)
+
+    def add_callback(self, callback: Callable[[], None]):
+        """Register a callback; it runs immediately if the token is already cancelled."""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def _interrupt_on_cancel(token: CancellationToken) -> Callable[[], None]:
+    """
+    Register a callback that cancels the calling asyncio task when the token is
+    cancelled, possibly from another thread.
+
+    Returns:
+        Callable: The registered callback, to be passed to token.remove_callback()
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+
+    def interrupt():
+        try:
+            loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            # ループが既に閉じられている場合は何もしない
+            pass
+
+    token.add_callback(interrupt)
+    return interrupt
+
+
+def _record_cancellation(operation: str, generated_chunks: int):
+    """
+    Count a cancelled generation and estimate the tokens it did not generate.
+
+    The estimate is the average length of completed generations of the same
+    operation minus what was already streamed.
+    """
+    metrics.increment("llm_generations_cancelled_total", operation=operation)
+    completed = metrics.get_histogram("llm_generation_tokens", operation=operation)
+    if completed is None or completed.count == 0:
+        return
+    saved = completed.sum / completed.count - generated_chunks
+    if saved > 0:
+        metrics.increment("llm_tokens_saved_total", saved, operation=operation)
+
+
+def _record_ttft(operation: str, ttft: float):
+    """Time to the first token, including the wait for a generation slot."""
+    metrics.observe("llm_time_to_first_token_seconds", ttft, operation=operation)
+    set_span_attribute("ttft_seconds", round(ttft, 4))
+
+
+def _record_token_rate(operation: str, chunks: int, first_chunk_at: float | None):
+    """Decoding speed, from the first token to the end of the stream."""
+    set_span_attribute("tokens", chunks)
+    if first_chunk_at is None or chunks < 2:
+        return
+    elapsed = time.monotonic() - first_chunk_at
+    if elapsed <= 0:
+        return
+    rate = (chunks - 1) / elapsed
+    metrics.observe(
+        "llm_tokens_per_second", rate, buckets=TOKEN_RATE_BUCKETS, operation=operation
+    )
+    set_span_attribute("tokens_per_second", round(rate, 1))
+
+
+async def cancellable_stream(
+    stream: AsyncIterator[str], token: CancellationToken, operation: str
+) -> AsyncIterator[str]:
+    """
+    Relay an LLM token stream until it ends or the token is cancelled.
+
+    On cancellation, or when the consumer stops iterating early, the underlying
+    stream is closed right away so the HTTP request to the LLM server is aborted.
+
+    Args:
+        stream: The async generator returned by the client's gen_stream()
+        token: Token used to cancel the generation
+        operation: Label for the metrics (e.g. "summary", "chat")
+
+    Yields:
+        str: The chunks of the stream
+
+    Raises:
+        GenerationCancelledError: If the token is cancelled
+    """
+    iterator = stream.__aiter__()
+    generated_chunks = 0
+    started_at = time.monotonic()
+    first_chunk_at = None
+    # "completed", "cancelled" (token or early close by the consumer) or "failed"
+    outcome = "cancelled"
+    try:
+        while True:
+            token.raise_if_cancelled()
+            # 待機中にキャンセルされた場合もすぐに中断できるようにする
+            interrupt = _interrupt_on_cancel(token)
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            except asyncio.CancelledError:
+                if token.cancelled:
+                    raise GenerationCancelledError(token.reason) from None
+                raise
+            finally:
+                token.remove_callback(interrupt)
+            generated_chunks += 1
+            if first_chunk_at is None:
+                first_chunk_at = time.monotonic()
+                _record_ttft(operation, first_chunk_at - started_at)
+            yield chunk
+        outcome = "completed"
+    except GenerationCancelledError:
+        raise
+    except Exception:
+        outcome = "failed"
+        raise
+    finally:
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+        if outcome == "completed":
+            metrics.observe(
+                "llm_generation_tokens",
+                generated_chunks,
+                buckets=TOKEN_BUCKETS,
+                operation=operation,
+            )
+            _record_token_rate(operation, generated_chunks, first_chunk_at)
+        elif outcome == "cancelled":
+            _record_cancellation(operation, generated_chunks)
+
+
+async def cancellable_call(
+    awaitable: Awaitable, token: CancellationToken, operation: str
+):
+    """
+    Await a non-streaming LLM request that is aborted when the token is cancelled.
+
+    Args:
+        awaitable: The coroutine returned by the client's gen_batch()
+        token: Token used to cancel the generation
+        operation: Label for the metrics
+
+    Returns:
+        The result of the awaitable
+
+    Raises:
+        GenerationCancelledError: If the token is cancelled
+    """
+    if token.cancelled:
+        # 未実行のコルーチンを閉じて "never awaited" の警告を避ける
+        if hasattr(awaitable, "close"):
+            awaitable.close()
+        raise GenerationCancelledError(token.reason)
+    interrupt = _interrupt_on_cancel(token)
+    try:
+        return await awaitable
+    except asyncio.CancelledError:
+        if token.cancelled:
+            metrics.increment("llm_generations_cancelled_total", operation=operation)
+            raise GenerationCancelledError(token.reason) from None
+        raise
+    finally:
+        token.remove_callback(interrupt)
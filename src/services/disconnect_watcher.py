@@ -0,0 +1,131 @@
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Watch:
+    client_id: str
+    callback: Callable[[], None]
+    seen_connected: bool = False
+    disconnected_at: float | None = None
+
+
+class DisconnectWatcher:
+    """
+    Cancels the generations of browser sessions that have gone away.
+
+    When a tab is closed Streamlit only requests the script to stop, and the request
+    is honoured at the script's next st.* call; a generation queued for an LLM slot
+    or waiting for the next token keeps the server busy until then. While one is
+    watched, a daemon thread polls is_connected(client_id) and runs the callback
+    once the client has stayed disconnected for grace_seconds (a short network
+    drop reconnects to the same session). A client that was never seen connected,
+    such as a script run under AppTest, is never cancelled.
+    """
+
+    def __init__(
+        self,
+        is_connected: Callable[[str], bool] = None,
+        interval: float = 1.0,
+        grace_seconds: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.is_connected = is_connected
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._watches: dict[int, _Watch] = {}
+        self._ids = itertools.count()
+        self._thread: threading.Thread | None = None
+
+    def configure(
+        self,
+        is_connected: Callable[[str], bool],
+        interval: float = 1.0,
+        grace_seconds: float = 5.0,
+    ):
+        """Set how client connectivity is checked and how long a drop is tolerated."""
+        self.is_connected = is_connected
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+
+    @contextmanager
+    def watch(self, client_id: str, callback: Callable[[], None]) -> Iterator[None]:
+        """
+        Run callback if the client disconnects before the block exits.
+
+        Args:
+            client_id: Id of the browser session (Streamlit's script run session id)
+            callback: Called at most once, from the watcher thread
+        """
+        if not client_id or self.is_connected is None:
+            yield
+            return
+        with self._lock:
+            watch_id = next(self._ids)
+            self._watches[watch_id] = _Watch(client_id, callback)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="disconnect-watcher", daemon=True
+                )
+                self._thread.start()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._watches.pop(watch_id, None)
+
+    def poll(self):
+        """Check every watched client once and cancel the ones that went away."""
+        with self._lock:
+            watches = list(self._watches.items())
+        now = self._clock()
+        for watch_id, watch in watches:
+            try:
+                connected = self.is_connected(watch.client_id)
+            except Exception:
+                logger.exception("Failed to check the client connection")
+                continue
+            if connected:
+                watch.seen_connected = True
+                watch.disconnected_at = None
+                continue
+            if not watch.seen_connected:
+                continue
+            if watch.disconnected_at is None:
+                watch.disconnected_at = now
+            if now - watch.disconnected_at < self.grace_seconds:
+                continue
+            with self._lock:
+                if self._watches.pop(watch_id, None) is None:
+                    continue
+            logger.info("Client %s disconnected, cancelling", watch.client_id)
+            metrics.increment("disconnect_cancellations_total")
+            try:
+                watch.callback()
+            except Exception:
+                logger.exception("Disconnect callback failed")
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._watches:
+                    # 監視対象がなくなったらスレッドを終了し、次のwatch()で再開する
+                    self._thread = None
+                    return
+            self.poll()
+            time.sleep(self.interval)
+
+
+# Process-wide watcher shared by every session
+disconnect_watcher = DisconnectWatcher()
@@ -0,0 +1,349 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable
+
+from src.services.cancellation import CancellationToken
+from src.services.metrics import metrics
+from src.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Process-wide pool so that embedding work from every session shares a bounded
+# number of CPU workers instead of blocking each session's script thread.
+_EMBEDDING_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="embedding")
+
+# Process-wide pool for page downloads: a slow site occupies a worker for up to the
+# request timeout instead of the session's script thread.
+_INGESTION_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ingestion")
+
+
+class StageState(Enum):
+    """Lifecycle of an ingestion stage"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+@dataclass
+class StageStatus:
+    """Status and timing of a single ingestion stage"""
+
+    state: StageState = StageState.PENDING
+    started_at: float | None = None
+    first_output_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    @property
+    def duration(self) -> float | None:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+@dataclass(eq=False)
+class IngestionJob:
+    """A page ingestion submitted to the worker pool, polled by the UI"""
+
+    job_id: str
+    url: str
+    state: StageState = StageState.PENDING
+    error: str | None = None
+    submitted_at: float = field(default_factory=time.monotonic)
+    cancel_token: CancellationToken = field(default_factory=CancellationToken)
+    future: Future | None = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.state in (StageState.PENDING, StageState.RUNNING)
+
+
+class IngestionOrchestrator:
+    """
+    Coordinates the ingestion of a page: scrape, then summarize and embed in parallel.
+
+    Summarization starts as soon as the text has been extracted, while embedding runs
+    concurrently in a worker thread. Stage statuses are exposed for the UI.
+
+    The scrape can be submitted as an IngestionJob so that the script thread only
+    polls its status and the user can cancel it.
+    """
+
+    STAGES = ("scrape", "summarize", "embed")
+
+    def __init__(
+        self,
+        executor: ThreadPoolExecutor = None,
+        job_executor: ThreadPoolExecutor = None,
+        on_embedded: Callable[[], None] = None,
+    ):
+        """
+        Args:
+            executor: Pool running the embeddings (shared pool if None)
+            job_executor: Pool running the ingestion jobs (shared pool if None)
+            on_embedded: Called from the worker thread once new embeddings are
+                published, e.g. to account for the session's memory again
+        """
+        self._executor = executor or _EMBEDDING_EXECUTOR
+        self._job_executor = job_executor or _INGESTION_EXECUTOR
+        self._on_embedded = on_embedded
+        # Reentrant so that job updates can mark stages while holding it
+        self._lock = threading.RLock()
+        self._embedding_future: Future | None = None
+        self._job: IngestionJob | None = None
+        # Incremented on reset so that stale workers do not update the new ingestion
+        self._generation = 0
+        self.stages = {name: StageStatus() for name in self.STAGES}
+
+    # --- Stage bookkeeping ---
+
+    def mark_running(self, stage: str):
+        with self._lock:
+            self.stages[stage] = StageStatus(
+                state=StageState.RUNNING, started_at=time.monotonic()
+            )
+
+    def mark_first_output(self, stage: str):
+        """Record the first output of a stage, e.g. the first summary token."""
+        with self._lock:
+            status = self.stages[stage]
+            if status.first_output_at is not None:
+                return
+            status.first_output_at = time.monotonic()
+            scrape_finished_at = self.stages["scrape"].finished_at
+        if stage == "summarize" and scrape_finished_at is not None:
+            metrics.observe(
+                "time_to_first_summary_token_seconds",
+                status.first_output_at - scrape_finished_at,
+            )
+
+    def mark_done(self, stage: str):
+        with self._lock:
+            status = self.stages[stage]
+            status.state = StageState.DONE
+            status.finished_at = time.monotonic()
+        if status.duration is not None:
+            metrics.observe("ingestion_stage_seconds", status.duration, stage=stage)
+
+    def mark_failed(self, stage: str, error: str):
+        with self._lock:
+            status = self.stages[stage]
+            status.state = StageState.FAILED
+            status.finished_at = time.monotonic()
+            status.error = error
+        metrics.increment("ingestion_stage_failures_total", stage=stage)
+
+    def get_status(self, stage: str) -> StageStatus:
+        with self._lock:
+            return self.stages[stage]
+
+    # --- Stages ---
+
+    def run_scrape(self, scraping_model, url: str) -> str:
+        """
+        Scrape the page synchronously and record the stage status.
+
+        Raises:
+            ValueError: If scraping fails
+        """
+        self.mark_running("scrape")
+        try:
+            content = scraping_model.scrape(url)
+        except Exception as e:
+            self.mark_failed("scrape", str(e))
+            raise
+        self.mark_done("scrape")
+        return content
+
+    def start_embedding(self, vector_store, content: str) -> Future:
+        """
+        Create the embeddings of the page in a worker thread.
+
+        Args:
+            vector_store: The session's VectorStore
+            content: The scraped page content
+
+        Returns:
+            Future: Completes when the embeddings are available
+        """
+        self.mark_running("embed")
+        with self._lock:
+            generation = self._generation
+            # 取り込みのトレースIDを埋め込みのスパンに引き継ぐ
+            future = self._executor.submit(
+                contextvars.copy_context().run,
+                self._embed,
+                vector_store,
+                content,
+                generation,
+            )
+            self._embedding_future = future
+        return future
+
+    def _embed(self, vector_store, content: str, generation: int):
+        with tracer.span("create_embeddings"):
+            index = vector_store.compute_index(content)
+        with self._lock:
+            # 作成中にNew URLやリセットがあった場合、古いページの索引は公開しない
+            if generation != self._generation:
+                return
+            if index is None:
+                logger.error(vector_store.last_error)
+                self.mark_failed("embed", vector_store.last_error)
+                return
+            vector_store.set_index(*index)
+            self.mark_done("embed")
+        if self._on_embedded is not None:
+            self._on_embedded()
+
+    def wait_for_embeddings(self, timeout: float = None) -> bool:
+        """
+        Block until the embedding stage has finished.
+
+        Args:
+            timeout: Maximum number of seconds to wait (None waits indefinitely)
+
+        Returns:
+            bool: True if no embedding work is pending anymore
+        """
+        with self._lock:
+            future = self._embedding_future
+        if future is None:
+            return True
+        try:
+            future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return False
+        except CancelledError:
+            pass
+        return True
+
+    # --- Jobs ---
+
+    def start_ingestion(
+        self, scraping_model, vector_store, url: str, timeout=(30, 90)
+    ) -> str:
+        """
+        Submit the ingestion of a page to the worker pool without blocking.
+
+        The worker downloads the page, stores its text on the scraping model and
+        starts the embedding. A job that is still running is cancelled first.
+
+        Args:
+            scraping_model: The session's ScrapingModel
+            vector_store: The session's VectorStore (None skips embedding)
+            url: The page to ingest
+            timeout: Request timeout tuple (connect, read)
+
+        Returns:
+            str: The id of the job, for get_job() and cancel_job()
+        """
+        self.cancel_job()
+        job = IngestionJob(job_id=uuid.uuid4().hex, url=url)
+        with self._lock:
+            self._generation += 1
+            self.stages = {name: StageStatus() for name in self.STAGES}
+            self._job = job
+            job.future = self._job_executor.submit(
+                self._run_job, job, scraping_model, vector_store, timeout
+            )
+        return job.job_id
+
+    def get_job(self, job_id: str = None) -> IngestionJob | None:
+        """Return the current job, or None if job_id does not refer to it."""
+        with self._lock:
+            job = self._job
+        if job is None or (job_id is not None and job.job_id != job_id):
+            return None
+        return job
+
+    def cancel_job(self, job_id: str = None) -> bool:
+        """
+        Cancel the current job if it has not finished yet.
+
+        A download already in progress cannot be interrupted; it finishes in the
+        background and its result is discarded.
+
+        Returns:
+            bool: True if a job was cancelled
+        """
+        with self._lock:
+            job = self.get_job(job_id)
+            if job is None or not job.is_active:
+                return False
+            job.cancel_token.cancel("cancelled")
+            if job.future is not None:
+                job.future.cancel()
+            job.state = StageState.CANCELLED
+            self.stages["scrape"] = StageStatus(
+                state=StageState.CANCELLED, finished_at=time.monotonic()
+            )
+        metrics.increment("ingestion_jobs_total", result="cancelled")
+        return True
+
+    def _is_current(self, job: IngestionJob) -> bool:
+        return self._job is job and not job.cancel_token.cancelled
+
+    def _run_job(
+        self, job: IngestionJob, scraping_model, vector_store, timeout
+    ) -> None:
+        # ジョブIDを取り込みの相関IDとして、後続の要約・埋め込みでも使う
+        with tracer.trace("ingestion", trace_id=job.job_id, url=job.url):
+            self._process_job(job, scraping_model, vector_store, timeout)
+
+    def _process_job(
+        self, job: IngestionJob, scraping_model, vector_store, timeout
+    ) -> None:
+        with self._lock:
+            if not self._is_current(job):
+                return
+            job.state = StageState.RUNNING
+            self.mark_running("scrape")
+        metrics.observe(
+            "ingestion_job_queue_seconds", time.monotonic() - job.submitted_at
+        )
+
+        try:
+            content = scraping_model.fetch(job.url, timeout=timeout)
+        except Exception as e:
+            with self._lock:
+                if not self._is_current(job):
+                    return
+                job.state = StageState.FAILED
+                job.error = str(e)
+                self.mark_failed("scrape", str(e))
+            metrics.increment("ingestion_jobs_total", result="failed")
+            return
+
+        with self._lock:
+            # キャンセル後に完了したダウンロードの結果は捨てる
+            if not self._is_current(job):
+                return
+            scraping_model.content = content
+            self.mark_done("scrape")
+            # embeddingはワーカーで並行して作成し、要約の開始を待たせない
+            if vector_store is not None and content:
+                self.start_embedding(vector_store, content)
+            job.state = StageState.DONE
+        metrics.increment("ingestion_jobs_total", result="done")
+
+    def reset(self):
+        """Forget the current ingestion. Work already running is left to finish."""
+        self.cancel_job()
+        with self._lock:
+            self._job = None
+            if self._embedding_future is not None:
+                self._embedding_future.cancel()
+            self._embedding_future = None
+            self._generation += 1
+            self.stages = {name: StageStatus() for name in self.STAGES}
@@ -0,0 +1,356 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import AsyncGenerator
+
+from src.services.metrics import metrics
+from src.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Scheduling priority of an LLM request (lower runs first)"""
+
+    INTERACTIVE = 0
+    SUMMARY = 1
+    BACKGROUND = 2
+
+
+@dataclass(frozen=True)
+class RequestContext:
+    """Who is sending the current LLM request"""
+
+    session_id: str = "anonymous"
+    priority: Priority = Priority.INTERACTIVE
+
+
+_request_context: ContextVar[RequestContext] = ContextVar(
+    "llm_request_context", default=RequestContext()
+)
+_priority_override: ContextVar[Priority | None] = ContextVar(
+    "llm_priority_override", default=None
+)
+
+
+def current_request_context() -> RequestContext:
+    """Return the request context, with any scheduling_priority() override applied."""
+    context = _request_context.get()
+    override = _priority_override.get()
+    if override is not None and override != context.priority:
+        return RequestContext(session_id=context.session_id, priority=override)
+    return context
+
+
+@contextlib.contextmanager
+def scheduling_priority(priority: Priority):
+    """Run the enclosed LLM requests with the given priority, e.g. for background work."""
+    token = _priority_override.set(priority)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+class SchedulerQueueFullError(Exception):
+    """Raised when too many requests are already waiting for the LLM server"""
+
+
+@dataclass(eq=False)
+class _Waiter:
+    session_id: str
+    priority: Priority
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    granted: bool = False
+
+
+class _ModelQueue:
+    """Running count and per-priority, per-session queues of one model."""
+
+    def __init__(self):
+        self.running = 0
+        # priority -> session_id -> waiters of that session, oldest first
+        self.queues: dict[Priority, OrderedDict[str, deque[_Waiter]]] = {
+            priority: OrderedDict() for priority in Priority
+        }
+
+    def __len__(self) -> int:
+        return sum(
+            len(waiters)
+            for sessions in self.queues.values()
+            for waiters in sessions.values()
+        )
+
+    def push(self, waiter: _Waiter):
+        sessions = self.queues[waiter.priority]
+        sessions.setdefault(waiter.session_id, deque()).append(waiter)
+
+    def remove(self, waiter: _Waiter):
+        sessions = self.queues[waiter.priority]
+        waiters = sessions.get(waiter.session_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del sessions[waiter.session_id]
+
+    def pop(self) -> _Waiter | None:
+        """Take the next waiter: highest priority first, round-robin over sessions."""
+        for priority in Priority:
+            sessions = self.queues[priority]
+            if not sessions:
+                continue
+            session_id, waiters = next(iter(sessions.items()))
+            waiter = waiters.popleft()
+            # 同じセッションの次のリクエストは他のセッションの後ろに回す
+            del sessions[session_id]
+            if waiters:
+                sessions[session_id] = waiters
+            return waiter
+        return None
+
+    def ahead_of(self, session_id: str) -> int | None:
+        """Number of requests dispatched before the session's oldest waiter."""
+        ahead = 0
+        for priority in Priority:
+            sessions = self.queues[priority]
+            if session_id not in sessions:
+                ahead += sum(len(waiters) for waiters in sessions.values())
+                continue
+            # ラウンドロビンなので、前にいるセッションからは1件ずつ先に処理される
+            for other_id, waiters in sessions.items():
+                if other_id == session_id:
+                    return ahead
+                ahead += 1
+        return None
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM generations.
+
+    At most max_concurrency generations run per model. Further requests wait in a
+    queue ordered by priority (interactive Q&A before summaries before background
+    work) and, within a priority, round-robin across sessions so that one session
+    cannot starve the others. Requests are rejected once max_queue_size are waiting.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 2,
+        max_queue_size: int = 100,
+        per_model_concurrency: dict[str, int] = None,
+    ):
+        self._lock = threading.Lock()
+        self._models: dict[str, _ModelQueue] = {}
+        self.configure(max_concurrency, max_queue_size, per_model_concurrency)
+
+    def configure(
+        self,
+        max_concurrency: int = 2,
+        max_queue_size: int = 100,
+        per_model_concurrency: dict[str, int] = None,
+    ):
+        """Update the limits; requests already running are not affected."""
+        with self._lock:
+            self.max_concurrency = max_concurrency
+            self.max_queue_size = max_queue_size
+            self.per_model_concurrency = dict(per_model_concurrency or {})
+
+    def _limit(self, model: str) -> int:
+        return self.per_model_concurrency.get(model, self.max_concurrency)
+
+    # --- Introspection for the UI ---
+
+    def queue_depth(self, model: str = None) -> int:
+        """Number of waiting requests, for one model or in total."""
+        with self._lock:
+            if model is not None:
+                queue = self._models.get(model)
+                return len(queue) if queue else 0
+            return sum(len(queue) for queue in self._models.values())
+
+    def position(self, session_id: str) -> int | None:
+        """
+        Number of requests ahead of the session's oldest waiting request.
+
+        Returns:
+            int | None: Requests ahead, or None if the session is not waiting
+        """
+        with self._lock:
+            positions = [
+                ahead
+                for queue in self._models.values()
+                if (ahead := queue.ahead_of(session_id)) is not None
+            ]
+        return min(positions) if positions else None
+
+    # --- Admission ---
+
+    async def acquire(self, model: str, context: RequestContext = None):
+        """
+        Wait for a generation slot of the model.
+
+        Raises:
+            SchedulerQueueFullError: If the queue is full
+        """
+        context = context or current_request_context()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            queue = self._models.setdefault(model, _ModelQueue())
+            if queue.running < self._limit(model) and len(queue) == 0:
+                queue.running += 1
+                self._update_gauges(model, queue)
+                metrics.observe(
+                    "llm_queue_wait_seconds", 0.0, priority=context.priority.name
+                )
+                return
+            if len(queue) >= self.max_queue_size:
+                metrics.increment("llm_requests_rejected_total", model=model)
+                raise SchedulerQueueFullError(
+                    "LLMサーバーが混み合っています。しばらくしてから再度お試しください。"
+                )
+            waiter = _Waiter(
+                session_id=context.session_id,
+                priority=context.priority,
+                loop=loop,
+                future=loop.create_future(),
+            )
+            queue.push(waiter)
+            self._update_gauges(model, queue)
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    queue.remove(waiter)
+                    self._update_gauges(model, queue)
+            if granted:
+                # 割り当て直後にキャンセルされた場合は枠を返す
+                self.release(model)
+            raise
+        metrics.observe(
+            "llm_queue_wait_seconds",
+            time.monotonic() - waiter.enqueued_at,
+            priority=context.priority.name,
+        )
+
+    def release(self, model: str):
+        """Free a generation slot and hand it to the next waiter, if any."""
+        with self._lock:
+            queue = self._models[model]
+            queue.running -= 1
+            while queue.running < self._limit(model):
+                waiter = queue.pop()
+                if waiter is None:
+                    break
+                if waiter.future.cancelled():
+                    continue
+                waiter.granted = True
+                queue.running += 1
+                try:
+                    waiter.loop.call_soon_threadsafe(self._grant, waiter.future)
+                except RuntimeError:
+                    # 待機側のループが閉じられている
+                    waiter.granted = False
+                    queue.running -= 1
+            self._update_gauges(model, queue)
+
+    @staticmethod
+    def _grant(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    @staticmethod
+    def _update_gauges(model: str, queue: _ModelQueue):
+        metrics.set_gauge("llm_queue_depth", len(queue), model=model)
+        metrics.set_gauge("llm_running_generations", queue.running, model=model)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model: str):
+        """Hold a generation slot for the duration of the block."""
+        with tracer.span("llm_queue", model=model):
+            await self.acquire(model)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+
+# Process-wide scheduler shared by every session
+llm_scheduler = LLMScheduler()
+
+
+class ScheduledClient:
+    """
+    Client wrapper that runs every generation through the LLMScheduler.
+
+    Implements the same gen_stream / gen_batch interface as the wrapped client.
+    """
+
+    def __init__(self, client, scheduler: LLMScheduler = None):
+        self._client = client
+        # None uses the process-wide scheduler (keeps the wrapper picklable)
+        self._scheduler = scheduler
+
+    @property
+    def scheduler(self) -> LLMScheduler:
+        return self._scheduler or llm_scheduler
+
+    async def gen_stream(
+        self, prompt: str, model: str = None
+    ) -> AsyncGenerator[str, None]:
+        async with self.scheduler.slot(model):
+            async for chunk in self._client.gen_stream(prompt, model=model):
+                yield chunk
+
+    async def gen_batch(self, prompt: str, model: str = None) -> str:
+        async with self.scheduler.slot(model):
+            return await self._client.gen_batch(prompt, model=model)
+
+
+class SessionClient:
+    """
+    Per-session view of the shared client that tags requests with a RequestContext.
+
+    Each model of a session gets its own view so that, for example, chat answers
+    are scheduled ahead of summaries.
+    """
+
+    _ids = itertools.count()
+
+    def __init__(
+        self,
+        client,
+        session_id: str = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ):
+        self._client = client
+        self.session_id = session_id or f"session-{next(self._ids)}"
+        self.priority = priority
+
+    def _tag(self):
+        _request_context.set(
+            RequestContext(session_id=self.session_id, priority=self.priority)
+        )
+
+    async def gen_stream(
+        self, prompt: str, model: str = None
+    ) -> AsyncGenerator[str, None]:
+        self._tag()
+        async for chunk in self._client.gen_stream(prompt, model=model):
+            yield chunk
+
+    async def gen_batch(self, prompt: str, model: str = None) -> str:
+        self._tag()
+        return await self._client.gen_batch(prompt, model=model)
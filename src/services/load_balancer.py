@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Callable
+
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EndpointStats:
+    """Live load and health of one LLM endpoint (shared by every session)"""
+
+    url: str
+    outstanding: int = 0
+    # EWMA of the time to the first chunk (streams) or to the response (batch)
+    latency_ewma: float | None = None
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    samples: dict[str, deque] = field(
+        default_factory=lambda: {
+            "stream": deque(maxlen=200),
+            "batch": deque(maxlen=200),
+        }
+    )
+
+    def is_healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+
+@dataclass(eq=False)
+class _Attempt:
+    url: str
+    started_at: float
+    task: asyncio.Task
+    stream: AsyncGenerator | None = None
+
+
+class LoadBalancedClient:
+    """
+    Client that spreads requests over several LLM endpoints.
+
+    - Endpoints are chosen by least outstanding requests, ties broken by the EWMA
+      of their latency.
+    - Endpoints that fail eject_after_failures times in a row are ejected for
+      eject_seconds, then receive traffic again; a success makes them healthy.
+    - Requests that fail before their first chunk fail over to another endpoint.
+    - When hedge_percentile is set, a duplicate request is sent to a second
+      endpoint if the first chunk takes longer than that percentile of recent
+      latencies; the first to answer wins and the other one is cancelled.
+
+    Implements the same gen_stream / gen_batch interface as the wrapped clients.
+    """
+
+    # Process-wide so that every session sees the same load and health
+    _stats: dict[str, EndpointStats] = {}
+    _stats_lock = threading.Lock()
+
+    def __init__(
+        self,
+        endpoints: list[str],
+        client_factory: Callable,
+        alpha: float = 0.3,
+        eject_after_failures: int = 3,
+        eject_seconds: float = 30.0,
+        hedge_percentile: float | None = None,
+        hedge_min_samples: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            endpoints: Base URLs of the LLM servers
+            client_factory: Builds a client for one endpoint, called as factory(api_url=url)
+            alpha: Weight of the newest sample in the latency EWMA
+            eject_after_failures: Consecutive failures that eject an endpoint
+            eject_seconds: How long an ejected endpoint receives no traffic
+            hedge_percentile: Latency percentile (0-100) after which a hedged
+                request is sent, or None to disable hedging
+            hedge_min_samples: Samples required before hedging starts
+            clock: Monotonic clock in seconds (injectable for tests)
+        """
+        if not endpoints:
+            raise ValueError("At least one LLM endpoint is required.")
+        self.endpoints = list(dict.fromkeys(endpoints))
+        self._clients = {url: client_factory(api_url=url) for url in self.endpoints}
+        self.alpha = alpha
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._clock = clock
+        with self._stats_lock:
+            for url in self.endpoints:
+                self._stats.setdefault(url, EndpointStats(url))
+
+    # --- Endpoint selection and bookkeeping ---
+
+    def _pick(self, exclude: set[str] = frozenset()) -> str | None:
+        """
+        Choose the least loaded healthy endpoint not tried yet and count a request
+        on it. Release it with _end().
+        """
+        now = self._clock()
+        with self._stats_lock:
+            candidates = [
+                self._stats[url] for url in self.endpoints if url not in exclude
+            ]
+            if not candidates:
+                return None
+            healthy = [stats for stats in candidates if stats.is_healthy(now)]
+            if healthy:
+                best = min(
+                    healthy,
+                    key=lambda stats: (stats.outstanding, stats.latency_ewma or 0.0),
+                )
+            else:
+                # 全て切り離されている場合は、最も早く復帰するものを試す
+                best = min(candidates, key=lambda stats: stats.ejected_until)
+            best.outstanding += 1
+            outstanding = best.outstanding
+        metrics.set_gauge("llm_endpoint_outstanding", outstanding, endpoint=best.url)
+        return best.url
+
+    def _end(self, url: str):
+        with self._stats_lock:
+            stats = self._stats[url]
+            stats.outstanding = max(0, stats.outstanding - 1)
+            outstanding = stats.outstanding
+        metrics.set_gauge("llm_endpoint_outstanding", outstanding, endpoint=url)
+
+    def _record_success(self, url: str, kind: str, latency: float):
+        with self._stats_lock:
+            stats = self._stats[url]
+            stats.consecutive_failures = 0
+            stats.ejected_until = 0.0
+            stats.samples[kind].append(latency)
+            if stats.latency_ewma is None:
+                stats.latency_ewma = latency
+            else:
+                stats.latency_ewma += self.alpha * (latency - stats.latency_ewma)
+            ewma = stats.latency_ewma
+        metrics.set_gauge("llm_endpoint_latency_ewma_seconds", ewma, endpoint=url)
+
+    def _record_failure(self, url: str, error: BaseException):
+        logger.warning(f"LLM endpoint {url} failed: {error}")
+        metrics.increment("llm_endpoint_failures_total", endpoint=url)
+        with self._stats_lock:
+            stats = self._stats[url]
+            stats.consecutive_failures += 1
+            eject = stats.consecutive_failures >= self.eject_after_failures
+            if eject:
+                stats.ejected_until = self._clock() + self.eject_seconds
+        if eject:
+            logger.warning(f"Ejecting LLM endpoint {url} for {self.eject_seconds}s")
+            metrics.increment("llm_endpoint_ejections_total", endpoint=url)
+
+    def _hedge_delay(self, kind: str) -> float | None:
+        """Latency percentile after which a hedged request is sent, if enabled."""
+        if self.hedge_percentile is None or len(self.endpoints) < 2:
+            return None
+        with self._stats_lock:
+            samples = sorted(
+                sample
+                for url in self.endpoints
+                for sample in self._stats[url].samples[kind]
+            )
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = max(0, math.ceil(self.hedge_percentile / 100 * len(samples)) - 1)
+        return samples[index]
+
+    def endpoint_status(self) -> list[dict]:
+        """Snapshot of the endpoints for monitoring."""
+        now = self._clock()
+        with self._stats_lock:
+            return [
+                {
+                    "url": url,
+                    "healthy": self._stats[url].is_healthy(now),
+                    "outstanding": self._stats[url].outstanding,
+                    "latency_ewma": self._stats[url].latency_ewma,
+                    "consecutive_failures": self._stats[url].consecutive_failures,
+                }
+                for url in self.endpoints
+            ]
+
+    # --- Racing attempts ---
+
+    async def _first_result(self, kind: str, start_attempt: Callable[[str], _Attempt]):
+        """
+        Run attempts until one produces its first result, with failover and hedging.
+
+        Returns:
+            tuple[_Attempt, object]: The winning attempt and its first result
+                (StopAsyncIteration for an empty stream)
+        """
+        tried: set[str] = set()
+        primary_url = None
+        attempts: list[_Attempt] = []
+        last_error: BaseException | None = None
+        hedge_delay = self._hedge_delay(kind)
+        hedged = False
+
+        def launch() -> bool:
+            nonlocal primary_url
+            url = self._pick(tried)
+            if url is None:
+                return False
+            tried.add(url)
+            primary_url = primary_url or url
+            attempts.append(start_attempt(url))
+            return True
+
+        launch()
+        try:
+            while True:
+                if not attempts:
+                    raise last_error or RuntimeError("No LLM endpoint available.")
+                timeout = hedge_delay if not hedged else None
+                done, _ = await asyncio.wait(
+                    {attempt.task for attempt in attempts},
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    hedged = True
+                    if launch():
+                        metrics.increment("llm_hedged_requests_total", kind=kind)
+                    continue
+
+                for attempt in [a for a in attempts if a.task in done]:
+                    error = attempt.task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        attempts.remove(attempt)
+                        if hedged and attempt.url != primary_url:
+                            metrics.increment("llm_hedge_wins_total", kind=kind)
+                        self._record_success(
+                            attempt.url, kind, self._clock() - attempt.started_at
+                        )
+                        result = error if error is not None else attempt.task.result()
+                        return attempt, result
+                    # 最初のチャンクより前の失敗は別のエンドポイントで再試行する
+                    attempts.remove(attempt)
+                    last_error = error
+                    self._record_failure(attempt.url, error)
+                    self._end(attempt.url)
+                    await self._close(attempt)
+                    if not attempts:
+                        launch()
+        finally:
+            for attempt in attempts:
+                await self._abandon(attempt)
+
+    async def _abandon(self, attempt: _Attempt):
+        """Cancel a losing or orphaned attempt without counting it as a failure."""
+        attempt.task.cancel()
+        await asyncio.gather(attempt.task, return_exceptions=True)
+        await self._close(attempt)
+        self._end(attempt.url)
+
+    @staticmethod
+    async def _close(attempt: _Attempt):
+        if attempt.stream is not None:
+            try:
+                await attempt.stream.aclose()
+            except Exception:
+                pass
+
+    # --- Client interface ---
+
+    async def gen_stream(
+        self, prompt: str, model: str = None
+    ) -> AsyncGenerator[str, None]:
+        def start_attempt(url: str) -> _Attempt:
+            stream = self._clients[url].gen_stream(prompt, model=model)
+            task = asyncio.ensure_future(anext(stream))
+            return _Attempt(url, self._clock(), task, stream)
+
+        attempt, first = await self._first_result("stream", start_attempt)
+        try:
+            if isinstance(first, StopAsyncIteration):
+                return
+            yield first
+            async for chunk in attempt.stream:
+                yield chunk
+        except Exception as e:
+            self._record_failure(attempt.url, e)
+            raise
+        finally:
+            await self._close(attempt)
+            self._end(attempt.url)
+
+    async def gen_batch(self, prompt: str, model: str = None) -> str:
+        def start_attempt(url: str) -> _Attempt:
+            task = asyncio.ensure_future(
+                self._clients[url].gen_batch(prompt, model=model)
+            )
+            return _Attempt(url, self._clock(), task)
+
+        attempt, response = await self._first_result("batch", start_attempt)
+        self._end(attempt.url)
+        return response
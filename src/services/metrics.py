@@ -0,0 +1,167 @@
+import math
+import re
+import threading
+from collections import defaultdict
+
+# Default histogram buckets, tuned for latencies in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _prometheus_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus_labels(label_key: tuple, extra: tuple = ()) -> str:
+    pairs = [
+        f'{_prometheus_name(key)}="{_escape_label_value(value)}"'
+        for key, value in label_key + extra
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _prometheus_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with a running count and sum.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe, process-wide store of counters, gauges and histograms.
+
+    Metrics are identified by name plus an optional set of labels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._histograms = {}
+
+    def increment(self, name: str, value: float = 1.0, **labels):
+        """Increase a counter."""
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to the given value."""
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def remove_gauge(self, name: str, **labels):
+        """Remove a gauge, e.g. when the entity it describes goes away."""
+        with self._lock:
+            self._gauges.pop((name, _label_key(labels)), None)
+
+    def observe(self, name: str, value: float, buckets: tuple = None, **labels):
+        """Record a value in a histogram."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(buckets or DEFAULT_BUCKETS)
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    def get_counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0.0)
+
+    def get_gauge(self, name: str, **labels) -> float | None:
+        with self._lock:
+            return self._gauges.get((name, _label_key(labels)))
+
+    def get_histogram(self, name: str, **labels) -> Histogram | None:
+        with self._lock:
+            return self._histograms.get((name, _label_key(labels)))
+
+    def render_prometheus(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format (version 0.0.4).
+
+        Returns:
+            str: The exposition, one sample per line
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(
+                (key, list(h.buckets), list(h.bucket_counts), h.count, h.sum)
+                for key, h in self._histograms.items()
+            )
+
+        lines = []
+        declared = set()
+
+        def declare(name: str, kind: str):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            name = _prometheus_name(name)
+            declare(name, "counter")
+            lines.append(
+                f"{name}{_prometheus_labels(labels)} {_prometheus_value(value)}"
+            )
+        for (name, labels), value in gauges:
+            name = _prometheus_name(name)
+            declare(name, "gauge")
+            lines.append(
+                f"{name}{_prometheus_labels(labels)} {_prometheus_value(value)}"
+            )
+        for (name, labels), buckets, bucket_counts, count, total in histograms:
+            name = _prometheus_name(name)
+            declare(name, "histogram")
+            # bucket_counts は observe() で既に累積されている
+            for bound, bucket_count in zip(buckets, bucket_counts):
+                le = (("le", _prometheus_value(bound)),)
+                lines.append(
+                    f"{name}_bucket{_prometheus_labels(labels, le)} {bucket_count}"
+                )
+            lines.append(
+                f'{name}_bucket{_prometheus_labels(labels, (("le", "+Inf"),))} {count}'
+            )
+            lines.append(
+                f"{name}_sum{_prometheus_labels(labels)} {_prometheus_value(total)}"
+            )
+            lines.append(f"{name}_count{_prometheus_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop every recorded metric."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+# Process-wide registry shared by all sessions
+metrics = MetricsRegistry()
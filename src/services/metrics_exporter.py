@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.services.metrics import MetricsRegistry, metrics
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsExporter:
+    """
+    Publishes the metrics registry in the Prometheus text format.
+
+    The exposition can be written to a file at a fixed interval (for the node
+    exporter's textfile collector, or for inspection) and/or served over HTTP on
+    /metrics from a small server thread. Both run once per process.
+    """
+
+    def __init__(self, registry: MetricsRegistry = metrics):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._started = False
+        self._stop = threading.Event()
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def server_address(self) -> tuple[str, int] | None:
+        return self._server.server_address if self._server else None
+
+    def start(
+        self,
+        file_path: str = None,
+        interval: float = 15.0,
+        port: int = None,
+        host: str = "127.0.0.1",
+    ) -> bool:
+        """
+        Start exporting unless already started in this process.
+
+        Args:
+            file_path: File rewritten every interval seconds (disabled if None)
+            interval: Seconds between two file writes
+            port: Port of the /metrics endpoint (disabled if None, 0 picks a free port)
+            host: Address the endpoint binds to
+
+        Returns:
+            bool: True if this call started the export
+        """
+        with self._lock:
+            if self._started or (file_path is None and port is None):
+                return False
+            self._started = True
+        if file_path:
+            threading.Thread(
+                target=self._write_periodically,
+                args=(file_path, interval),
+                name="metrics-file",
+                daemon=True,
+            ).start()
+        if port is not None:
+            self._serve(host, port)
+        return True
+
+    def write_file(self, file_path: str):
+        """Write the exposition, replacing the file atomically."""
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{file_path}.tmp", "w", encoding="utf-8") as f:
+            f.write(self.registry.render_prometheus())
+        os.replace(f"{file_path}.tmp", file_path)
+
+    def _write_periodically(self, file_path: str, interval: float):
+        while True:
+            try:
+                self.write_file(file_path)
+            except OSError:
+                logger.exception(f"Failed to write metrics to {file_path}")
+            if self._stop.wait(interval):
+                return
+
+    def _serve(self, host: str, port: int):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # スクレイプのたびにアクセスログを出さない
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+        logger.info(
+            f"Serving metrics on http://{host}:{self.server_address[1]}/metrics"
+        )
+
+    def stop(self):
+        """Stop the file writer and the HTTP endpoint."""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Process-wide exporter, started by the first script run
+metrics_exporter = MetricsExporter()
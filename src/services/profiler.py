@@ -0,0 +1,144 @@
+import contextlib
+import cProfile
+import itertools
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), "gist-profiles")
+PROFILE_EXTENSIONS = (".prof", ".tracemalloc")
+
+
+class RerunProfiler:
+    """
+    Opt-in sampling profiler for script reruns.
+
+    One rerun in sample_every is run under cProfile (and, optionally, with
+    tracemalloc) and the results are written to directory as
+    <timestamp>-<tag>.prof / .tracemalloc files, keeping the newest max_runs
+    runs. Disabled (sample_every = 0), profile() returns a null context manager.
+
+    cProfile and tracemalloc are process-wide, so only one rerun is profiled at a
+    time: a sampled rerun that starts while another one is profiled is skipped.
+    """
+
+    def __init__(
+        self,
+        sample_every: int = 0,
+        directory: str = DEFAULT_PROFILE_DIR,
+        max_runs: int = 20,
+        trace_memory: bool = False,
+    ):
+        self._runs = itertools.count(1)
+        self._active = threading.Lock()
+        self.configure(sample_every, directory, max_runs, trace_memory)
+
+    def configure(
+        self,
+        sample_every: int = 0,
+        directory: str = DEFAULT_PROFILE_DIR,
+        max_runs: int = 20,
+        trace_memory: bool = False,
+    ):
+        """
+        Args:
+            sample_every: Profile one rerun in this many (0 disables profiling)
+            directory: Where the profiles are written
+            max_runs: Number of profiled reruns kept on disk
+            trace_memory: Also take a tracemalloc snapshot of the profiled reruns
+        """
+        self.sample_every = max(0, int(sample_every))
+        self.directory = directory
+        self.max_runs = max(1, int(max_runs))
+        self.trace_memory = trace_memory
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_every > 0
+
+    def profile(self, tag: str):
+        """
+        Context manager profiling the enclosed rerun if it is sampled.
+
+        Args:
+            tag: Label of the rerun in the file names, e.g. the current page
+        """
+        if not self.enabled or next(self._runs) % self.sample_every != 0:
+            return contextlib.nullcontext()
+        return self._profile(tag)
+
+    @contextlib.contextmanager
+    def _profile(self, tag: str):
+        if not self._active.acquire(blocking=False):
+            metrics.increment("profiled_reruns_skipped_total")
+            yield
+            return
+        try:
+            started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 別のプロファイラ(デバッガなど)が有効な場合は計測しない
+                if started_tracing:
+                    tracemalloc.stop()
+                metrics.increment("profiled_reruns_skipped_total")
+                yield
+                return
+            started_at = time.perf_counter()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - started_at
+                snapshot = tracemalloc.take_snapshot() if self.trace_memory else None
+                if started_tracing:
+                    tracemalloc.stop()
+                self._save(tag, profiler, snapshot)
+                metrics.increment("profiled_reruns_total", page=tag)
+                metrics.observe("profiled_rerun_seconds", elapsed, page=tag)
+        finally:
+            self._active.release()
+
+    def _save(self, tag: str, profiler: cProfile.Profile, snapshot):
+        safe_tag = re.sub(r"[^A-Za-z0-9_.-]", "_", tag)
+        base = os.path.join(
+            self.directory,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{safe_tag}",
+        )
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(f"{base}.prof")
+            if snapshot is not None:
+                snapshot.dump(f"{base}.tracemalloc")
+            self._rotate()
+        except OSError:
+            logger.exception(f"Failed to write the profile to {self.directory}")
+            return
+        logger.info(f"Profiled a {tag} rerun: {base}.prof")
+
+    def _rotate(self):
+        # 実行ごとのファイルをまとめ、古いものから削除する
+        runs: dict[str, list[str]] = {}
+        for filename in os.listdir(self.directory):
+            run, extension = os.path.splitext(filename)
+            if extension in PROFILE_EXTENSIONS:
+                runs.setdefault(run, []).append(filename)
+        for run in sorted(runs)[: -self.max_runs]:
+            for filename in runs[run]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.directory, filename))
+
+
+# Process-wide profiler, configured on every rerun from secrets / environment
+profiler = RerunProfiler()
@@ -0,0 +1,80 @@
+import time
+from typing import Callable
+
+
+class RenderScheduler:
+    """
+    Coalesces streamed updates and flushes them to the UI at a bounded rate.
+
+    Streamed generators yield the full accumulated state on every chunk. Instead of
+    re-rendering each one, the scheduler keeps only the latest state and flushes it
+    when either flush_interval_ms has elapsed or flush_chars new characters have
+    arrived since the previous flush, whichever comes first. The very first update is
+    flushed immediately so the user sees progress as early as possible.
+    """
+
+    def __init__(
+        self,
+        render: Callable[..., int],
+        flush_interval_ms: int = 100,
+        flush_chars: int = 200,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            render: Callback receiving the pending state and returning the number of
+                bytes it sent to the browser
+            flush_interval_ms: Maximum time between two flushes
+            flush_chars: Number of new characters that forces a flush
+            clock: Monotonic clock in seconds (injectable for tests)
+        """
+        self._render = render
+        self._flush_interval = flush_interval_ms / 1000
+        self._flush_chars = flush_chars
+        self._clock = clock
+        self._pending = None
+        self._pending_size = 0
+        self._flushed_size = 0
+        self._last_flush_at = clock()
+        self.chunk_count = 0
+        self.flush_count = 0
+        self.bytes_sent = 0
+
+    def update(self, *state: str) -> bool:
+        """
+        Register the latest streamed state and flush it if a threshold is reached.
+
+        Args:
+            *state: The accumulated strings to render (e.g. thinking and summary)
+
+        Returns:
+            bool: True if the state was flushed
+        """
+        self.chunk_count += 1
+        self._pending = state
+        self._pending_size = sum(len(part) for part in state)
+
+        # 最初の更新は即座に表示して、体感の待ち時間を短くする
+        elapsed = self._clock() - self._last_flush_at
+        if (
+            self.flush_count == 0
+            or elapsed >= self._flush_interval
+            or self._pending_size - self._flushed_size >= self._flush_chars
+        ):
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """Render the pending state, if any."""
+        if self._pending is None:
+            return
+        self.bytes_sent += self._render(*self._pending) or 0
+        self.flush_count += 1
+        self._flushed_size = self._pending_size
+        self._pending = None
+        self._last_flush_at = self._clock()
+
+    def close(self):
+        """Flush whatever is still pending at the end of the stream."""
+        self.flush()
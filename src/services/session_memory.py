@@ -0,0 +1,378 @@
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "gist-sessions")
+
+
+def _str_bytes(text: str | None) -> int:
+    return sys.getsizeof(text) if text else 0
+
+
+class SpillStore:
+    """
+    Local disk store for the heavy artifacts of idle sessions.
+
+    Texts are stored gzip-compressed; embeddings are stored as .npy files so that
+    they can be memory-mapped instead of read back into memory.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SPILL_DIR):
+        self.directory = directory
+
+    def _path(self, session_id: str, name: str) -> str:
+        return os.path.join(self.directory, session_id, name)
+
+    def save(
+        self,
+        session_id: str,
+        content: str | None,
+        texts: list[str],
+        embeddings: np.ndarray | None,
+    ):
+        os.makedirs(os.path.join(self.directory, session_id), exist_ok=True)
+        self._write(
+            session_id,
+            "content.txt.gz",
+            gzip.compress(json.dumps(content, ensure_ascii=False).encode("utf-8")),
+        )
+        self._write(
+            session_id,
+            "texts.json.gz",
+            gzip.compress(json.dumps(texts, ensure_ascii=False).encode("utf-8")),
+        )
+        embeddings_path = self._path(session_id, "embeddings.npy")
+        if embeddings is not None:
+            buffer = io.BytesIO()
+            np.save(buffer, np.asarray(embeddings))
+            self._write(session_id, "embeddings.npy", buffer.getvalue())
+        elif os.path.exists(embeddings_path):
+            os.remove(embeddings_path)
+
+    def _write(self, session_id: str, name: str, data: bytes):
+        # 置き換えで書き込み、既存のメモリマップが参照するファイルを切り詰めない
+        path = self._path(session_id, name)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, session_id: str) -> tuple[str | None, list[str], np.ndarray | None]:
+        """
+        Returns:
+            tuple: (content, texts, embeddings), the embeddings memory-mapped read-only
+        """
+        content = self._read_json(session_id, "content.txt.gz")
+        texts = self._read_json(session_id, "texts.json.gz")
+        embeddings_path = self._path(session_id, "embeddings.npy")
+        embeddings = (
+            np.load(embeddings_path, mmap_mode="r")
+            if os.path.exists(embeddings_path)
+            else None
+        )
+        return content, texts, embeddings
+
+    def _read_json(self, session_id: str, name: str):
+        with gzip.open(self._path(session_id, name), "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def delete(self, session_id: str):
+        shutil.rmtree(os.path.join(self.directory, session_id), ignore_errors=True)
+
+
+@dataclass(eq=False)
+class _SessionRecord:
+    session_id: str
+    last_access: float
+    # Weak references: the accountant must not keep a closed session alive
+    scraping_model: Callable = lambda: None
+    vector_store: Callable = lambda: None
+    summarization_model: Callable = lambda: None
+    conversation_model: Callable = lambda: None
+    spilled: bool = False
+    # Measured when the session registers, is touched, spills or is rehydrated,
+    # and when its embeddings are published
+    size: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class SessionMemoryAccountant:
+    """
+    Process-wide accounting of the memory held by each session.
+
+    Sessions register their models on every script run, and fragment reruns
+    touch() the session. When the total footprint
+    exceeds budget_bytes, the least recently used sessions that have been idle
+    for idle_seconds have their page content, chunks and embeddings spilled to a
+    SpillStore. A spilled session is rehydrated when it runs again (script or
+    fragment rerun), before the page is rendered, so the rest of the app never
+    sees the difference.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int = 512 * 1024 * 1024,
+        idle_seconds: float = 300.0,
+        spill_dir: str = DEFAULT_SPILL_DIR,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._lock = threading.Lock()
+        self._sessions: dict[str, _SessionRecord] = {}
+        self._clock = clock
+        self.configure(budget_bytes, idle_seconds, spill_dir)
+
+    def configure(
+        self,
+        budget_bytes: int = 512 * 1024 * 1024,
+        idle_seconds: float = 300.0,
+        spill_dir: str = DEFAULT_SPILL_DIR,
+    ):
+        """Update the budget, the idle threshold and the spill location."""
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.store = SpillStore(spill_dir)
+
+    # --- Registration ---
+
+    def register(
+        self,
+        session_id: str,
+        scraping_model=None,
+        vector_store=None,
+        summarization_model=None,
+        conversation_model=None,
+    ):
+        """
+        Record the session's models and mark the session as accessed now.
+
+        A spilled session is rehydrated before this returns.
+        """
+        with self._lock:
+            record = self._sessions.get(session_id)
+            if record is None:
+                record = _SessionRecord(session_id, self._clock())
+                self._sessions[session_id] = record
+        with record.lock:
+            if record.scraping_model() is not scraping_model:
+                # 新しいセッション状態が作られた場合、古い退避データは使わない
+                if record.spilled:
+                    self.store.delete(session_id)
+                    record.spilled = False
+                if scraping_model is not None:
+                    weakref.finalize(scraping_model, self._forget_if_dead, session_id)
+            record.scraping_model = _weak(scraping_model)
+            record.vector_store = _weak(vector_store)
+            record.summarization_model = _weak(summarization_model)
+            record.conversation_model = _weak(conversation_model)
+            self._touch(record)
+        self._update_gauge(record)
+
+    def touch(self, session_id: str) -> bool:
+        """
+        Mark a registered session as accessed now, rehydrating it if it was spilled.
+
+        Fragment reruns do not go through register(), so they must call this
+        before using the session's page or embeddings. The session is measured
+        again, since chat answers are added in fragment reruns.
+
+        Returns:
+            bool: False if the session is not registered
+        """
+        with self._lock:
+            record = self._sessions.get(session_id)
+        if record is None:
+            return False
+        with record.lock:
+            self._touch(record)
+        self._update_gauge(record)
+        return True
+
+    def measure(self, session_id: str):
+        """
+        Measure a session again after its models grew outside a script run,
+        e.g. when its embeddings are published by a worker thread.
+        """
+        with self._lock:
+            record = self._sessions.get(session_id)
+        if record is not None:
+            self._update_gauge(record)
+
+    def _touch(self, record: _SessionRecord):
+        """The caller holds record.lock."""
+        record.last_access = self._clock()
+        if record.spilled:
+            self._rehydrate(record)
+
+    def _forget_if_dead(self, session_id: str):
+        with self._lock:
+            record = self._sessions.get(session_id)
+            if record is None or record.scraping_model() is not None:
+                return
+            del self._sessions[session_id]
+        self.store.delete(session_id)
+        metrics.remove_gauge("session_memory_bytes", session=session_id)
+
+    def forget(self, session_id: str):
+        """Drop a session and its spilled data."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        self.store.delete(session_id)
+        metrics.remove_gauge("session_memory_bytes", session=session_id)
+
+    # --- Measurement ---
+
+    @staticmethod
+    def _measure(record: _SessionRecord) -> int:
+        size = 0
+        scraping_model = record.scraping_model()
+        if scraping_model is not None:
+            size += _str_bytes(scraping_model.content)
+        vector_store = record.vector_store()
+        if vector_store is not None:
+            size += sum(_str_bytes(text) for text in vector_store.texts)
+            embeddings = vector_store.embeddings
+            # メモリマップされた埋め込みは常駐メモリとして数えない
+            if embeddings is not None and not isinstance(embeddings, np.memmap):
+                size += embeddings.nbytes
+        summarization_model = record.summarization_model()
+        if summarization_model is not None:
+            size += _str_bytes(summarization_model.summary)
+            size += _str_bytes(summarization_model.thinking)
+        conversation_model = record.conversation_model()
+        if conversation_model is not None:
+            size += sum(
+                _str_bytes(message["content"])
+                for message in conversation_model.messages
+            )
+        return size
+
+    def session_bytes(self, session_id: str) -> int:
+        """Resident bytes of the session's page, chunks, embeddings and chat."""
+        with self._lock:
+            record = self._sessions.get(session_id)
+        return record.size if record else 0
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(record.size for record in self._sessions.values())
+
+    def _update_gauge(self, record: _SessionRecord):
+        record.size = self._measure(record)
+        metrics.set_gauge(
+            "session_memory_bytes", record.size, session=record.session_id
+        )
+
+    # --- Spilling ---
+
+    def enforce_budget(self) -> list[str]:
+        """
+        Spill idle sessions, least recently used first, until the budget is met.
+
+        Returns:
+            list[str]: The ids of the sessions that were spilled
+        """
+        # 再実行のたびに全セッションを測り直さず、記録済みのサイズを合計する
+        with self._lock:
+            records = sorted(self._sessions.values(), key=lambda r: r.last_access)
+        total = sum(record.size for record in records)
+        metrics.set_gauge("session_memory_total_bytes", total)
+        if total <= self.budget_bytes:
+            return []
+
+        spilled = []
+        now = self._clock()
+        for record in records:
+            if total <= self.budget_bytes:
+                break
+            if now - record.last_access < self.idle_seconds:
+                # 以降のセッションはさらに最近アクセスされている
+                break
+            size = record.size
+            if size and self.spill(record.session_id):
+                total -= size - record.size
+                spilled.append(record.session_id)
+        metrics.set_gauge("session_memory_total_bytes", total)
+        return spilled
+
+    def spill(self, session_id: str) -> bool:
+        """
+        Move the session's page content, chunks and embeddings to disk.
+
+        Sessions with an embedding in progress are skipped.
+
+        Returns:
+            bool: True if the session was spilled
+        """
+        with self._lock:
+            record = self._sessions.get(session_id)
+        if record is None:
+            return False
+        with record.lock:
+            scraping_model = record.scraping_model()
+            vector_store = record.vector_store()
+            if record.spilled or scraping_model is None or vector_store is None:
+                return False
+            if vector_store.is_creating:
+                return False
+            try:
+                self.store.save(
+                    session_id,
+                    scraping_model.content,
+                    vector_store.texts,
+                    vector_store.embeddings,
+                )
+            except OSError:
+                logger.exception(f"Failed to spill session {session_id}")
+                return False
+            scraping_model.content = None
+            vector_store.set_index([], None)
+            record.spilled = True
+        metrics.increment("session_spills_total")
+        self._update_gauge(record)
+        logger.info(f"Spilled idle session {session_id} to disk")
+        return True
+
+    def _rehydrate(self, record: _SessionRecord):
+        """Restore a spilled session. The caller holds record.lock."""
+        scraping_model = record.scraping_model()
+        vector_store = record.vector_store()
+        try:
+            content, texts, embeddings = self.store.load(record.session_id)
+        except OSError:
+            logger.exception(f"Failed to rehydrate session {record.session_id}")
+            record.spilled = False
+            return
+        if scraping_model is not None:
+            scraping_model.content = content
+        if vector_store is not None:
+            vector_store.set_index(texts, embeddings)
+        record.spilled = False
+        metrics.increment("session_rehydrations_total")
+
+    def is_spilled(self, session_id: str) -> bool:
+        with self._lock:
+            record = self._sessions.get(session_id)
+        return bool(record and record.spilled)
+
+
+def _weak(obj) -> Callable:
+    return weakref.ref(obj) if obj is not None else (lambda: None)
+
+
+# Process-wide accountant shared by every session
+session_memory = SessionMemoryAccountant()
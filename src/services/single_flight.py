@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import AsyncGenerator
+
+from src.services.async_runtime import async_runtime
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """
+    One upstream LLM request shared by every caller sending the same prompt.
+
+    The upstream is driven by a task on the shared AsyncRuntime loop, so it does not
+    depend on any single caller staying around. Chunks are kept for the lifetime of
+    the flight so that late joiners first receive a replay of what was already
+    generated.
+    """
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self._lock = threading.Lock()
+        # Waiting subscribers: asyncio.Event -> the loop it belongs to
+        self._waiters: dict[asyncio.Event, asyncio.AbstractEventLoop] = {}
+        self._subscribers = 0
+        self._driver_loop: asyncio.AbstractEventLoop | None = None
+        self._driver_task: asyncio.Task | None = None
+
+    # --- Driver side ---
+
+    def publish(self, chunk: str):
+        with self._lock:
+            self.chunks.append(chunk)
+        self._wake_all()
+
+    def finish(self, error: BaseException | None = None):
+        with self._lock:
+            self.done = True
+            self.error = error
+        self._wake_all()
+
+    def _wake_all(self):
+        with self._lock:
+            waiters = list(self._waiters.items())
+        for event, loop in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # 購読者のループが既に閉じられている
+                pass
+
+    def attach_driver(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task):
+        with self._lock:
+            self._driver_loop = loop
+            self._driver_task = task
+            abandoned = self._subscribers == 0
+        if abandoned:
+            task.cancel()
+
+    # --- Subscriber side ---
+
+    def join(self):
+        with self._lock:
+            self._subscribers += 1
+
+    def leave(self) -> bool:
+        """
+        Detach a subscriber.
+
+        Returns:
+            bool: True if nobody is left while the upstream is still running
+        """
+        with self._lock:
+            self._subscribers -= 1
+            return self._subscribers == 0 and not self.done
+
+    def cancel_driver(self):
+        """Stop the upstream request, e.g. when every subscriber has left."""
+        with self._lock:
+            loop, task = self._driver_loop, self._driver_task
+        if task is None:
+            # attach_driver() will cancel it since nobody is subscribed
+            return
+        try:
+            loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            pass
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        """Yield every chunk of the flight, starting from the first one."""
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.Event()
+        index = 0
+        try:
+            while True:
+                with self._lock:
+                    new_chunks = self.chunks[index:]
+                    finished, error = self.done, self.error
+                    if not new_chunks and not finished:
+                        # ロックの中で登録するので、publish()の通知を取りこぼさない
+                        waiter.clear()
+                        self._waiters[waiter] = loop
+                if new_chunks:
+                    index += len(new_chunks)
+                    for chunk in new_chunks:
+                        yield chunk
+                    continue
+                if finished:
+                    if error is not None:
+                        raise error
+                    return
+                await waiter.wait()
+        finally:
+            with self._lock:
+                self._waiters.pop(waiter, None)
+
+
+class SingleFlightClient:
+    """
+    Client wrapper that coalesces concurrent identical requests.
+
+    Requests are keyed by (kind, model, prompt hash). While a request is in flight,
+    identical requests from any session attach to it and receive the same chunks,
+    so the LLM server generates each unique prompt only once. Completed flights
+    are forgotten immediately; this is not a response cache.
+
+    Implements the same gen_stream / gen_batch interface as the wrapped client.
+    """
+
+    # Process-wide so that sessions holding copies of the client still share flights
+    _flights: dict[tuple, _Flight] = {}
+    _flights_lock = threading.Lock()
+
+    def __init__(self, client):
+        self._client = client
+
+    @staticmethod
+    def flight_key(kind: str, prompt: str, model: str = None) -> tuple:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return (kind, model, digest)
+
+    async def gen_stream(
+        self, prompt: str, model: str = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream the response, sharing the upstream stream with identical requests.
+        """
+        flight = self._join(self.flight_key("stream", prompt, model), prompt, model)
+        try:
+            async for chunk in flight.subscribe():
+                yield chunk
+        finally:
+            self._leave(flight)
+
+    async def gen_batch(self, prompt: str, model: str = None) -> str:
+        """
+        Generate the complete response, sharing the upstream request with identical
+        requests.
+        """
+        flight = self._join(self.flight_key("batch", prompt, model), prompt, model)
+        try:
+            return "".join([chunk async for chunk in flight.subscribe()])
+        finally:
+            self._leave(flight)
+
+    def _join(self, key: tuple, prompt: str, model: str) -> _Flight:
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight(key)
+                self._flights[key] = flight
+            flight.join()
+
+        metrics.increment(
+            "llm_single_flight_requests_total",
+            result="leader" if is_leader else "joined",
+        )
+        if is_leader:
+            # 呼び出し元が離脱しても上流のリクエストを続けられるよう、共有ループで実行する
+            # (呼び出し元のリクエスト情報はコンテキストごと引き継がれる)
+            async_runtime.submit(self._drive(flight, prompt, model))
+        return flight
+
+    def _leave(self, flight: _Flight):
+        with self._flights_lock:
+            abandoned = flight.leave()
+            # 新しい呼び出しがキャンセル中のフライトに合流しないように外す
+            if abandoned and self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        if abandoned:
+            metrics.increment("llm_single_flight_abandoned_total")
+            flight.cancel_driver()
+
+    async def _drive(self, flight: _Flight, prompt: str, model: str):
+        """Run the upstream request and publish its output to the subscribers."""
+        flight.attach_driver(asyncio.get_running_loop(), asyncio.current_task())
+        error = None
+        try:
+            if flight.key[0] == "stream":
+                async for chunk in self._client.gen_stream(prompt, model=model):
+                    flight.publish(chunk)
+            else:
+                flight.publish(await self._client.gen_batch(prompt, model=model))
+        except asyncio.CancelledError:
+            # 購読者が全員離脱した場合のみキャンセルされる
+            pass
+        except Exception as e:
+            logger.error(f"Shared LLM request failed: {e}")
+            error = e
+        finally:
+            with self._flights_lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+            flight.finish(error)
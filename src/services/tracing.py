@@ -0,0 +1,271 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+from src.services.metrics import metrics
+
+# Finished spans are logged here, one structured record per span
+span_logger = logging.getLogger("gist.trace")
+
+_current_trace_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "trace_id", default=None
+)
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar(
+    "span", default=None
+)
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@dataclass(eq=False)
+class Span:
+    """One timed operation of a trace"""
+
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=_new_id)
+    parent_id: str | None = None
+    started_at: float = field(default_factory=time.monotonic)
+    duration: float | None = None
+    status: str = "ok"
+    attributes: dict = field(default_factory=dict)
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "span": self.name,
+            "duration_ms": (
+                round(self.duration * 1000, 3) if self.duration is not None else None
+            ),
+            "status": self.status,
+            **self.attributes,
+        }
+
+
+def current_trace_id() -> str | None:
+    """The correlation id of the ingestion or question being processed, if any."""
+    return _current_trace_id.get()
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def set_span_attribute(key: str, value):
+    """Attach an attribute to the current span; a no-op outside of any span."""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attribute(key, value)
+
+
+class Tracer:
+    """
+    Minimal in-process tracing: nested, timed spans sharing a correlation id.
+
+    A trace groups the spans of one ingestion or one question. Spans propagate
+    through contextvars, so they follow the work onto the async runtime and into
+    worker threads started with a copied context. Every finished span is observed
+    in the span_duration_seconds histogram and logged as a structured record.
+    """
+
+    def __init__(self, max_recent_spans: int = 1000):
+        self._recent: deque[Span] = deque(maxlen=max_recent_spans)
+
+    @contextmanager
+    def trace(self, name: str, trace_id: str = None, **attributes) -> Iterator[Span]:
+        """
+        Start a trace with its root span.
+
+        Args:
+            name: Name of the root span, e.g. "ingestion" or "question"
+            trace_id: Correlation id to reuse (a new one is created if None)
+        """
+        token = _current_trace_id.set(trace_id or uuid.uuid4().hex)
+        try:
+            with self.span(name, **attributes) as span:
+                yield span
+        finally:
+            _current_trace_id.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time the enclosed block as a child of the current span."""
+        span = self._start(name, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self._set_error(span, e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    def traced(self, name: str = None) -> Callable:
+        """
+        Decorate a function, coroutine function or async generator function so
+        that every call is recorded as a span.
+        """
+
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+
+            if inspect.isasyncgenfunction(func):
+
+                @functools.wraps(func)
+                async def async_gen_wrapper(*args, **kwargs):
+                    async for item in self._trace_async_gen(
+                        span_name, func(*args, **kwargs)
+                    ):
+                        yield item
+
+                return async_gen_wrapper
+
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    async def _trace_async_gen(self, name: str, async_gen):
+        # 生成器の再開中だけ現在のスパンとし、呼び出し側のコンテキストに漏らさない
+        span = self._start(name, {})
+        try:
+            while True:
+                token = _current_span.set(span)
+                try:
+                    item = await async_gen.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _current_span.reset(token)
+                yield item
+        except BaseException as e:
+            self._set_error(span, e)
+            raise
+        finally:
+            await async_gen.aclose()
+            self._finish(span)
+
+    def _start(self, name: str, attributes: dict) -> Span:
+        parent = _current_span.get()
+        trace_id = _current_trace_id.get() or (
+            parent.trace_id if parent else uuid.uuid4().hex
+        )
+        return Span(
+            name=name,
+            trace_id=trace_id,
+            parent_id=parent.span_id if parent else None,
+            attributes=dict(attributes),
+        )
+
+    @staticmethod
+    def _set_error(span: Span, error: BaseException):
+        # キャンセルは失敗として扱わない
+        cancelled = type(error).__name__ in (
+            "GenerationCancelledError",
+            "CancelledError",
+            "GeneratorExit",
+        )
+        span.status = "cancelled" if cancelled else "error"
+        if not cancelled:
+            span.set_attribute("error", f"{type(error).__name__}: {error}")
+
+    def _finish(self, span: Span):
+        span.duration = time.monotonic() - span.started_at
+        self._recent.append(span)
+        metrics.observe("span_duration_seconds", span.duration, span=span.name)
+        if span.status != "ok":
+            metrics.increment("span_errors_total", span=span.name, status=span.status)
+        span_logger.info(
+            "%s %.1fms %s",
+            span.name,
+            span.duration * 1000,
+            span.status,
+            extra={"span": span.to_dict()},
+        )
+
+    def recent_spans(self, trace_id: str = None) -> list[Span]:
+        """The most recently finished spans, optionally of one trace only."""
+        spans = list(self._recent)
+        if trace_id is not None:
+            spans = [span for span in spans if span.trace_id == trace_id]
+        return spans
+
+
+class JsonLogFormatter(logging.Formatter):
+    """
+    Format log records as one JSON object per line.
+
+    Records logged while a trace is active carry its trace_id and span_id; span
+    records carry the span fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        span = getattr(record, "span", None)
+        if span is not None:
+            entry.update(span)
+        else:
+            trace_id = _current_trace_id.get()
+            current = _current_span.get()
+            if trace_id:
+                entry["trace_id"] = trace_id
+            if current is not None:
+                entry["span_id"] = current.span_id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_json_handler: logging.Handler | None = None
+
+
+def configure_json_logging(level: int = logging.INFO):
+    """Send the application's log records to stderr as JSON lines (once per process)."""
+    global _json_handler
+    if _json_handler is not None:
+        return
+    _json_handler = logging.StreamHandler()
+    _json_handler.setFormatter(JsonLogFormatter())
+    for name in ("src", "gist"):
+        app_logger = logging.getLogger(name)
+        app_logger.addHandler(_json_handler)
+        app_logger.setLevel(level)
+        app_logger.propagate = False
+
+
+# Process-wide tracer shared by every session
+tracer = Tracer()
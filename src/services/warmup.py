@@ -0,0 +1,156 @@
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Callable
+
+from src.services.async_runtime import async_runtime
+from src.services.llm_scheduler import Priority, SessionClient
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WarmupStep = tuple[str, Callable[[], object]]
+
+# Imported for their side effects (torch initialization, tokenizer tables)
+WARMUP_MODULES = ("torch", "sentence_transformers", "langchain_text_splitters", "bs4")
+WARMUP_PROMPT = "Hi"
+
+
+class Warmup:
+    """
+    Once-per-process warm-up of the expensive resources, with a readiness signal.
+
+    The steps run one after another in a daemon thread so that the script run that
+    starts them is not blocked. A failing step is logged and skipped: the server
+    still becomes ready, the resource is then loaded on first use as before.
+    Readiness is exposed as the is_ready property, the server_ready gauge and,
+    optionally, a file created when warm-up is done (for file-based probes).
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._readiness_file: str | None = None
+        self.timings: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+        metrics.set_gauge("server_ready", 0)
+
+    @property
+    def is_started(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def is_ready(self) -> bool:
+        """True once every warm-up step has finished."""
+        return self._ready.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until warm-up is done.
+
+        Returns:
+            bool: True if the server is ready, False if the timeout expired
+        """
+        return self._ready.wait(timeout)
+
+    def start(self, steps: list[WarmupStep], readiness_file: str = None) -> bool:
+        """
+        Start the warm-up unless it has already been started in this process.
+
+        Args:
+            steps: (name, callable) pairs run in order
+            readiness_file: Path of a file created when the server is ready
+
+        Returns:
+            bool: True if this call started the warm-up
+        """
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._readiness_file = readiness_file
+            if readiness_file and os.path.exists(readiness_file):
+                # 前回のプロセスが残したファイルで準備完了と誤認させない
+                os.remove(readiness_file)
+            self._thread = threading.Thread(
+                target=self._run, args=(list(steps),), name="warmup", daemon=True
+            )
+            self._thread.start()
+        return True
+
+    def _run(self, steps: list[WarmupStep]):
+        started_at = self._clock()
+        for name, step in steps:
+            step_started_at = self._clock()
+            try:
+                step()
+            except Exception as e:
+                logger.exception(f"Warm-up step {name} failed")
+                self.errors[name] = str(e)
+                metrics.increment("warmup_failures_total", step=name)
+            elapsed = self._clock() - step_started_at
+            self.timings[name] = elapsed
+            metrics.set_gauge("warmup_step_seconds", elapsed, step=name)
+
+        total = self._clock() - started_at
+        metrics.set_gauge("cold_start_seconds", total)
+        self._mark_ready()
+        logger.info(f"Warm-up finished in {total:.2f}s: {self.timings}")
+
+    def _mark_ready(self):
+        if self._readiness_file:
+            try:
+                with open(self._readiness_file, "w") as f:
+                    f.write(f"{time.time()}\n")
+            except OSError:
+                logger.exception(f"Failed to write {self._readiness_file}")
+        metrics.set_gauge("server_ready", 1)
+        self._ready.set()
+
+
+def warm_up_steps(
+    client,
+    load_encoder: Callable[[], object],
+    llm_models: list[str],
+    llm_timeout: float,
+) -> list[WarmupStep]:
+    """
+    The warm-up steps of the app: imports, the encoder, then each distinct LLM.
+
+    Args:
+        client: LLM client the generations go through
+        load_encoder: Returns the (process-wide) sentence encoder
+        llm_models: Models to load on the backend, duplicates are warmed once
+        llm_timeout: Seconds each warm-up generation may take
+
+    Returns:
+        list[WarmupStep]: Steps to pass to Warmup.start()
+    """
+
+    def import_modules():
+        for module in WARMUP_MODULES:
+            importlib.import_module(module)
+
+    def load_llm(model: str):
+        # バックエンドにモデルを常駐させるための最小の生成
+        warmup_client = SessionClient(
+            client, session_id="warmup", priority=Priority.BACKGROUND
+        )
+        async_runtime.run(
+            warmup_client.gen_batch(WARMUP_PROMPT, model=model), timeout=llm_timeout
+        )
+
+    steps = [
+        ("imports", import_modules),
+        ("encoder", lambda: load_encoder().encode(["warm-up"])),
+    ]
+    for model in dict.fromkeys(llm_models):
+        steps.append((f"llm:{model}", lambda model=model: load_llm(model)))
+    return steps
+
+
+# Process-wide warm-up, started by the first script run
+warmup = Warmup()
@@ -0,0 +1,263 @@
+"""
+Shared fixtures of the benchmark suite.
+
+Every benchmark reports its best time per call and its peak traced memory. The
+results are written to BENCH_RESULTS_PATH (bench_results.json) at the end of the
+session and compared with tests/bench/baseline.json: a benchmark slower or larger
+than its baseline by more than BENCH_REGRESSION_THRESHOLD (0.5 = +50%) fails.
+Run with BENCH_UPDATE_BASELINE=1 to record the current results as the new baseline.
+
+Timings depend on the machine, so the baseline also records the time of a fixed
+calibration workload. Baseline timings are scaled by how much slower or faster
+that workload runs on the current machine before being compared. The baseline
+records the Python version too: on a different major.minor version the results
+are reported but not compared, with a warning to re-record the baseline.
+
+The suite is marked "bench" and excluded from the default pytest run: use
+make bench-test.
+"""
+
+import functools
+import json
+import os
+import platform
+import time
+import timeit
+import tracemalloc
+import warnings
+from dataclasses import asdict, dataclass
+
+import pytest
+
+from dev.mocks.models.mock_embedding_model import MockEmbeddingModel
+from dev.mocks.models.mock_scraping_model import MockScrapingModel
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+RESULTS_PATH = os.environ.get("BENCH_RESULTS_PATH", "bench_results.json")
+REGRESSION_THRESHOLD = float(os.environ.get("BENCH_REGRESSION_THRESHOLD", "0.5"))
+UPDATE_BASELINE = os.environ.get("BENCH_UPDATE_BASELINE") == "1"
+# Regressions below these absolute amounts are treated as measurement noise
+MIN_TIME_DELTA = 0.0005
+MIN_MEMORY_DELTA = 64 * 1024
+
+JAPANESE_PARAGRAPH = (
+    "生成AIの進歩により、長い文章を短時間で要約できるようになった。"
+    "一方で、要約の品質は入力の選び方に大きく左右される。"
+    "本稿では、ウェブページから本文を抽出し、重要な文を選んでから要約する手法を紹介する。"
+    "検索拡張生成では、ページを小さな断片に分割し、質問に近い断片だけをプロンプトに含める。"
+)
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    seconds: float
+    median_seconds: float
+    calls: int
+    peak_memory_bytes: int
+
+
+_results: dict[str, BenchmarkResult] = {}
+
+
+def _calibration_workload():
+    # 比較用の固定の処理(文字列処理と並べ替え)
+    values = [(i * 7919) % 10007 for i in range(20_000)]
+    "".join(str(value) for value in sorted(values))
+
+
+@functools.cache
+def calibration_seconds() -> float:
+    """Best time of the calibration workload on this machine."""
+    return min(timeit.repeat(_calibration_workload, number=1, repeat=20))
+
+
+def _load_baseline_report() -> dict:
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _load_baseline() -> dict:
+    return _load_baseline_report().get("benchmarks", {})
+
+
+def _python_mismatch() -> str | None:
+    """Why the baseline cannot be compared on this interpreter, if it cannot."""
+    baseline_python = _load_baseline_report().get("python")
+    if not baseline_python:
+        return None
+    current_python = platform.python_version()
+    if baseline_python.split(".")[:2] == current_python.split(".")[:2]:
+        return None
+    return (
+        f"baseline was recorded on Python {baseline_python}, running on "
+        f"{current_python}: comparisons are skipped, re-record the baseline with "
+        "BENCH_UPDATE_BASELINE=1"
+    )
+
+
+def _machine_speed_ratio() -> float:
+    """How much slower (>1) or faster (<1) this machine is than the baseline's."""
+    baseline_calibration = _load_baseline_report().get("calibration_seconds")
+    if not baseline_calibration:
+        return 1.0
+    return calibration_seconds() / baseline_calibration
+
+
+def _regressions(
+    result: BenchmarkResult, baseline: dict, speed_ratio: float
+) -> list[str]:
+    messages = []
+    for key, min_delta, scale in (
+        ("seconds", MIN_TIME_DELTA, speed_ratio),
+        ("peak_memory_bytes", MIN_MEMORY_DELTA, 1.0),
+    ):
+        current, previous = getattr(result, key), baseline.get(key)
+        if not previous:
+            continue
+        previous *= scale
+        if current > previous * (1 + REGRESSION_THRESHOLD) and (
+            current - previous > min_delta
+        ):
+            messages.append(
+                f"{key} {current:.6g} > baseline {previous:.6g} "
+                f"(+{(current / previous - 1) * 100:.0f}%)"
+            )
+    return messages
+
+
+@pytest.fixture
+def benchmark():
+    """
+    Time and trace the memory of a callable, then compare it with the baseline.
+
+    Usage: benchmark("name", func, *args) returns func's result.
+    """
+    baseline = _load_baseline()
+    mismatch = None if UPDATE_BASELINE else _python_mismatch()
+    if mismatch:
+        # インタプリタが違うと速度もメモリも比較にならない
+        warnings.warn(mismatch, pytest.PytestWarning)
+        baseline = {}
+    speed_ratio = _machine_speed_ratio() if baseline and not UPDATE_BASELINE else 1.0
+
+    def run(name: str, func, *args, repeat: int = 5):
+        # 初回のみの読み込み(テンプレートなど)を計測から除く
+        func(*args)
+        # メモリは計測のオーバーヘッドが大きいため、時間とは別に1回だけ測る
+        tracemalloc.start()
+        try:
+            value = func(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timer = timeit.Timer(lambda: func(*args))
+        calls, _ = timer.autorange()
+        timings = sorted(t / calls for t in timer.repeat(repeat=repeat, number=calls))
+        result = BenchmarkResult(
+            name=name,
+            seconds=timings[0],
+            median_seconds=timings[len(timings) // 2],
+            calls=calls,
+            peak_memory_bytes=peak,
+        )
+        _results[name] = result
+        print(
+            f"\n{name}: {result.seconds * 1000:.3f}ms/call "
+            f"(median {result.median_seconds * 1000:.3f}ms), "
+            f"peak {peak / 1024:.0f}KiB"
+        )
+
+        if not UPDATE_BASELINE and name in baseline:
+            regressions = _regressions(result, baseline[name], speed_ratio)
+            if regressions:
+                pytest.fail(f"{name} regressed: " + "; ".join(regressions))
+        return value
+
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results:
+        return
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "regression_threshold": REGRESSION_THRESHOLD,
+        "calibration_seconds": calibration_seconds(),
+        "benchmarks": {
+            name: asdict(result) for name, result in sorted(_results.items())
+        },
+    }
+    with open(RESULTS_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    if UPDATE_BASELINE:
+        # 部分的な実行でも既存のベースラインの他の項目は残す(同じPythonの場合のみ)
+        kept = {} if _python_mismatch() else _load_baseline()
+        merged = {**kept, **report["benchmarks"]}
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(
+                {**report, "benchmarks": dict(sorted(merged.items()))},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+            f.write("\n")
+
+
+# --- Synthetic inputs ---
+
+
+def _english_paragraphs() -> list[str]:
+    # dev/mocks のページ本文を英語の段落の素材にする
+    paragraphs = []
+    for content in MockScrapingModel().mock_content.values():
+        lines = [line.strip() for line in content.splitlines() if line.strip()]
+        paragraphs.append(" ".join(lines))
+    return paragraphs
+
+
+def synthetic_text(language: str, size: int) -> str:
+    """Plain text of about size characters, in "ja" or "en"."""
+    paragraphs = [JAPANESE_PARAGRAPH] if language == "ja" else _english_paragraphs()
+    parts, length, i = [], 0, 0
+    while length < size:
+        paragraph = f"{i}. {paragraphs[i % len(paragraphs)]}"
+        parts.append(paragraph)
+        length += len(paragraph) + 2
+        i += 1
+    return "\n\n".join(parts)[:size]
+
+
+def synthetic_html(language: str, size: int) -> bytes:
+    """An HTML page with about size characters of body text plus page chrome."""
+    text = synthetic_text(language, size)
+    paragraphs = "".join(f"<p>{p}</p>\n" for p in text.split("\n\n"))
+    return (
+        "<html><head><title>Benchmark</title>"
+        "<style>body { font-family: sans-serif; }</style>"
+        "<script>window.analytics = [];</script></head><body>"
+        "<header><nav><a href='/'>Home</a><a href='/about'>About</a></nav></header>"
+        f"<main><article>{paragraphs}</article></main>"
+        "<aside>Related links</aside><footer>&copy; Example</footer>"
+        "</body></html>"
+    ).encode("utf-8")
+
+
+@pytest.fixture
+def encoder() -> MockEmbeddingModel:
+    return MockEmbeddingModel()
+
+
+@pytest.fixture
+def make_text():
+    return synthetic_text
+
+
+@pytest.fixture
+def make_html():
+    return synthetic_html
@@ -0,0 +1,54 @@
+import timeit
+from unittest.mock import patch
+
+import pytest
+
+from src.models.chat_history import ChatHistory
+
+pytestmark = pytest.mark.bench
+
+
+def legacy_format(messages, max_length):
+    """The former formatter: re-formats every message and inserts at the front."""
+    history = []
+    current_length = 0
+    for msg in reversed(messages[:-1]):
+        role = "ユーザー" if msg["role"] == "user" else "あなた"
+        formatted = f'{role}: {msg["content"]}\n'
+        if current_length + len(formatted) > max_length:
+            break
+        history.insert(0, formatted)
+        current_length += len(formatted)
+    return "".join(history).strip()
+
+
+def _best_of(func, repeat: int = 5) -> float:
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def test_format_history_long_conversation():
+    """Benchmark formatting a long conversation against the former implementation."""
+    n_messages = 20000
+    max_length = 10**9  # Budget large enough to include the whole conversation
+    chat_history = ChatHistory(max_messages=n_messages)
+    for i in range(n_messages):
+        role = "user" if i % 2 == 0 else "ai"
+        chat_history.append(role, f"これは{i}番目のメッセージです。")
+
+    # 作業量で比較する: 書式化はメッセージの追加時に一度だけ行われる
+    with patch.object(
+        ChatHistory, "format_message", wraps=ChatHistory.format_message
+    ) as format_message:
+        current = chat_history.format_suffix(max_length)
+    assert format_message.call_count == 0
+    assert current == legacy_format(chat_history.messages, max_length)
+
+    # 時間は複数回の最良値で比べ、負荷のかかったマシンでも揺れにくくする
+    legacy_seconds = _best_of(lambda: legacy_format(chat_history.messages, max_length))
+    current_seconds = _best_of(lambda: chat_history.format_suffix(max_length))
+    print(
+        f"\n{n_messages} messages: legacy {legacy_seconds * 1000:.1f}ms, "
+        f"prefix sums {current_seconds * 1000:.1f}ms"
+    )
+    # 実測では100倍以上速いため、5倍の余裕を見ても揺れで失敗しない
+    assert current_seconds * 5 < legacy_seconds
@@ -0,0 +1,154 @@
+import pytest
+
+from src.models.chat_history import ChatHistory
+from src.models.conversation_model import ConversationModel
+from src.models.scraping_model import ScrapingModel
+from src.models.think_stream_filter import ThinkStreamFilter
+from src.models.vector_store import VectorStore
+
+pytestmark = pytest.mark.bench
+
+# Characters of body text of the synthetic pages
+PAGE_SIZES = {"small": 10_000, "medium": 100_000, "large": 1_000_000}
+LANGUAGES = ("ja", "en")
+QUESTION = "このページで紹介されている手法の要点は何ですか？"
+
+
+@pytest.fixture
+def conversation_model() -> ConversationModel:
+    model = ConversationModel(client=None)
+    for i in range(200):
+        model.add_user_message(
+            f"{i}番目の質問です。ページの内容について教えてください。"
+        )
+        model.add_ai_message(
+            f"{i}番目の回答です。" + "ページでは要約の手法が説明されています。" * 5
+        )
+    model.add_user_message(QUESTION)
+    return model
+
+
+def _llm_stream(length: int, chunk_size: int = 8) -> list[str]:
+    """Chunks of a long reasoning-model answer: a <think> block, then the answer."""
+    thinking = "まず質問を確認する。次にページの内容と照らし合わせる。" * (length // 60)
+    answer = "要点は、本文の抽出、重要な文の選択、そして要約の生成です。" * (
+        length // 60
+    )
+    text = f"<think>{thinking}</think>{answer}"
+    return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+@pytest.mark.parametrize("language", LANGUAGES)
+@pytest.mark.parametrize("size", PAGE_SIZES)
+def test_extract_html_text(benchmark, make_html, language, size):
+    """Benchmark extracting the body text of an HTML page."""
+    html = make_html(language, PAGE_SIZES[size])
+
+    text = benchmark(
+        f"scraping.extract_text[{language}-{size}]", ScrapingModel.extract_text, html
+    )
+
+    assert "Related links" not in text
+    assert len(text) > PAGE_SIZES[size] * 0.9
+
+
+@pytest.mark.parametrize("language", LANGUAGES)
+@pytest.mark.parametrize("size", PAGE_SIZES)
+def test_create_embeddings(benchmark, encoder, make_text, language, size):
+    """Benchmark chunking a page and storing its (synthetic) embeddings."""
+    vector_store = VectorStore(model=encoder)
+    text = make_text(language, PAGE_SIZES[size])
+
+    benchmark(
+        f"vector_store.create_embeddings[{language}-{size}]",
+        vector_store.create_embeddings,
+        text,
+    )
+
+    assert vector_store.last_error is None
+    assert len(vector_store.texts) >= PAGE_SIZES[size] // 1000
+
+
+@pytest.mark.parametrize("size", PAGE_SIZES)
+def test_vector_search(benchmark, encoder, make_text, size):
+    """Benchmark the cosine-similarity search over every chunk of a page."""
+    vector_store = VectorStore(model=encoder)
+    vector_store.create_embeddings(make_text("ja", PAGE_SIZES[size]))
+    query_vec = vector_store.encode_query(QUESTION)
+
+    result = benchmark(
+        f"vector_store.search[{size}]",
+        lambda: vector_store.search(QUESTION, query_vec=query_vec),
+    )
+
+    assert result
+
+
+@pytest.mark.parametrize("length", [10_000, 100_000])
+def test_extract_think_content(benchmark, conversation_model, length):
+    """Benchmark splitting the thinking from the answer of a long response."""
+    text = "".join(_llm_stream(length))
+
+    thinking, answer = benchmark(
+        f"extract_think_content[{length}]",
+        conversation_model.extract_think_content,
+        text,
+    )
+
+    assert thinking and answer and "<think>" not in answer
+
+
+@pytest.mark.parametrize("length", [10_000, 100_000])
+def test_think_stream_filter(benchmark, length):
+    """Benchmark separating the thinking incrementally, chunk by chunk."""
+    chunks = _llm_stream(length)
+
+    def stream():
+        stream_filter = ThinkStreamFilter()
+        for chunk in chunks:
+            stream_filter.feed(chunk)
+        stream_filter.flush()
+        return stream_filter
+
+    stream_filter = benchmark(f"think_stream_filter[{length}]", stream)
+
+    assert stream_filter.thinking and stream_filter.visible
+
+
+def test_format_chat_history(benchmark, conversation_model):
+    """Benchmark formatting the chat history within the prompt budget."""
+    history = benchmark("format_chat_history", conversation_model._format_chat_history)
+
+    assert history
+
+
+def test_format_chat_history_unbounded(benchmark):
+    """Benchmark formatting a full 200-message history with no length limit."""
+    chat_history = ChatHistory(max_messages=200)
+    for i in range(200):
+        chat_history.append("user" if i % 2 == 0 else "ai", f"メッセージ{i}" * 20)
+
+    history = benchmark(
+        "chat_history.format_suffix[200]", chat_history.format_suffix, 10**9
+    )
+
+    assert history
+
+
+@pytest.mark.parametrize("size", PAGE_SIZES)
+def test_build_qa_prompt(benchmark, conversation_model, make_text, size):
+    """Benchmark assembling the Q&A prompt for a page."""
+    page_content = make_text("ja", PAGE_SIZES[size])
+    summary = make_text("ja", 800)
+    retrieved = make_text("ja", 3000)
+
+    prompt = benchmark(
+        f"conversation.build_qa_prompt[{size}]",
+        conversation_model._build_qa_prompt,
+        QUESTION,
+        summary,
+        retrieved,
+        page_content,
+    )
+
+    assert QUESTION in prompt
@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from src.models import ConversationModel
+
+
+def render_chat_page():
+    """A full script run: the history, then the chat fragment."""
+    from src.components.query_page.query_page import (
+        _render_chat_area,
+        _render_chat_history,
+    )
+
+    _render_chat_history()
+    _render_chat_area()
+
+
+def render_chat_fragment():
+    """A fragment rerun: only the chat area runs, the history is not sent again."""
+    from src.components.query_page.query_page import _render_chat_area
+
+    _render_chat_area()
+
+
+@pytest.fixture
+def conversation_model() -> ConversationModel:
+    client = MagicMock()
+    client.gen_stream = MagicMock(side_effect=lambda *args, **kwargs: _stream())
+    model = ConversationModel(client=client)
+    for i in range(3):
+        model.add_user_message(f"質問{i}")
+        model.add_ai_message(f"回答{i}")
+    return model
+
+
+async def _stream():
+    yield "新しい回答"
+
+
+def bubbles(at: AppTest) -> list[str]:
+    return [
+        element.value
+        for element in at.markdown
+        if "-message" in str(element.value) and "thinking" not in str(element.value)
+    ]
+
+
+def test_full_run_renders_each_message_once(conversation_model):
+    """Test that the history and the fragment do not both render a message."""
+    at = AppTest.from_function(render_chat_page)
+    at.session_state["conversation_model"] = conversation_model
+
+    at.run()
+
+    assert not at.exception
+    assert len(bubbles(at)) == 6
+
+
+def test_fragment_run_sends_only_the_new_turn(conversation_model):
+    """Test that answering in a fragment rerun renders only the new question and answer."""
+    at = AppTest.from_function(render_chat_fragment)
+    at.session_state["conversation_model"] = conversation_model
+    # 直前のページ全体の実行で、既存の6件は履歴として描画済み
+    at.session_state["chat_rendered_until"] = conversation_model.message_count
+    conversation_model.add_user_message("新しい質問")
+
+    at.run()
+
+    assert not at.exception
+    rendered = bubbles(at)
+    assert len(rendered) == 2
+    assert "新しい質問" in rendered[0]
+    assert "新しい回答" in rendered[1]
+    assert conversation_model.messages[-1] == {"role": "ai", "content": "新しい回答"}
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from src.models import ScrapingModel
+from src.services import session_memory
+
+PAGE_TEXT = "退避されたページの本文です。" * 20
+
+
+def render_viewer_fragment():
+    """A fragment rerun: only the viewer runs, initialize_session() is skipped."""
+    from src.components.query_page.query_page import _render_scraped_content
+
+    _render_scraped_content()
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.texts = ["chunk"]
+        self.embeddings = np.ones((1, 4), dtype=np.float32)
+        self.is_creating = False
+
+    def set_index(self, texts, embeddings):
+        self.texts, self.embeddings = texts, embeddings
+
+
+@pytest.fixture
+def spilled_session(tmp_path):
+    """A registered session whose page has been spilled to disk."""
+    session_memory.configure(spill_dir=str(tmp_path))
+    scraping_model = ScrapingModel()
+    scraping_model.content = PAGE_TEXT
+    vector_store = FakeVectorStore()
+    session_memory.register("viewer-session", scraping_model, vector_store)
+    assert session_memory.spill("viewer-session")
+    assert scraping_model.content is None
+    yield scraping_model, vector_store
+    session_memory.forget("viewer-session")
+    session_memory.configure()
+
+
+def test_viewer_toggle_rehydrates_spilled_session(spilled_session):
+    """Test that opening the viewer of a spilled session shows the page text."""
+    scraping_model, _ = spilled_session
+    at = AppTest.from_function(render_viewer_fragment)
+    at.secrets["SCRAPED_CONTENT_PAGE_SIZE"] = 5000
+    at.session_state["session_id"] = "viewer-session"
+    at.session_state["scraping_model"] = scraping_model
+
+    at.run()
+    at.toggle(key="show_scraped_content").set_value(True).run()
+
+    assert not at.exception
+    assert not session_memory.is_spilled("viewer-session")
+    assert any(PAGE_TEXT in str(element.value) for element in at.markdown)
+
+
+@pytest.fixture
+def forward_msg_bytes(monkeypatch):
+    """Collects the serialized size of the messages each AppTest run sends."""
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    sizes = []
+    forward_msgs = LocalScriptRunner.forward_msgs
+
+    def record(self):
+        msgs = forward_msgs(self)
+        sizes.append(sum(msg.ByteSize() for msg in msgs))
+        return msgs
+
+    monkeypatch.setattr(LocalScriptRunner, "forward_msgs", record)
+    return sizes
+
+
+def viewer_app(page_text: str) -> AppTest:
+    scraping_model = ScrapingModel()
+    scraping_model.content = page_text
+    at = AppTest.from_function(render_viewer_fragment)
+    at.secrets["SCRAPED_CONTENT_PAGE_SIZE"] = 1000
+    at.session_state["scraping_model"] = scraping_model
+    return at
+
+
+def test_viewer_sends_one_page_until_download_is_requested(forward_msg_bytes):
+    """Test that the full page text reaches the browser only on request."""
+    small, large = "あ" * 2_000, "あ" * 200_000
+
+    closed = []
+    for page_text in (small, large):
+        at = viewer_app(page_text)
+        at.run()
+        closed.append(forward_msg_bytes[-1])
+    # 閉じている間はページの大きさに関係なく送信量は変わらない
+    assert 0 < closed[0] == closed[1]
+
+    at.toggle(key="show_scraped_content").set_value(True).run()
+    assert not at.exception
+    assert forward_msg_bytes[-1] < 10_000
+    assert not at.get("download_button")
+
+    at.button(key="prepare_scraped_content_download").click().run()
+    assert not at.exception
+    assert len(at.get("download_button")) == 1
+
+    at.toggle(key="show_scraped_content").set_value(False).run()
+    at.toggle(key="show_scraped_content").set_value(True).run()
+    assert not at.get("download_button")
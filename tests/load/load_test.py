@@ -0,0 +1,585 @@
+"""
+Multi-session load test of the app.
+
+Drives N concurrent simulated sessions through the real src/main.py flow with
+Streamlit's AppTest: enter the URL of a page, wait for its summary, then ask K
+questions. Pages come from a local stand-in site and the LLM is the
+MockOllamaApiClient of DEBUG mode with a configurable token delay, so a run needs
+no network. For each number of sessions the report gives the throughput, the
+p50/p95/p99 latency of the user-facing stages and of the app's spans, and the
+peak RSS of the process.
+
+Running several AppTest sessions at once relies on Streamlit internals (see
+share_runtime), so the test refuses to run on a Streamlit version outside the
+tested range unless --allow-untested-streamlit is given.
+
+Usage:
+    PYTHONPATH=. python tests/load/load_test.py --sessions 1,2,4,8 --questions 3
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import streamlit
+import toml
+from packaging.version import Version
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.testing.v1 import AppTest, app_test
+
+from dev.mocks.models.mock_scraping_model import MockScrapingModel
+from src.models.scraping_model import ScrapingModel
+from src.router import Page
+from src.services import warmup
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MAIN_SCRIPT = os.path.join(PROJECT_ROOT, "src", "main.py")
+SECRETS_PATHS = (
+    os.path.join(PROJECT_ROOT, ".streamlit", "secrets.toml"),
+    os.path.join(PROJECT_ROOT, ".streamlit", "secrets.example.toml"),
+)
+QUESTIONS = (
+    "このページの要点を教えてください。",
+    "What are the main features described on this page?",
+    "どのような読者に向けたページですか？",
+    "Is there any contact information?",
+)
+PERCENTILES = (50, 95, 99)
+# Seconds between two reruns while a session waits (the browser polls the same way)
+POLL_INTERVAL = 0.1
+RSS_SAMPLE_INTERVAL = 0.05
+# Streamlit versions the patches of share_runtime() were checked against
+TESTED_STREAMLIT_VERSIONS = (Version("1.49.1"), Version("1.66.0"))
+
+
+class LoadTestError(Exception):
+    pass
+
+
+# --- Stand-in site ---
+
+
+def _page_html(name: str, size: int) -> bytes:
+    """An HTML page with about size characters of text, different for every name."""
+    paragraphs = [
+        " ".join(line.strip() for line in content.splitlines() if line.strip())
+        for content in MockScrapingModel().mock_content.values()
+    ]
+    parts, length, i = [], 0, 0
+    while length < size:
+        paragraph = f"{name} ({i}): {paragraphs[i % len(paragraphs)]}"
+        parts.append(f"<p>{paragraph}</p>\n")
+        length += len(paragraph)
+        i += 1
+    return (
+        f"<html><head><title>{name}</title></head><body>"
+        "<header><nav><a href='/'>Home</a></nav></header>"
+        f"<main><article>{''.join(parts)}</article></main>"
+        "<footer>&copy; Load test</footer></body></html>"
+    ).encode("utf-8")
+
+
+def start_site(page_size: int) -> ThreadingHTTPServer:
+    """Serve /pages/<name> on a free loopback port from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not self.path.startswith("/pages/"):
+                self.send_error(404)
+                return
+            body = _page_html(self.path.removeprefix("/pages/"), page_size)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="load-site", daemon=True).start()
+    return server
+
+
+def allow_host(host: str):
+    """
+    Let ScrapingModel fetch from host although it is a loopback address.
+
+    Only this process is patched, and only for the stand-in site: every other
+    host still goes through the private-address check.
+    """
+    is_private_host = ScrapingModel._is_private_host
+
+    def _is_private_host(self, hostname: str) -> bool:
+        return hostname != host and is_private_host(self, hostname)
+
+    ScrapingModel._is_private_host = _is_private_host
+
+
+def use_mock_encoder():
+    """Replace the sentence-transformers model with the offline hashing encoder."""
+    import sentence_transformers
+
+    from dev.mocks.models.mock_embedding_model import MockEmbeddingModel
+
+    # main.py imports SentenceTransformer from the module on every script run
+    sentence_transformers.SentenceTransformer = MockEmbeddingModel
+
+
+def install_secrets(overrides: dict) -> str:
+    """
+    Point Streamlit at a secrets file made of the project secrets plus overrides.
+
+    AppTest.secrets swaps st.secrets for the duration of each run, which races when
+    several sessions run at once, so the secrets are set once for the process.
+    """
+    path = next((p for p in SECRETS_PATHS if os.path.exists(p)), None)
+    settings = toml.load(path) if path else {}
+    settings.update(overrides)
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".toml", prefix="load-test-secrets-", delete=False
+    ) as f:
+        toml.dump(settings, f)
+    config.set_option("secrets.files", [f.name])
+    return f.name
+
+
+class _SharedRuntimeMeta(type):
+    def __setattr__(cls, name, value):
+        if name != "_instance":
+            super().__setattr__(name, value)
+        elif value is not None:
+            Runtime._instance = value
+
+
+class _SharedRuntime(Runtime, metaclass=_SharedRuntimeMeta):
+    pass
+
+
+def check_streamlit(allow_untested: bool = False):
+    """
+    Fail early if the internals patched by this test are missing or unverified.
+
+    Raises:
+        LoadTestError: If an internal is missing, or if the Streamlit version is
+            outside the tested range and allow_untested is False
+    """
+    missing = [
+        name
+        for name, present in (
+            ("streamlit.testing.v1.app_test.Runtime", app_test.Runtime is Runtime),
+            ("Runtime._instance", hasattr(Runtime, "_instance")),
+            (
+                "ScrapingModel._is_private_host",
+                callable(getattr(ScrapingModel, "_is_private_host", None)),
+            ),
+        )
+        if not present
+    ]
+    if missing:
+        raise LoadTestError(
+            f"Streamlit {streamlit.__version__} or the app no longer provides "
+            f"{', '.join(missing)}; update share_runtime() and allow_host()"
+        )
+    oldest, newest = TESTED_STREAMLIT_VERSIONS
+    version = Version(streamlit.__version__)
+    if not allow_untested and not oldest <= version <= newest:
+        raise LoadTestError(
+            f"Streamlit {version} is outside the tested range {oldest} to {newest}; "
+            "check share_runtime() against it, then extend "
+            "TESTED_STREAMLIT_VERSIONS or pass --allow-untested-streamlit"
+        )
+
+
+def share_runtime():
+    """
+    Keep a (mock) Runtime installed while sessions run concurrently.
+
+    AppTest installs a mock Runtime at the start of each run and removes it at the
+    end, so one session finishing a run would remove it under the others. Runs
+    keep installing their own runtime, but removing it is ignored.
+    """
+    app_test.Runtime = _SharedRuntime
+
+
+# --- Measurements ---
+
+
+class SpanCollector(logging.Handler):
+    """Collects the durations of the app's spans from the gist.trace records."""
+
+    def __init__(self):
+        super().__init__(level=logging.INFO)
+        self._lock = threading.Lock()
+        self.durations: dict[str, list[float]] = {}
+
+    def emit(self, record: logging.LogRecord):
+        span = getattr(record, "span", None)
+        if span is None or span.get("duration_ms") is None:
+            return
+        with self._lock:
+            self.durations.setdefault(span["span"], []).append(
+                span["duration_ms"] / 1000
+            )
+
+    def drain(self) -> dict[str, list[float]]:
+        with self._lock:
+            durations, self.durations = self.durations, {}
+        return durations
+
+
+def _current_rss() -> int | None:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _max_rss() -> int:
+    # Linux reports KiB, macOS bytes
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class RssSampler:
+    """
+    Samples the resident set size while a level runs and keeps its peak.
+
+    Falls back to the process-wide maximum where /proc is not available.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while True:
+            rss = _current_rss()
+            self.peak = max(self.peak, rss if rss is not None else _max_rss())
+            if self._stop.wait(self.interval):
+                return
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    return {
+        f"p{p}": float(v)
+        for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+    }
+
+
+# --- Sessions ---
+
+
+@dataclass
+class SessionResult:
+    stages: dict[str, list[float]] = field(default_factory=dict)
+    questions: int = 0
+    error: str | None = None
+
+    @contextmanager
+    def stage(self, name: str):
+        started_at = time.perf_counter()
+        yield
+        self.stages.setdefault(name, []).append(time.perf_counter() - started_at)
+
+
+def _run(at: AppTest):
+    at.run()
+    if at.exception:
+        raise LoadTestError(at.exception[0].message)
+
+
+def _wait_until(at: AppTest, condition, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise LoadTestError(f"Timed out waiting for {what}")
+        time.sleep(POLL_INTERVAL)
+        _run(at)
+
+
+def run_session(url: str, questions: int, timeout: float) -> SessionResult:
+    """
+    One simulated user: open the app, summarize url, then ask questions.
+
+    Stages: page_load (first render), summary (URL submitted -> summary shown)
+    and question (question submitted -> answer shown). The app's spans break them
+    down further.
+    """
+    result = SessionResult()
+    try:
+        at = AppTest.from_file(MAIN_SCRIPT, default_timeout=timeout)
+        with result.stage("page_load"):
+            _run(at)
+
+        at.text_input(key="url_input").input(url)
+        state = at.session_state
+        submitted_at = time.perf_counter()
+        at.button[0].click()
+        _run(at)
+
+        def on_chat_page() -> bool:
+            if state["scraping_model"].last_error:
+                raise LoadTestError(state["scraping_model"].last_error)
+            # AppRouter reads st.session_state, which only works inside a script run
+            return state["page"] == Page.CHAT
+
+        # 要約はチャットページへ移った実行の中でストリーミングされる
+        _wait_until(at, on_chat_page, timeout, "the chat page")
+        _wait_until(
+            at, lambda: state["summarization_model"].summary, timeout, "the summary"
+        )
+        result.stages["summary"] = [time.perf_counter() - submitted_at]
+
+        conversation_model = state["conversation_model"]
+        for i in range(questions):
+            answered = len(conversation_model.messages) + 2
+            with result.stage("question"):
+                at.chat_input[0].set_value(QUESTIONS[i % len(QUESTIONS)])
+                _run(at)
+                _wait_until(
+                    at,
+                    lambda: len(conversation_model.messages) >= answered
+                    and not conversation_model.is_responding,
+                    timeout,
+                    "the answer",
+                )
+            if conversation_model.last_error:
+                raise LoadTestError(conversation_model.last_error)
+            result.questions += 1
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+def run_level(
+    sessions: int,
+    base_url: str,
+    questions: int,
+    timeout: float,
+    shared_page: bool,
+    spans: SpanCollector,
+) -> dict:
+    """Run sessions simulated users at once and summarize their measurements."""
+    results: list[SessionResult] = [None] * sessions
+
+    def run(i: int):
+        # ページを分けると、回答キャッシュや同一プロンプトの共有が効かない最悪の場合になる
+        page = "shared" if shared_page else f"{sessions}-{i}"
+        results[i] = run_session(f"{base_url}/pages/{page}", questions, timeout)
+
+    spans.drain()
+    started_at = time.perf_counter()
+    with RssSampler() as rss:
+        threads = [
+            threading.Thread(target=run, args=(i,), name=f"load-session-{i}")
+            for i in range(sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    stages: dict[str, list[float]] = {}
+    for result in results:
+        for name, durations in result.stages.items():
+            stages.setdefault(name, []).extend(durations)
+    completed = [r for r in results if r.error is None]
+    answered = sum(r.questions for r in results)
+    return {
+        "sessions": sessions,
+        "completed": len(completed),
+        "errors": [r.error for r in results if r.error],
+        "seconds": elapsed,
+        "sessions_per_minute": len(completed) / elapsed * 60,
+        "questions_per_second": answered / elapsed,
+        "peak_rss_bytes": rss.peak,
+        "stages": {name: percentiles(d) for name, d in stages.items()},
+        "spans": {name: percentiles(d) for name, d in sorted(spans.drain().items())},
+    }
+
+
+def print_level(level: dict):
+    print(
+        f"\n== {level['sessions']} session(s): {level['completed']} completed "
+        f"in {level['seconds']:.1f}s, {level['sessions_per_minute']:.1f} sessions/min, "
+        f"{level['questions_per_second']:.2f} questions/s, "
+        f"peak RSS {level['peak_rss_bytes'] / 2**20:.0f} MiB"
+    )
+    for error in level["errors"]:
+        print(f"   error: {error}")
+    print(f"   {'stage':<28}" + "".join(f"{f'p{p}':>10}" for p in PERCENTILES))
+    for group in ("stages", "spans"):
+        for name, values in level[group].items():
+            label = name if group == "stages" else f"  {name}"
+            print(
+                f"   {label:<28}"
+                + "".join(f"{values[f'p{p}'] * 1000:>8.0f}ms" for p in PERCENTILES)
+            )
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sessions",
+        default="1,2,4,8",
+        help="Comma-separated numbers of concurrent sessions, run in order",
+    )
+    parser.add_argument(
+        "--questions", type=int, default=3, help="Questions per session"
+    )
+    parser.add_argument(
+        "--token-delay",
+        type=float,
+        default=0.01,
+        help="Seconds between two tokens of the mock LLM",
+    )
+    parser.add_argument(
+        "--page-size", type=int, default=20_000, help="Characters of text per page"
+    )
+    parser.add_argument(
+        "--shared-page",
+        action="store_true",
+        help="Send every session to the same page (answer cache and shared generations apply)",
+    )
+    parser.add_argument(
+        "--mock-encoder",
+        action="store_true",
+        help="Use the offline hashing encoder instead of the sentence-transformers model",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120, help="Seconds each stage may take"
+    )
+    parser.add_argument(
+        "--secret",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Override a secret, e.g. --secret LLM_MAX_CONCURRENCY=4 (TOML value)",
+    )
+    parser.add_argument(
+        "--allow-untested-streamlit",
+        action="store_true",
+        help="Run even if the Streamlit version is outside the tested range",
+    )
+    parser.add_argument("--json", help="Also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def run_load_test(args: argparse.Namespace, base_url: str, secrets: dict) -> dict:
+    """Warm the process up, then run every level of sessions in order."""
+    # AppTest runs the script outside of a server: these warnings are expected
+    for name in (
+        "streamlit.runtime.scriptrunner_utils.script_run_context",
+        "streamlit.runtime.state.session_state_proxy",
+    ):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    spans = SpanCollector()
+    span_logger = logging.getLogger("gist.trace")
+    span_logger.addHandler(spans)
+    span_logger.setLevel(logging.INFO)
+    span_logger.propagate = False
+
+    # 起動時のウォームアップ(モデルの読み込み)は計測から除く
+    started_at = time.perf_counter()
+    _run(AppTest.from_file(MAIN_SCRIPT, default_timeout=args.timeout))
+    if not warmup.wait(args.timeout):
+        raise LoadTestError("Timed out waiting for the warm-up")
+    print(
+        f"Warm-up done in {time.perf_counter() - started_at:.1f}s "
+        f"({', '.join(f'{k} {v:.2f}s' for k, v in warmup.timings.items())})"
+    )
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "settings": {
+            "questions": args.questions,
+            "token_delay": args.token_delay,
+            "page_size": args.page_size,
+            "shared_page": args.shared_page,
+            "mock_encoder": args.mock_encoder,
+            "secrets": secrets,
+        },
+        "levels": [],
+    }
+    for sessions in (int(n) for n in args.sessions.split(",")):
+        level = run_level(
+            sessions,
+            base_url,
+            args.questions,
+            args.timeout,
+            args.shared_page,
+            spans,
+        )
+        report["levels"].append(level)
+        print_level(level)
+    report["max_rss_bytes"] = _max_rss()
+    print(f"\nProcess max RSS: {report['max_rss_bytes'] / 2**20:.0f} MiB")
+    return report
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        check_streamlit(args.allow_untested_streamlit)
+    except LoadTestError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    site = start_site(args.page_size)
+    host, port = site.server_address[:2]
+    allow_host(host)
+    if args.mock_encoder:
+        use_mock_encoder()
+    overrides = {
+        "DEBUG": True,
+        "LLM_MOCK_TOKEN_DELAY": args.token_delay,
+        "LOG_FORMAT": "text",
+    }
+    for item in args.secret:
+        key, _, value = item.partition("=")
+        overrides[key] = toml.loads(f"value = {value}")["value"]
+    secrets_path = install_secrets(overrides)
+    share_runtime()
+
+    try:
+        report = run_load_test(args, f"http://{host}:{port}", overrides)
+    finally:
+        site.shutdown()
+        os.remove(secrets_path)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if any(level["errors"] for level in report["levels"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import pytest
+
+from src.models.chat_history import ChatHistory
+
+
+def legacy_format(messages, max_length):
+    """Reference implementation of the former backwards-walking formatter."""
+    history = []
+    current_length = 0
+    for msg in reversed(messages[:-1]):
+        formatted = ChatHistory.format_message(msg)
+        if current_length + len(formatted) > max_length:
+            break
+        history.insert(0, formatted)
+        current_length += len(formatted)
+    return "".join(history).strip()
+
+
+@pytest.fixture
+def chat_history():
+    """Fixture for a ChatHistory with a small cap."""
+    return ChatHistory(max_messages=6)
+
+
+class TestChatHistory:
+    def test_append_formats_messages(self, chat_history):
+        """Test that messages are stored and formatted with their role labels."""
+        chat_history.append("user", "Hello")
+        chat_history.append("ai", "Hi there")
+        chat_history.append("user", "How are you?")
+
+        assert chat_history.messages[0] == {"role": "user", "content": "Hello"}
+        assert chat_history.format_suffix(1500) == "ユーザー: Hello\nあなた: Hi there"
+
+    @pytest.mark.parametrize("max_length", [0, 5, 15, 30, 31, 60, 1000])
+    def test_format_suffix_matches_legacy(self, max_length):
+        """Test that the budgeted suffix matches the former implementation."""
+        chat_history = ChatHistory()
+        for i in range(10):
+            chat_history.append("user" if i % 2 == 0 else "ai", f"message {i}")
+
+        assert chat_history.format_suffix(max_length) == legacy_format(
+            chat_history.messages, max_length
+        )
+
+    def test_format_suffix_empty(self, chat_history):
+        """Test that an empty or single-message history formats to nothing."""
+        assert chat_history.format_suffix(1500) == ""
+        chat_history.append("user", "Only question")
+        assert chat_history.format_suffix(1500) == ""
+
+    def test_cap_bounds_memory(self, chat_history):
+        """Test that only the newest max_messages messages are kept."""
+        for i in range(10):
+            chat_history.append("user", str(i))
+
+        assert len(chat_history) == 6
+        assert chat_history.messages[0]["content"] == "4"
+        assert chat_history.start_index == 4
+        assert chat_history.end_index == 10
+        assert chat_history.format_suffix(1500) == legacy_format(
+            chat_history.messages, 1500
+        )
+
+    def test_suffix_start_is_absolute(self, chat_history):
+        """Test that suffix_start reports absolute message indices."""
+        for i in range(10):
+            chat_history.append("user", "x" * 10)
+
+        # Each formatted message is 17 characters; two of them fit in 40
+        assert chat_history.suffix_start(40) == 7
+
+    def test_format_suffix_min_start(self, chat_history):
+        """Test that messages before min_start are left out of the suffix."""
+        for i in range(6):
+            chat_history.append("user", str(i))
+
+        assert chat_history.format_suffix(1000, min_start=3) == (
+            "ユーザー: 3\nユーザー: 4"
+        )
+        assert chat_history.format_range(1, 3) == "ユーザー: 1\nユーザー: 2"
+
+    def test_replace_and_clear(self, chat_history):
+        """Test that the history can be replaced wholesale and cleared."""
+        chat_history.replace([{"role": "user", "content": str(i)} for i in range(3)])
+        assert [m["content"] for m in chat_history.messages] == ["0", "1", "2"]
+
+        chat_history.clear()
+        assert chat_history.messages == []
+        assert chat_history.start_index == 0
@@ -1,9 +1,11 @@
+import threading
 from string import Template
 from unittest.mock import AsyncMock, MagicMock, mock_open, patch
 
 import pytest
 
 from src.models.conversation_model import ConversationModel
+from src.services.cancellation import CancellationToken, GenerationCancelledError
 
 
 @pytest.fixture
@@ -127,14 +129,16 @@ class TestConversationModel:
         mock_secrets.get.side_effect = get_secret
 
         user_question = "User question"
-        # Build the expected prompt using the model's template
-        template_content = conversation_model._qa_prompt_template.template
-        expected_prompt = Template(template_content).safe_substitute(
-            summary="",
-            user_message=user_question,
-            chat_history="",
+        # Build the expected prompt using the model's templates
+        expected_prompt = Template(
+            conversation_model._qa_prompt_template.template
+        ).safe_substitute(summary="", page_content="") + Template(
+            conversation_model._qa_turn_prompt_template.template
+        ).safe_substitute(
+            conversation_memory="",
             vector_search_content="",
-            page_content="",
+            chat_history="",
+            user_message=user_question,
         )
 
         response = await conversation_model.respond_to_user_message(user_question)
@@ -146,6 +150,232 @@ class TestConversationModel:
         assert response == "AI response"
         assert not conversation_model.is_responding
 
+    @pytest.mark.asyncio
+    @patch("src.models.conversation_model.st.secrets")
+    async def test_qa_prompt_prefix_stable_across_turns(
+        self, mock_secrets, conversation_model, mock_client
+    ):
+        """Test that the page-dependent prompt prefix is byte-identical across turns."""
+        settings = {
+            "QUESTION_MODEL": "test-model",
+            "MAX_PROMPT_LENGTH": 6000,
+            "CONTEXT_MAX_LENGTH": 1500,
+            "RETRIEVAL_MAX_LENGTH": 1500,
+        }
+        mock_secrets.get.side_effect = lambda key, default=None: settings.get(
+            key, default
+        )
+        summary = "【タイトル】: テストページ"
+        page_content = "ページの本文です。" * 1000
+
+        conversation_model.add_user_message("要点は？")
+        await conversation_model.respond_to_user_message(
+            "要点は？",
+            summary=summary,
+            vector_search_content="関連チャンクA",
+            page_content=page_content,
+        )
+        conversation_model.add_ai_message("要点はこれです。")
+        conversation_model.add_user_message("誰が書いた？")
+        await conversation_model.respond_to_user_message(
+            "誰が書いた？",
+            summary=summary,
+            vector_search_content="関連チャンクB" * 300,
+            page_content=page_content,
+        )
+
+        first_prompt = mock_client.gen_batch.call_args_list[0].args[0]
+        second_prompt = mock_client.gen_batch.call_args_list[1].args[0]
+        stable_prefix = conversation_model._build_stable_prefix(summary, page_content)
+
+        assert first_prompt.startswith(stable_prefix)
+        assert second_prompt.startswith(stable_prefix)
+        assert first_prompt != second_prompt
+        # Per-turn parts come after the page content
+        assert second_prompt.index("ページの本文です。") < second_prompt.index(
+            "誰が書いた？"
+        )
+        assert len(second_prompt) <= 6000
+        assert second_prompt.endswith("**「誰が書いた？」**\n")
+
+    @patch("src.models.conversation_model.st.secrets")
+    def test_qa_prompt_keeps_page_content_at_default_settings(
+        self, mock_secrets, conversation_model
+    ):
+        """Test that the default budgets leave room for the page content."""
+        mock_secrets.get.side_effect = lambda key, default=None: default
+        summary = "【タイトル】: テストページ\n" + "要約の文章です。" * 30
+        page_content = "ページの本文です。" * 1000
+
+        prompt = conversation_model._build_qa_prompt(
+            "要点は？",
+            summary=summary,
+            vector_search_content="関連チャンク" * 500,
+            page_content=page_content,
+        )
+        page_budget, context_max_length, retrieval_max_length = (
+            conversation_model._prompt_budgets(summary)
+        )
+
+        assert prompt.count("ページの本文です。") * len("ページの本文です。") >= 500
+        assert page_budget + context_max_length + retrieval_max_length <= 4000
+        assert context_max_length < 1500 and retrieval_max_length < 1500
+        assert len(prompt) <= 4000
+        assert prompt.endswith("**「要点は？」**\n")
+
+    # --- stream_response_to_user_message tests ---
+    @pytest.mark.asyncio
+    @patch("src.models.conversation_model.st.secrets")
+    async def test_stream_response_to_user_message(
+        self, mock_secrets, conversation_model, mock_client
+    ):
+        """Test that the answer is streamed without think content and TTFT is recorded."""
+        mock_secrets.get.side_effect = lambda key, default=None: default
+
+        async def stream_generator():
+            yield "<think>Let me"
+            yield " think.</think>\n"
+            yield "The answer"
+            yield " is 42."
+
+        mock_client.gen_stream.return_value = stream_generator()
+
+        results = [
+            partial
+            async for partial in conversation_model.stream_response_to_user_message(
+                "Question?"
+            )
+        ]
+
+        assert results == ["The answer", "The answer is 42."]
+        assert conversation_model.last_ttft is not None
+        assert not conversation_model.is_responding
+        mock_client.gen_stream.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("src.models.conversation_model.st.secrets")
+    async def test_stream_response_to_user_message_error(
+        self, mock_secrets, conversation_model, mock_client
+    ):
+        """Test that streaming errors are recorded and re-raised."""
+        mock_secrets.get.side_effect = lambda key, default=None: default
+
+        async def error_generator():
+            yield "partial"
+            raise Exception("LLM Error")
+
+        mock_client.gen_stream.return_value = error_generator()
+
+        with pytest.raises(Exception, match="LLM Error"):
+            async for _ in conversation_model.stream_response_to_user_message("Q"):
+                pass
+        assert conversation_model.last_error == "応答の生成に失敗しました。"
+        assert not conversation_model.is_responding
+
+    @pytest.mark.asyncio
+    @patch("src.models.conversation_model.st.secrets")
+    async def test_stream_response_cancelled_by_token(
+        self, mock_secrets, conversation_model, mock_client
+    ):
+        """Test that cancelling the token stops the answer without recording an error."""
+        mock_secrets.get.side_effect = lambda key, default=None: default
+
+        async def stream_generator():
+            yield "First"
+            yield " second"
+
+        mock_client.gen_stream.return_value = stream_generator()
+        token = CancellationToken()
+
+        results = []
+        with pytest.raises(GenerationCancelledError):
+            async for partial in conversation_model.stream_response_to_user_message(
+                "Q", cancel_token=token
+            ):
+                results.append(partial)
+                token.cancel("new_chat")
+
+        assert results == ["First"]
+        assert conversation_model.last_error is None
+        assert not conversation_model.is_responding
+
+    # --- schedule_compaction tests ---
+    @patch("src.models.conversation_model.st.secrets")
+    def test_schedule_compaction_nothing_to_compact(
+        self, mock_secrets, conversation_model, mock_client
+    ):
+        """Test that short conversations are not compacted."""
+        mock_secrets.get.side_effect = lambda key, default=None: default
+        conversation_model.add_user_message("Hello")
+        conversation_model.add_ai_message("Hi")
+
+        assert conversation_model.schedule_compaction() is None
+        mock_client.gen_batch.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("src.models.conversation_model.st.secrets")
+    async def test_schedule_compaction_summarizes_evicted_turns(
+        self, mock_secrets, conversation_model, mock_client
+    ):
+        """Test that evicted turns are summarized and replaced by the memory."""
+        settings = {
+            "QUESTION_MODEL": "test-model",
+            "CONTEXT_MAX_LENGTH": 1000,
+            "CONVERSATION_MEMORY_MAX_LENGTH": 200,
+        }
+        mock_secrets.get.side_effect = lambda key, default=None: settings.get(
+            key, default
+        )
+        mock_client.gen_batch.return_value = "<think>hmm</think>古い会話の要約"
+        for i in range(10):
+            conversation_model.add_user_message(f"古い質問{i}" + "あ" * 100)
+            conversation_model.add_ai_message(f"古い回答{i}" + "い" * 100)
+
+        future = conversation_model.schedule_compaction()
+        future.result(timeout=5)
+
+        prompt = mock_client.gen_batch.call_args.args[0]
+        assert "古い質問0" in prompt
+        assert "古い回答9" not in prompt
+        assert mock_client.gen_batch.call_args.kwargs == {"model": "test-model"}
+        assert conversation_model.memory == "古い会話の要約"
+
+        # The memory replaces the evicted turns in the next prompt
+        conversation_model.add_user_message("新しい質問")
+        await conversation_model.respond_to_user_message("新しい質問")
+        qa_prompt = mock_client.gen_batch.call_args.args[0]
+        assert "古い会話の要約" in qa_prompt
+        assert "古い質問0" not in qa_prompt
+        assert "古い回答9" in qa_prompt
+
+    @patch("src.models.conversation_model.st.secrets")
+    def test_reset_discards_pending_compaction(
+        self, mock_secrets, conversation_model, mock_client
+    ):
+        """Test that a compaction finishing after reset does not leak into the new chat."""
+        mock_secrets.get.side_effect = lambda key, default=None: {
+            "CONTEXT_MAX_LENGTH": 600,
+            "CONVERSATION_MEMORY_MAX_LENGTH": 100,
+        }.get(key, default)
+        release = threading.Event()
+
+        async def slow_batch(prompt, model):
+            release.wait(timeout=5)
+            return "stale summary"
+
+        mock_client.gen_batch.side_effect = slow_batch
+        for i in range(10):
+            conversation_model.add_user_message("q" * 100)
+            conversation_model.add_ai_message("a" * 100)
+
+        future = conversation_model.schedule_compaction()
+        conversation_model.reset()
+        release.set()
+        future.result(timeout=5)
+
+        assert conversation_model.memory == ""
+        assert conversation_model._compacted_until == 0
+
     # --- _load_qa_prompt_template tests ---
     def test_load_qa_prompt_template_success(self, conversation_model):
         """Test that the QA prompt template is loaded correctly."""
@@ -178,6 +408,22 @@ class TestConversationModel:
                     conversation_model._load_qa_prompt_template()
                 mock_file.assert_called_once_with(target_path, "r", encoding="utf-8")
 
+    def test_load_qa_turn_prompt_template_success(self, conversation_model):
+        """Test that the per-turn QA prompt template is loaded correctly."""
+        mock_template_content = "Question: $user_message"
+        target_path = "src/static/prompts/web_page_qa_turn_prompt.md"
+
+        with patch(
+            "builtins.open", mock_open(read_data=mock_template_content)
+        ) as mock_file:
+            with patch(
+                "src.models.conversation_model.os.path.join", return_value=target_path
+            ):
+                template = conversation_model._load_qa_turn_prompt_template()
+
+                mock_file.assert_called_once_with(target_path, "r", encoding="utf-8")
+                assert template.template == mock_template_content
+
     # --- limit_messages test ---
     def test_limit_messages(self, conversation_model):
         """Test that messages are correctly limited in the model's state."""
@@ -195,3 +441,16 @@ class TestConversationModel:
         # Assert that the oldest messages were removed
         # The first message should now be the one with content "5"
         assert conversation_model.messages[0]["content"] == "5"
+
+    def test_message_count_includes_trimmed_messages(self, conversation_model):
+        """Test that message_count keeps counting after old messages are dropped."""
+        for i in range(15):
+            conversation_model.add_user_message(str(i))
+        conversation_model.limit_messages(max_messages=10)
+        conversation_model.add_ai_message("answer")
+
+        assert len(conversation_model.messages) == 11
+        assert conversation_model.message_count == 16
+
+        conversation_model.reset()
+        assert conversation_model.message_count == 0
@@ -0,0 +1,31 @@
+from string import Template
+from unittest.mock import MagicMock
+
+from src.models import prompt_templates
+from src.models.prompt_templates import shared_prompt_template
+
+
+class TestSharedPromptTemplate:
+    def setup_method(self):
+        prompt_templates._templates.clear()
+
+    def teardown_method(self):
+        prompt_templates._templates.clear()
+
+    def test_loads_each_template_once(self):
+        """Test that a template file is read only on first use."""
+        load = MagicMock(return_value=Template("Hello $name"))
+
+        first = shared_prompt_template("greeting.md", load)
+        second = shared_prompt_template("greeting.md", load)
+
+        assert first is second
+        load.assert_called_once()
+
+    def test_templates_are_keyed_by_file(self):
+        """Test that different files get different templates."""
+        first = shared_prompt_template("a.md", lambda: Template("a"))
+        second = shared_prompt_template("b.md", lambda: Template("b"))
+
+        assert first.template == "a"
+        assert second.template == "b"
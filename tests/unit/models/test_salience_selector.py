@@ -0,0 +1,94 @@
+import pytest
+
+from src.models.salience_selector import SalienceSelector
+
+
+@pytest.fixture
+def selector():
+    """Fixture for a SalienceSelector instance."""
+    return SalienceSelector()
+
+
+class TestSalienceSelector:
+    def test_split_sentences(self, selector):
+        """Test that Japanese and English sentence terminators are both handled."""
+        text = "猫は可愛い。犬も可愛い！ The cat sat. Version 3.14 is out?"
+        assert selector.split_sentences(text) == [
+            "猫は可愛い。",
+            "犬も可愛い！",
+            "The cat sat.",
+            "Version 3.14 is out?",
+        ]
+
+    def test_split_sentences_on_newlines(self, selector):
+        """Test that unpunctuated lines such as headings and list items are split."""
+        text = "見出し\n\n- 猫は可愛い\n- 犬も可愛い\nMenu item\r\nLast line"
+        assert selector.split_sentences(text) == [
+            "見出し",
+            "- 猫は可愛い",
+            "- 犬も可愛い",
+            "Menu item",
+            "Last line",
+        ]
+
+    def test_select_picks_lines_of_unpunctuated_text(self, selector):
+        """Test that text without terminators is not treated as one long sentence."""
+        text = "\n".join(
+            ["The fox runs in the forest", "Stock prices fell sharply today"] * 3
+            + ["A fox hides in the forest at night"]
+        )
+        digest = selector.select(text, max_chars=60)
+
+        assert digest
+        assert "Stock prices" not in digest
+
+    def test_tokenize_uses_bigrams_for_japanese(self, selector):
+        """Test that Japanese runs become character bigrams and words stay whole."""
+        assert selector._tokenize("Hello 世界です") == ["hello", "世界", "界で", "です"]
+
+    def test_score_sentences_prefers_central_topic(self, selector):
+        """Test that sentences about the dominant topic score above an outlier."""
+        sentences = [
+            "The fox runs in the forest.",
+            "A fox hides in the forest at night.",
+            "The forest fox hunts for food.",
+            "Stock prices fell sharply today.",
+        ]
+        scores = selector.score_sentences(sentences)
+
+        assert scores.shape == (4,)
+        assert scores[3] < min(scores[:3])
+
+    def test_score_sentences_without_tokens(self, selector):
+        """Test that sentences without any token get a zero score."""
+        scores = selector.score_sentences(["...", "!!!"])
+        assert scores.tolist() == [0.0, 0.0]
+
+    def test_select_returns_short_text_unchanged(self, selector):
+        """Test that text within the budget is returned as is."""
+        text = "Short text. Nothing to cut."
+        assert selector.select(text, max_chars=100) == text
+
+    def test_select_keeps_document_order_within_budget(self, selector):
+        """Test that selected sentences respect the budget and the original order."""
+        text = (
+            "The fox runs in the forest. "
+            "Stock prices fell sharply today. "
+            "A fox hides in the forest at night. "
+            "The weather was mild. "
+            "The forest fox hunts for food."
+        )
+        digest = selector.select(text, max_chars=70)
+
+        assert len(digest) <= 70
+        assert "Stock prices" not in digest
+        assert digest.index("runs") < digest.index("hides")
+
+    def test_select_falls_back_to_head_for_long_sentence(self, selector):
+        """Test that a single sentence longer than the budget falls back to the head."""
+        text = "a" * 500
+        assert selector.select(text, max_chars=50) == "a" * 50
+
+    def test_select_with_empty_budget(self, selector):
+        """Test that a non-positive budget returns an empty digest."""
+        assert selector.select("Some text.", max_chars=0) == ""
@@ -4,6 +4,7 @@ from unittest.mock import MagicMock, mock_open, patch
 import pytest
 
 from src.models.summarization_model import SummarizationModel, SummarizationModelError
+from src.services.cancellation import GenerationCancelledError
 
 
 @pytest.fixture
@@ -87,6 +88,31 @@ class TestSummarizationModel:
         assert summarization_model.summary == "This is the summary."
         assert not summarization_model.is_summarizing
 
+    @pytest.mark.asyncio
+    async def test_stream_summary_cancelled(self, summarization_model, mock_llm_client):
+        """Test that reset() stops an in-flight summary and closes the stream."""
+        closed = []
+
+        async def stream_generator():
+            try:
+                yield "First part."
+                yield "Second part."
+            finally:
+                closed.append(True)
+
+        mock_llm_client.gen_stream.return_value = stream_generator()
+
+        results = []
+        with pytest.raises(GenerationCancelledError):
+            async for _, summary in summarization_model.stream_summary("content"):
+                results.append(summary)
+                summarization_model.reset()
+
+        assert results == ["First part."]
+        assert closed == [True]
+        assert summarization_model.summary == ""
+        assert not summarization_model.is_summarizing
+
     @pytest.mark.asyncio
     async def test_stream_summary_llm_error(self, summarization_model, mock_llm_client):
         """Test that stream_summary handles errors from the LLM client."""
@@ -108,6 +134,41 @@ class TestSummarizationModel:
 
         assert not summarization_model.is_summarizing
 
+    @patch("src.models.summarization_model.st.secrets")
+    def test_select_summary_input_fits_prompt_budget(
+        self, mock_secrets, summarization_model
+    ):
+        """Test that long content is reduced to a salient digest within the prompt budget."""
+        settings = {"MAX_PROMPT_LENGTH": 2000, "SUMMARY_SALIENCE_SELECTION": True}
+        mock_secrets.get.side_effect = lambda key, default=None: settings.get(
+            key, default
+        )
+        scraped_content = " ".join(
+            f"The fox number {i} runs through the forest." for i in range(200)
+        )
+
+        selected = summarization_model._select_summary_input(scraped_content)
+        prompt = summarization_model._summarization_prompt_template.safe_substitute(
+            content=selected
+        )
+
+        assert 0 < len(selected) < len(scraped_content)
+        assert len(prompt) <= 2000
+        assert selected.startswith("The fox number")
+
+    @patch("src.models.summarization_model.st.secrets")
+    def test_select_summary_input_disabled(self, mock_secrets, summarization_model):
+        """Test that the head of the content is used when selection is disabled."""
+        settings = {"SUMMARY_SALIENCE_SELECTION": False}
+        mock_secrets.get.side_effect = lambda key, default=None: settings.get(
+            key, default
+        )
+        scraped_content = "x" * 20000
+
+        selected = summarization_model._select_summary_input(scraped_content)
+
+        assert selected == "x" * 10000
+
     def test_reset(self, summarization_model):
         """Test that the reset method clears the state."""
         summarization_model.summary = "A summary"
@@ -0,0 +1,51 @@
+import pytest
+
+from src.models.think_stream_filter import ThinkStreamFilter
+
+
+@pytest.fixture
+def think_filter():
+    """Fixture for a ThinkStreamFilter instance."""
+    return ThinkStreamFilter()
+
+
+def feed_all(think_filter, chunks):
+    deltas = [think_filter.feed(chunk) for chunk in chunks]
+    deltas.append(think_filter.flush())
+    return deltas
+
+
+class TestThinkStreamFilter:
+    def test_plain_text_is_visible_immediately(self, think_filter):
+        """Test that text without tags is passed through chunk by chunk."""
+        assert feed_all(think_filter, ["Hello", " world"]) == ["Hello", " world", ""]
+        assert think_filter.visible == "Hello world"
+        assert think_filter.thinking == ""
+
+    def test_think_content_is_hidden(self, think_filter):
+        """Test that think content is separated from the visible answer."""
+        feed_all(think_filter, ["<think>reasoning</think>", "\n\nAnswer"])
+        assert think_filter.thinking == "reasoning"
+        assert think_filter.visible == "Answer"
+
+    def test_tags_split_across_chunks(self, think_filter):
+        """Test that tags split over several chunks are still recognized."""
+        chunks = ["<th", "ink>rea", "soning</", "think", ">Ans", "wer"]
+        deltas = feed_all(think_filter, chunks)
+
+        assert "".join(deltas) == "Answer"
+        assert think_filter.thinking == "reasoning"
+        # Nothing is shown while the model is thinking
+        assert deltas[:4] == ["", "", "", ""]
+
+    def test_partial_tag_is_released_on_flush(self, think_filter):
+        """Test that a held-back fragment that never became a tag is shown at the end."""
+        assert think_filter.feed("a <") == "a "
+        assert think_filter.flush() == "<"
+        assert think_filter.visible == "a <"
+
+    def test_unclosed_think_stays_hidden(self, think_filter):
+        """Test that an unterminated think block never becomes visible."""
+        feed_all(think_filter, ["<think>still thinking"])
+        assert think_filter.visible == ""
+        assert think_filter.thinking == "still thinking"
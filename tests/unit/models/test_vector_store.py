@@ -1,6 +1,7 @@
 import numpy as np
 import pytest
 
+from dev.mocks.models.mock_embedding_model import MockEmbeddingModel
 from src.models.vector_store import VectorStore
 
 
@@ -45,6 +46,17 @@ def test_search(vector_store):
     assert "fox" in results
 
 
+def test_search_with_precomputed_query_vec(vector_store):
+    """Test that a precomputed query embedding gives the same result."""
+    text = "The quick brown fox jumps over the lazy dog."
+    vector_store.create_embeddings(text)
+
+    query_vec = vector_store.encode_query("A fast fox")
+    assert vector_store.search("A fast fox", top_k=1, query_vec=query_vec) == (
+        vector_store.search("A fast fox", top_k=1)
+    )
+
+
 def test_search_with_no_embeddings(vector_store):
     """Test search when no embeddings are created."""
     query = "A fast fox"
@@ -62,3 +74,35 @@ def test_reset(vector_store):
     assert vector_store.embeddings is None
     assert not vector_store.is_creating
     assert vector_store.last_error is None
+
+
+def test_search_reads_one_consistent_index():
+    """Test that replacing the index during a search does not mix old and new chunks."""
+
+    class ResettingEncoder(MockEmbeddingModel):
+        def encode(self, texts, **kwargs):
+            if texts == ["query"]:
+                # 検索中に別スレッドから索引が置き換えられた場合
+                vector_store.set_index(["new chunk"], super().encode(["new chunk"]))
+            return super().encode(texts)
+
+    vector_store = VectorStore(model=ResettingEncoder())
+    vector_store.create_embeddings(" ".join(f"sentence {i}." for i in range(500)))
+    chunk_count = len(vector_store.texts)
+
+    results = vector_store.search("query", top_k=chunk_count)
+
+    assert len(results.split("\n\n")) == chunk_count
+    assert "new chunk" not in results
+
+
+def test_compute_index_does_not_publish():
+    """Test that computing an index leaves the published one untouched."""
+    vector_store = VectorStore(model=MockEmbeddingModel())
+    vector_store.create_embeddings("Old page.")
+
+    texts, embeddings = vector_store.compute_index("New page.")
+
+    assert texts == ["New page."]
+    assert embeddings.shape[0] == 1
+    assert vector_store.texts == ["Old page."]
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from src.services.answer_cache import SemanticAnswerCache
+
+
+class FakeClock:
+    """A manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def answer_cache(clock):
+    """Fixture for a SemanticAnswerCache with a short TTL."""
+    return SemanticAnswerCache(threshold=0.9, ttl_seconds=60, max_pages=2, clock=clock)
+
+
+class TestSemanticAnswerCache:
+    def test_page_key_depends_on_content_and_namespace(self):
+        """Test that page keys differ per content and per embedding namespace."""
+        key = SemanticAnswerCache.page_key("content", namespace="model-a")
+        assert key == SemanticAnswerCache.page_key("content", namespace="model-a")
+        assert key != SemanticAnswerCache.page_key("other", namespace="model-a")
+        assert key != SemanticAnswerCache.page_key("content", namespace="model-b")
+
+    @pytest.mark.parametrize(
+        "question, expected",
+        [
+            ("要点は？", True),
+            ("誰が書いた？", True),
+            ("この記事の要点は？", True),
+            ("それについて詳しく教えて", False),
+            ("その人は誰？", False),
+            ("What does it mean?", False),
+            ("Who wrote the article?", True),
+            # 指示語と紛らわしい表現は履歴に依存しない
+            ("それぞれの特徴は？", True),
+            ("これからの予定は？", True),
+            ("著者の名前の読み方は？", True),
+            ("What is this page about?", True),
+            ("Which tools does this article recommend?", True),
+            ("What are the steps that the author lists?", True),
+            ("Is the new version more secure?", True),
+            ("Which releases were published earlier than 2020?", True),
+            # 文頭・単独の指示代名詞や続きの要求は履歴に依存する
+            ("That sounds wrong, why?", False),
+            ("Why is that?", False),
+            ("Can you explain this?", False),
+            ("Tell me more", False),
+            ("What did you mention earlier about pricing?", False),
+            ("Summarize the previous answer", False),
+        ],
+    )
+    def test_is_history_independent(self, question, expected):
+        """Test the detection of questions that refer to earlier turns."""
+        assert SemanticAnswerCache.is_history_independent(question) is expected
+
+    def test_hit_for_similar_question(self, answer_cache):
+        """Test that a semantically close question returns the stored answer."""
+        answer_cache.store("page", "要点は？", np.array([1.0, 0.0]), "答え")
+
+        assert answer_cache.lookup("page", np.array([0.99, 0.05])) == "答え"
+        assert answer_cache.stats()["hits"] == 1
+
+    def test_miss_for_different_question_or_page(self, answer_cache):
+        """Test that dissimilar questions and other pages miss."""
+        answer_cache.store("page", "要点は？", np.array([1.0, 0.0]), "答え")
+
+        assert answer_cache.lookup("page", np.array([0.0, 1.0])) is None
+        assert answer_cache.lookup("other-page", np.array([1.0, 0.0])) is None
+        stats = answer_cache.stats()
+        assert stats["misses"] == 2
+        assert stats["hit_rate"] == 0.0
+
+    def test_ttl_eviction(self, answer_cache, clock):
+        """Test that expired answers are evicted."""
+        answer_cache.store("page", "要点は？", np.array([1.0, 0.0]), "答え")
+        clock.now = 61
+
+        assert answer_cache.lookup("page", np.array([1.0, 0.0])) is None
+        assert answer_cache.stats()["entries"] == 0
+
+    def test_lru_page_eviction(self, answer_cache):
+        """Test that the least recently used page is evicted beyond max_pages."""
+        vector = np.array([1.0, 0.0])
+        answer_cache.store("page-1", "q", vector, "a1")
+        answer_cache.store("page-2", "q", vector, "a2")
+        answer_cache.lookup("page-1", vector)
+        answer_cache.store("page-3", "q", vector, "a3")
+
+        assert answer_cache.lookup("page-2", vector) is None
+        assert answer_cache.lookup("page-1", vector) == "a1"
+        assert answer_cache.lookup("page-3", vector) == "a3"
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from src.services.asset_registry import AssetRegistry, minify_css
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    """A static directory with two stylesheets and an icon."""
+    (tmp_path / "css").mkdir()
+    (tmp_path / "svg").mkdir()
+    (tmp_path / "css" / "a.css").write_text(
+        "/* Base */\n.a {\n    color: red;\n}\n", encoding="utf-8"
+    )
+    (tmp_path / "css" / "b.css").write_text(
+        ".b > p,\n.c :hover {\n    margin: 0 auto;\n}\n", encoding="utf-8"
+    )
+    (tmp_path / "svg" / "icon.svg").write_text("<svg></svg>", encoding="utf-8")
+    return tmp_path
+
+
+class TestMinifyCss:
+    def test_removes_comments_and_whitespace(self):
+        """Test that comments and redundant whitespace are removed."""
+        css = "/* Title */\n.main h1 {\n    font-size: 3.5rem;\n    color: red;\n}\n"
+        assert minify_css(css) == ".main h1{font-size:3.5rem;color:red}"
+
+    def test_keeps_meaningful_spaces(self):
+        """Test that spaces inside selectors and values are preserved."""
+        css = ".c :hover, .d .e { margin: 0 auto; width: calc(100% - 2rem); }"
+        assert minify_css(css) == (
+            ".c :hover,.d .e{margin:0 auto;width:calc(100% - 2rem)}"
+        )
+
+
+class TestAssetRegistry:
+    def test_loads_assets_once(self, static_dir, monkeypatch):
+        """Test that assets are read at startup and served from memory."""
+        registry = AssetRegistry(root=str(static_dir))
+
+        def fail(*args, **kwargs):
+            raise AssertionError("unexpected disk read")
+
+        monkeypatch.setattr("builtins.open", fail)
+        assert registry.get("svg/icon.svg") == "<svg></svg>"
+        assert registry.stylesheet("css/a.css") == ".a{color:red}"
+
+    def test_combines_stylesheets_into_one_tag(self, static_dir):
+        """Test that several stylesheets are injected as a single <style> block."""
+        registry = AssetRegistry(root=str(static_dir))
+
+        tag = registry.style_tag("css/a.css", "css/b.css")
+
+        assert tag.count("<style>") == 1
+        assert tag == "<style>.a{color:red}.b>p,.c :hover{margin:0 auto}</style>"
+
+    def test_skips_missing_files(self, static_dir):
+        """Test that a missing stylesheet does not break the page."""
+        registry = AssetRegistry(root=str(static_dir))
+
+        assert registry.get("css/missing.css") is None
+        assert registry.stylesheet("css/missing.css", "css/a.css") == ".a{color:red}"
+
+    def test_reloads_modified_files_when_enabled(self, static_dir):
+        """Test that a changed file is picked up only in reload mode."""
+        registry = AssetRegistry(root=str(static_dir))
+        path = static_dir / "css" / "a.css"
+        registry.stylesheet("css/a.css")
+
+        path.write_text(".a { color: blue; }", encoding="utf-8")
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+        assert registry.stylesheet("css/a.css") == ".a{color:red}"
+        registry.configure(reload=True)
+        assert registry.stylesheet("css/a.css") == ".a{color:blue}"
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.services.async_runtime import AsyncRuntime
+
+
+@pytest.fixture
+def runtime() -> AsyncRuntime:
+    return AsyncRuntime(name="test-runtime")
+
+
+async def numbers(count: int, delay: float = 0.0, closed: threading.Event = None):
+    try:
+        for i in range(count):
+            await asyncio.sleep(delay)
+            yield i
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+class TestAsyncRuntime:
+    def test_reuses_one_loop_across_calls(self, runtime):
+        """Test that every call runs on the same long-lived loop and thread."""
+
+        async def current():
+            return asyncio.get_running_loop(), threading.current_thread().name
+
+        first = runtime.run(current())
+        second = runtime.run(current())
+
+        assert first == second
+        assert first[1] == "test-runtime"
+
+    def test_submit_returns_future(self, runtime):
+        """Test that submit() returns a future resolving to the coroutine's result."""
+
+        async def add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+
+        assert runtime.submit(add(1, 2)).result(timeout=1) == 3
+
+    def test_iterate_yields_all_items(self, runtime):
+        """Test that an async generator is fully iterated from sync code."""
+        assert list(runtime.iterate(numbers(5))) == [0, 1, 2, 3, 4]
+
+    def test_iterate_closes_generator_on_early_exit(self, runtime):
+        """Test that stopping iteration early closes the async generator."""
+        closed = threading.Event()
+        items = runtime.iterate(numbers(100, delay=0.01, closed=closed))
+
+        assert next(items) == 0
+        items.close()
+
+        assert closed.is_set()
+
+    def test_iterate_propagates_errors(self, runtime):
+        """Test that an exception raised by the generator reaches the caller."""
+
+        async def failing():
+            yield 1
+            raise ValueError("boom")
+
+        items = runtime.iterate(failing())
+        assert next(items) == 1
+        with pytest.raises(ValueError, match="boom"):
+            next(items)
+
+    def test_iterate_calls_on_wait_while_waiting(self, runtime):
+        """Test that on_wait is called while the next item is pending."""
+        waits = []
+
+        result = list(
+            runtime.iterate(
+                numbers(1, delay=0.1),
+                on_wait=lambda: waits.append(1),
+                wait_interval=0.02,
+            )
+        )
+
+        assert result == [0]
+        assert len(waits) >= 2
@@ -0,0 +1,185 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.services.cancellation import (
+    CancellationToken,
+    GenerationCancelledError,
+    cancellable_call,
+    cancellable_stream,
+)
+from src.services.metrics import metrics
+from src.services.tracing import Tracer
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    """Start every test with an empty metrics registry."""
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class FakeStream:
+    """Token stream that blocks after the given chunks until it is closed."""
+
+    def __init__(self, chunks, block=False):
+        self.chunks = list(chunks)
+        self.block = block
+        self.closed = False
+        self.waiting = threading.Event()
+
+    async def __call__(self):
+        try:
+            for chunk in self.chunks:
+                yield chunk
+            if self.block:
+                self.waiting.set()
+                await asyncio.sleep(60)
+        finally:
+            self.closed = True
+
+
+class TestCancellationToken:
+    def test_callbacks_run_once(self):
+        """Test that callbacks run on the first cancel only."""
+        token = CancellationToken()
+        calls = []
+        token.add_callback(lambda: calls.append("cb"))
+
+        token.cancel("new_chat")
+        token.cancel("again")
+
+        assert calls == ["cb"]
+        assert token.cancelled
+        assert token.reason == "new_chat"
+        with pytest.raises(GenerationCancelledError, match="new_chat"):
+            token.raise_if_cancelled()
+
+    def test_callback_added_after_cancel_runs_immediately(self):
+        """Test that late callbacks are not lost."""
+        token = CancellationToken()
+        token.cancel()
+        calls = []
+        token.add_callback(lambda: calls.append("cb"))
+        assert calls == ["cb"]
+
+
+class TestCancellableStream:
+    @pytest.mark.asyncio
+    async def test_completed_stream_records_length(self):
+        """Test that completed generations record their number of chunks."""
+        stream = FakeStream(["a", "b", "c"])
+        chunks = [
+            chunk
+            async for chunk in cancellable_stream(
+                stream(), CancellationToken(), operation="chat"
+            )
+        ]
+
+        assert chunks == ["a", "b", "c"]
+        assert stream.closed
+        histogram = metrics.get_histogram("llm_generation_tokens", operation="chat")
+        assert histogram.count == 1 and histogram.sum == 3
+
+    @pytest.mark.asyncio
+    async def test_completed_stream_records_ttft_and_token_rate(self):
+        """Test that the first-token latency and decoding speed are recorded on the span."""
+        tracer = Tracer()
+        with tracer.span("stream_summary") as span:
+            async for _ in cancellable_stream(
+                FakeStream(["a", "b", "c"])(), CancellationToken(), operation="summary"
+            ):
+                pass
+
+        ttft = metrics.get_histogram(
+            "llm_time_to_first_token_seconds", operation="summary"
+        )
+        assert ttft.count == 1
+        assert span.attributes["tokens"] == 3
+        assert "ttft_seconds" in span.attributes
+
+    @pytest.mark.asyncio
+    async def test_cancel_from_another_thread_interrupts_wait(self):
+        """Test that a cancel closes a stream that is waiting for the next chunk."""
+        metrics.observe("llm_generation_tokens", 10, operation="chat")
+        stream = FakeStream(["a", "b"], block=True)
+        token = CancellationToken()
+
+        def cancel_when_waiting():
+            stream.waiting.wait(timeout=5)
+            token.cancel("new_chat")
+
+        canceller = threading.Thread(target=cancel_when_waiting)
+        canceller.start()
+        received = []
+        with pytest.raises(GenerationCancelledError):
+            async with asyncio.timeout(5):
+                async for chunk in cancellable_stream(stream(), token, "chat"):
+                    received.append(chunk)
+        canceller.join()
+
+        assert received == ["a", "b"]
+        assert stream.closed
+        assert metrics.get_counter("llm_generations_cancelled_total", operation="chat")
+        # Average completed length (10) minus the 2 chunks already generated
+        assert metrics.get_counter("llm_tokens_saved_total", operation="chat") == 8
+
+    @pytest.mark.asyncio
+    async def test_consumer_closing_early_counts_as_cancelled(self):
+        """Test that stopping iteration early closes the stream and is counted."""
+        stream = FakeStream(["a", "b", "c"])
+        relay = cancellable_stream(stream(), CancellationToken(), "summary")
+
+        assert await anext(relay) == "a"
+        await relay.aclose()
+
+        assert stream.closed
+        assert (
+            metrics.get_counter("llm_generations_cancelled_total", operation="summary")
+            == 1
+        )
+
+    @pytest.mark.asyncio
+    async def test_errors_are_not_counted_as_cancellations(self):
+        """Test that LLM errors propagate without being counted as cancellations."""
+
+        async def failing():
+            yield "a"
+            raise RuntimeError("LLM Error")
+
+        with pytest.raises(RuntimeError, match="LLM Error"):
+            async for _ in cancellable_stream(failing(), CancellationToken(), "chat"):
+                pass
+        assert (
+            metrics.get_counter("llm_generations_cancelled_total", operation="chat")
+            == 0
+        )
+
+
+class TestCancellableCall:
+    @pytest.mark.asyncio
+    async def test_cancel_interrupts_batch_request(self):
+        """Test that a pending batch request is aborted on cancel."""
+        token = CancellationToken()
+
+        async def slow_batch():
+            await asyncio.sleep(60)
+            return "never"
+
+        asyncio.get_running_loop().call_later(0.05, token.cancel, "reset")
+        with pytest.raises(GenerationCancelledError, match="reset"):
+            await cancellable_call(slow_batch(), token, "chat")
+
+    @pytest.mark.asyncio
+    async def test_already_cancelled_token(self):
+        """Test that nothing is sent when the token is already cancelled."""
+        token = CancellationToken()
+        token.cancel()
+
+        async def batch():
+            raise AssertionError("should not run")
+
+        with pytest.raises(GenerationCancelledError):
+            await cancellable_call(batch(), token, "chat")
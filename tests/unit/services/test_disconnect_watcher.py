@@ -0,0 +1,133 @@
+import threading
+
+import pytest
+
+from src.services.disconnect_watcher import DisconnectWatcher
+from src.services.metrics import metrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def connected() -> dict[str, bool]:
+    return {}
+
+
+@pytest.fixture
+def watcher(clock, connected) -> DisconnectWatcher:
+    # スレッドは使わず、poll() を直接呼んで検証する
+    watcher = DisconnectWatcher(
+        is_connected=lambda client_id: connected.get(client_id, False),
+        interval=3600,
+        grace_seconds=5,
+        clock=clock,
+    )
+    return watcher
+
+
+class TestDisconnectWatcher:
+    def test_cancels_after_grace_period(self, watcher, clock, connected):
+        """Test that a disconnected client is cancelled once the grace period ends."""
+        calls = []
+        connected["tab"] = True
+        before = metrics.get_counter("disconnect_cancellations_total")
+
+        with watcher.watch("tab", lambda: calls.append("cancel")):
+            watcher.poll()
+            connected["tab"] = False
+            watcher.poll()
+            clock.now = 4
+            watcher.poll()
+            assert calls == []
+
+            clock.now = 5
+            watcher.poll()
+            watcher.poll()
+
+        assert calls == ["cancel"]
+        assert metrics.get_counter("disconnect_cancellations_total") == before + 1
+
+    def test_reconnect_within_grace_period(self, watcher, clock, connected):
+        """Test that a short network drop does not cancel the generation."""
+        calls = []
+        connected["tab"] = True
+
+        with watcher.watch("tab", lambda: calls.append("cancel")):
+            watcher.poll()
+            connected["tab"] = False
+            watcher.poll()
+            clock.now = 3
+            connected["tab"] = True
+            watcher.poll()
+            connected["tab"] = False
+            clock.now = 6
+            watcher.poll()
+
+        assert calls == []
+
+    def test_never_connected_client_is_ignored(self, watcher, clock):
+        """Test that a client unknown to the runtime (e.g. AppTest) is not cancelled."""
+        calls = []
+
+        with watcher.watch("apptest", lambda: calls.append("cancel")):
+            watcher.poll()
+            clock.now = 60
+            watcher.poll()
+
+        assert calls == []
+
+    def test_finished_generation_is_not_cancelled(self, watcher, clock, connected):
+        """Test that a client disconnecting after the block exits is left alone."""
+        calls = []
+        connected["tab"] = True
+
+        with watcher.watch("tab", lambda: calls.append("cancel")):
+            watcher.poll()
+
+        connected["tab"] = False
+        watcher.poll()
+        clock.now = 60
+        watcher.poll()
+
+        assert calls == []
+
+    def test_without_connectivity_check(self, clock):
+        """Test that watch() is a no-op until the watcher is configured."""
+        watcher = DisconnectWatcher(clock=clock)
+
+        with watcher.watch("tab", lambda: None):
+            assert watcher._thread is None
+
+    def test_thread_cancels_disconnected_client(self):
+        """Test that the background thread polls on its own and then stops."""
+        seen_connected = threading.Event()
+        cancelled = threading.Event()
+
+        def is_connected(client_id: str) -> bool:
+            if not seen_connected.is_set():
+                seen_connected.set()
+                return True
+            return False
+
+        watcher = DisconnectWatcher(
+            is_connected=is_connected, interval=0.01, grace_seconds=0
+        )
+
+        with watcher.watch("tab", cancelled.set):
+            thread = watcher._thread
+            assert cancelled.wait(timeout=2)
+
+        thread.join(timeout=2)
+        assert not thread.is_alive()
+        assert watcher._thread is None
@@ -0,0 +1,236 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.services.ingestion_orchestrator import IngestionOrchestrator, StageState
+
+
+class FakeVectorStore:
+    """A vector store whose embedding blocks until released."""
+
+    def __init__(self, error=None):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.texts = []
+        self.last_error = None
+        self._error = error
+
+    def compute_index(self, text):
+        self.started.set()
+        self.release.wait(timeout=5)
+        self.last_error = self._error
+        return None if self._error else ([text], None)
+
+    def set_index(self, texts, embeddings):
+        self.texts = texts
+
+
+@pytest.fixture
+def orchestrator():
+    """Fixture for an IngestionOrchestrator instance."""
+    return IngestionOrchestrator()
+
+
+class TestIngestionOrchestrator:
+    def test_initial_status(self, orchestrator):
+        """Test that every stage starts as pending."""
+        for stage in IngestionOrchestrator.STAGES:
+            assert orchestrator.get_status(stage).state == StageState.PENDING
+
+    def test_run_scrape_success(self, orchestrator):
+        """Test that a successful scrape is recorded as done."""
+        scraping_model = MagicMock()
+        scraping_model.scrape.return_value = "content"
+
+        assert orchestrator.run_scrape(scraping_model, "http://example.com") == (
+            "content"
+        )
+        status = orchestrator.get_status("scrape")
+        assert status.state == StageState.DONE
+        assert status.duration is not None
+
+    def test_run_scrape_failure(self, orchestrator):
+        """Test that a failed scrape is recorded and re-raised."""
+        scraping_model = MagicMock()
+        scraping_model.scrape.side_effect = ValueError("boom")
+
+        with pytest.raises(ValueError, match="boom"):
+            orchestrator.run_scrape(scraping_model, "http://example.com")
+        status = orchestrator.get_status("scrape")
+        assert status.state == StageState.FAILED
+        assert status.error == "boom"
+
+    def test_embedding_runs_in_background(self, orchestrator):
+        """Test that embedding does not block the caller and can be awaited."""
+        vector_store = FakeVectorStore()
+
+        orchestrator.start_embedding(vector_store, "content")
+
+        assert orchestrator.get_status("embed").state == StageState.RUNNING
+        assert orchestrator.wait_for_embeddings(timeout=0.05) is False
+
+        vector_store.release.set()
+        assert orchestrator.wait_for_embeddings(timeout=5) is True
+        assert orchestrator.get_status("embed").state == StageState.DONE
+        assert vector_store.texts == ["content"]
+
+    def test_embedding_failure(self, orchestrator):
+        """Test that an embedding error marks the stage as failed."""
+        vector_store = FakeVectorStore(error="Error occurred during vectorization")
+        vector_store.release.set()
+
+        orchestrator.start_embedding(vector_store, "content")
+        orchestrator.wait_for_embeddings(timeout=5)
+
+        assert orchestrator.get_status("embed").state == StageState.FAILED
+
+    def test_on_embedded_called_after_publish(self):
+        """Test that the callback runs once the new index is published."""
+        published = []
+        vector_store = FakeVectorStore()
+        vector_store.release.set()
+        orchestrator = IngestionOrchestrator(
+            on_embedded=lambda: published.append(list(vector_store.texts))
+        )
+
+        orchestrator.start_embedding(vector_store, "content")
+        orchestrator.wait_for_embeddings(timeout=5)
+
+        assert published == [["content"]]
+
+    def test_wait_without_embedding(self, orchestrator):
+        """Test that waiting returns immediately when nothing was started."""
+        assert orchestrator.wait_for_embeddings(timeout=0) is True
+
+    def test_first_output_is_recorded_once(self, orchestrator):
+        """Test that only the first output timestamp of a stage is kept."""
+        orchestrator.mark_running("summarize")
+        orchestrator.mark_first_output("summarize")
+        first = orchestrator.get_status("summarize").first_output_at
+        orchestrator.mark_first_output("summarize")
+        assert orchestrator.get_status("summarize").first_output_at == first
+
+    def test_reset_ignores_stale_worker(self, orchestrator):
+        """Test that a worker finishing after reset does not update the new state."""
+        vector_store = FakeVectorStore()
+        future = orchestrator.start_embedding(vector_store, "content")
+        assert vector_store.started.wait(timeout=5)
+
+        orchestrator.reset()
+        vector_store.release.set()
+        future.result(timeout=5)
+
+        assert orchestrator.get_status("embed").state == StageState.PENDING
+
+    def test_reset_discards_stale_index(self, orchestrator):
+        """Test that a slow embedding overlapping a reset never publishes its index."""
+        stale_store = FakeVectorStore()
+        stale = orchestrator.start_embedding(stale_store, "old page")
+        assert stale_store.started.wait(timeout=5)
+
+        orchestrator.reset()
+        fresh_store = FakeVectorStore()
+        fresh_store.release.set()
+        orchestrator.start_embedding(fresh_store, "new page")
+        stale_store.release.set()
+        stale.result(timeout=5)
+        orchestrator.wait_for_embeddings(timeout=5)
+
+        assert stale_store.texts == []
+        assert fresh_store.texts == ["new page"]
+        assert orchestrator.get_status("embed").state == StageState.DONE
+
+
+class FakeScrapingModel:
+    """A scraping model whose download blocks until released."""
+
+    def __init__(self, content="content", error=None):
+        self.content = None
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._content = content
+        self._error = error
+
+    def fetch(self, url, timeout=None):
+        self.started.set()
+        self.release.wait(timeout=5)
+        if self._error:
+            raise ValueError(self._error)
+        return self._content
+
+
+def wait_for_job(orchestrator, job_id, timeout=5):
+    job = orchestrator.get_job(job_id)
+    job.future.result(timeout=timeout)
+    return job
+
+
+class TestIngestionJobs:
+    def test_job_runs_in_background(self, orchestrator):
+        """Test that the scrape job does not block and then starts embedding."""
+        scraping_model = FakeScrapingModel()
+        vector_store = FakeVectorStore()
+        vector_store.release.set()
+
+        job_id = orchestrator.start_ingestion(
+            scraping_model, vector_store, "http://example.com"
+        )
+
+        assert scraping_model.started.wait(timeout=5)
+        assert orchestrator.get_job(job_id).state == StageState.RUNNING
+        scraping_model.release.set()
+        job = wait_for_job(orchestrator, job_id)
+
+        assert job.state == StageState.DONE
+        assert scraping_model.content == "content"
+        assert orchestrator.get_status("scrape").state == StageState.DONE
+        assert orchestrator.wait_for_embeddings(timeout=5) is True
+        assert vector_store.texts == ["content"]
+
+    def test_job_failure(self, orchestrator):
+        """Test that a failed download is reported on the job."""
+        scraping_model = FakeScrapingModel(error="boom")
+        scraping_model.release.set()
+
+        job = wait_for_job(
+            orchestrator,
+            orchestrator.start_ingestion(scraping_model, None, "http://example.com"),
+        )
+
+        assert job.state == StageState.FAILED
+        assert job.error == "boom"
+        assert orchestrator.get_status("scrape").state == StageState.FAILED
+
+    def test_cancel_discards_result(self, orchestrator):
+        """Test that a cancelled job returns at once and its result is dropped."""
+        scraping_model = FakeScrapingModel()
+        vector_store = FakeVectorStore()
+        job_id = orchestrator.start_ingestion(
+            scraping_model, vector_store, "http://example.com"
+        )
+        assert scraping_model.started.wait(timeout=5)
+
+        assert orchestrator.cancel_job(job_id) is True
+        assert orchestrator.get_job(job_id).state == StageState.CANCELLED
+        scraping_model.release.set()
+        job = wait_for_job(orchestrator, job_id)
+
+        assert job.state == StageState.CANCELLED
+        assert scraping_model.content is None
+        assert not vector_store.started.is_set()
+        assert orchestrator.cancel_job(job_id) is False
+
+    def test_new_job_replaces_running_one(self, orchestrator):
+        """Test that starting a job cancels the previous one."""
+        first_model = FakeScrapingModel()
+        first_id = orchestrator.start_ingestion(first_model, None, "http://a.example")
+        assert first_model.started.wait(timeout=5)
+
+        second_id = orchestrator.start_ingestion(
+            FakeScrapingModel(), None, "http://b.example"
+        )
+        first_model.release.set()
+
+        assert orchestrator.get_job(first_id) is None
+        assert orchestrator.get_job(second_id).url == "http://b.example"
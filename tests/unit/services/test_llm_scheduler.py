@@ -0,0 +1,212 @@
+import asyncio
+
+import pytest
+from sdk.olm_api_client import MockOllamaApiClient
+
+from src.services.llm_scheduler import (
+    LLMScheduler,
+    Priority,
+    RequestContext,
+    ScheduledClient,
+    SchedulerQueueFullError,
+    SessionClient,
+    current_request_context,
+    scheduling_priority,
+)
+
+
+class ConcurrencyProbe:
+    """Wraps a client and records the peak number of concurrent generations."""
+
+    def __init__(self, client):
+        self._client = client
+        self.active = 0
+        self.peak = 0
+
+    async def gen_stream(self, prompt, model=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            async for chunk in self._client.gen_stream(prompt, model=model):
+                yield chunk
+        finally:
+            self.active -= 1
+
+    async def gen_batch(self, prompt, model=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await self._client.gen_batch(prompt, model=model)
+        finally:
+            self.active -= 1
+
+
+async def run_in_order(scheduler, model, requests):
+    """
+    Occupy the only slot, queue the given (session_id, priority) requests and
+    return the order in which they are admitted.
+    """
+    await scheduler.acquire(model, RequestContext("holder"))
+    order = []
+
+    async def request(session_id, priority):
+        await scheduler.acquire(model, RequestContext(session_id, priority))
+        order.append(session_id)
+        scheduler.release(model)
+
+    tasks = []
+    for session_id, priority in requests:
+        tasks.append(asyncio.create_task(request(session_id, priority)))
+        await asyncio.sleep(0)
+    scheduler.release(model)
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestLLMScheduler:
+    @pytest.mark.asyncio
+    async def test_caps_concurrent_generations(self):
+        """Test that no more than max_concurrency generations run per model."""
+        probe = ConcurrencyProbe(MockOllamaApiClient(token_delay=0.01))
+        client = ScheduledClient(probe, scheduler=LLMScheduler(max_concurrency=2))
+
+        results = await asyncio.gather(
+            *(client.gen_batch(f"prompt {i}", model="m") for i in range(6))
+        )
+
+        assert len(results) == 6
+        assert probe.peak == 2
+
+    @pytest.mark.asyncio
+    async def test_limits_are_per_model(self):
+        """Test that each model has its own concurrency limit."""
+        probe = ConcurrencyProbe(MockOllamaApiClient(token_delay=0.01))
+        scheduler = LLMScheduler(max_concurrency=1)
+        client = ScheduledClient(probe, scheduler=scheduler)
+
+        await asyncio.gather(
+            client.gen_batch("a", model="summary-model"),
+            client.gen_batch("b", model="question-model"),
+        )
+
+        assert probe.peak == 2
+
+    @pytest.mark.asyncio
+    async def test_interactive_requests_run_before_summaries(self):
+        """Test that Q&A requests overtake queued summaries."""
+        order = await run_in_order(
+            LLMScheduler(max_concurrency=1),
+            "m",
+            [
+                ("summary", Priority.SUMMARY),
+                ("background", Priority.BACKGROUND),
+                ("chat", Priority.INTERACTIVE),
+            ],
+        )
+        assert order == ["chat", "summary", "background"]
+
+    @pytest.mark.asyncio
+    async def test_round_robin_across_sessions(self):
+        """Test that a busy session cannot starve the others."""
+        order = await run_in_order(
+            LLMScheduler(max_concurrency=1),
+            "m",
+            [
+                ("A", Priority.SUMMARY),
+                ("A", Priority.SUMMARY),
+                ("A", Priority.SUMMARY),
+                ("B", Priority.SUMMARY),
+            ],
+        )
+        assert order == ["A", "B", "A", "A"]
+
+    @pytest.mark.asyncio
+    async def test_queue_position(self):
+        """Test the number of requests ahead reported for a session."""
+        scheduler = LLMScheduler(max_concurrency=1)
+        await scheduler.acquire("m", RequestContext("holder"))
+        tasks = [
+            asyncio.create_task(scheduler.acquire("m", RequestContext(s, p)))
+            for s, p in [
+                ("A", Priority.SUMMARY),
+                ("A", Priority.SUMMARY),
+                ("B", Priority.SUMMARY),
+                ("C", Priority.INTERACTIVE),
+            ]
+        ]
+        await asyncio.sleep(0)
+
+        assert scheduler.queue_depth("m") == 4
+        assert scheduler.position("C") == 0
+        assert scheduler.position("A") == 1
+        assert scheduler.position("B") == 2
+        assert scheduler.position("holder") is None
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert scheduler.queue_depth() == 0
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_is_full(self):
+        """Test backpressure once max_queue_size requests are waiting."""
+        scheduler = LLMScheduler(max_concurrency=1, max_queue_size=1)
+        await scheduler.acquire("m")
+        waiting = asyncio.create_task(scheduler.acquire("m"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(SchedulerQueueFullError):
+            await scheduler.acquire("m")
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        """Test that a request cancelled while queued frees its place."""
+        scheduler = LLMScheduler(max_concurrency=1)
+        await scheduler.acquire("m")
+        waiting = asyncio.create_task(scheduler.acquire("m"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        scheduler.release("m")
+
+        await asyncio.wait_for(scheduler.acquire("m"), timeout=1)
+
+    @pytest.mark.asyncio
+    async def test_stream_holds_slot_until_closed(self):
+        """Test that a stream closed early releases its slot."""
+        scheduler = LLMScheduler(max_concurrency=1)
+        client = ScheduledClient(MockOllamaApiClient(token_delay=0.01), scheduler)
+
+        stream = client.gen_stream("prompt", model="m")
+        await anext(stream)
+        assert scheduler.position("anonymous") is None
+        await stream.aclose()
+
+        assert await asyncio.wait_for(client.gen_batch("next", model="m"), timeout=1)
+
+
+class TestSessionClient:
+    @pytest.mark.asyncio
+    async def test_tags_requests_with_session_and_priority(self):
+        """Test that the session view sets the request context seen downstream."""
+        seen = []
+
+        class RecordingClient:
+            async def gen_batch(self, prompt, model=None):
+                seen.append(current_request_context())
+                return "ok"
+
+        client = SessionClient(
+            RecordingClient(), session_id="s1", priority=Priority.SUMMARY
+        )
+        await client.gen_batch("prompt")
+        with scheduling_priority(Priority.BACKGROUND):
+            await client.gen_batch("prompt")
+
+        assert seen == [
+            RequestContext("s1", Priority.SUMMARY),
+            RequestContext("s1", Priority.BACKGROUND),
+        ]
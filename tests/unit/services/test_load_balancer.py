@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from src.services.load_balancer import LoadBalancedClient
+from src.services.metrics import metrics
+
+ENDPOINT_A = "http://gpu-a:11434"
+ENDPOINT_B = "http://gpu-b:11434"
+
+
+class FakeEndpointClient:
+    """Client of one fake endpoint; behaviour is configured per URL."""
+
+    behaviours: dict[str, dict] = {}
+
+    def __init__(self, api_url: str):
+        self.api_url = api_url
+        self.calls = 0
+        self.closed = False
+
+    @property
+    def behaviour(self) -> dict:
+        return self.behaviours.get(self.api_url, {})
+
+    async def gen_stream(self, prompt, model=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.behaviour.get("delay", 0))
+            if self.behaviour.get("fail"):
+                raise ConnectionError(f"{self.api_url} is down")
+            for chunk in ("from ", self.api_url):
+                yield chunk
+        finally:
+            self.closed = True
+
+    async def gen_batch(self, prompt, model=None):
+        self.calls += 1
+        await asyncio.sleep(self.behaviour.get("delay", 0))
+        if self.behaviour.get("fail"):
+            raise ConnectionError(f"{self.api_url} is down")
+        return f"from {self.api_url}"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    """Start every test with fresh endpoint statistics and metrics."""
+    LoadBalancedClient._stats.clear()
+    FakeEndpointClient.behaviours = {}
+    metrics.reset()
+    yield
+    LoadBalancedClient._stats.clear()
+
+
+def make_client(**kwargs) -> LoadBalancedClient:
+    return LoadBalancedClient(
+        [ENDPOINT_A, ENDPOINT_B], client_factory=FakeEndpointClient, **kwargs
+    )
+
+
+async def collect(stream) -> str:
+    return "".join([chunk async for chunk in stream])
+
+
+class TestLoadBalancedClient:
+    @pytest.mark.asyncio
+    async def test_balances_by_outstanding_requests(self):
+        """Test that concurrent requests go to the least busy endpoint."""
+        FakeEndpointClient.behaviours = {
+            ENDPOINT_A: {"delay": 0.05},
+            ENDPOINT_B: {"delay": 0.05},
+        }
+        client = make_client()
+
+        results = await asyncio.gather(
+            collect(client.gen_stream("p1")), collect(client.gen_stream("p2"))
+        )
+
+        assert sorted(results) == [f"from {ENDPOINT_A}", f"from {ENDPOINT_B}"]
+        assert all(s["outstanding"] == 0 for s in client.endpoint_status())
+
+    @pytest.mark.asyncio
+    async def test_fails_over_before_first_chunk(self):
+        """Test that a failing endpoint is retried on another one."""
+        FakeEndpointClient.behaviours = {ENDPOINT_A: {"fail": True}}
+        client = make_client()
+
+        assert await collect(client.gen_stream("p")) == f"from {ENDPOINT_B}"
+        assert await client.gen_batch("p") == f"from {ENDPOINT_B}"
+        assert metrics.get_counter("llm_endpoint_failures_total", endpoint=ENDPOINT_A)
+
+    @pytest.mark.asyncio
+    async def test_ejects_unhealthy_endpoint(self):
+        """Test that an endpoint failing repeatedly stops receiving traffic."""
+        FakeEndpointClient.behaviours = {ENDPOINT_A: {"fail": True}}
+        clock = FakeClock()
+        client = make_client(eject_after_failures=2, eject_seconds=30, clock=clock)
+
+        for _ in range(2):
+            await client.gen_batch("p")
+        calls_before = client._clients[ENDPOINT_A].calls
+        for _ in range(3):
+            await client.gen_batch("p")
+
+        assert client._clients[ENDPOINT_A].calls == calls_before
+        status = {s["url"]: s for s in client.endpoint_status()}
+        assert not status[ENDPOINT_A]["healthy"]
+
+        # After the ejection period the endpoint is tried again
+        FakeEndpointClient.behaviours = {}
+        clock.now += 31
+        LoadBalancedClient._stats[ENDPOINT_B].outstanding = 5
+        assert await client.gen_batch("p") == f"from {ENDPOINT_A}"
+        assert client.endpoint_status()[0]["healthy"]
+
+    @pytest.mark.asyncio
+    async def test_hedges_slow_first_chunk(self):
+        """Test that a duplicate request wins when the first endpoint is slow."""
+        FakeEndpointClient.behaviours = {ENDPOINT_A: {"delay": 5}}
+        client = make_client(hedge_percentile=95, hedge_min_samples=1)
+        client._record_success(ENDPOINT_B, "stream", 0.02)
+        # Make the slow endpoint the first choice
+        LoadBalancedClient._stats[ENDPOINT_B].outstanding = 1
+
+        result = await asyncio.wait_for(collect(client.gen_stream("p")), timeout=2)
+
+        assert result == f"from {ENDPOINT_B}"
+        assert client._clients[ENDPOINT_A].closed
+        assert metrics.get_counter("llm_hedged_requests_total", kind="stream") == 1
+        assert metrics.get_counter("llm_hedge_wins_total", kind="stream") == 1
+
+    def test_latency_ewma(self):
+        """Test the exponentially weighted latency of an endpoint."""
+        client = make_client(alpha=0.5)
+        client._record_success(ENDPOINT_A, "batch", 1.0)
+        client._record_success(ENDPOINT_A, "batch", 3.0)
+
+        assert client.endpoint_status()[0]["latency_ewma"] == pytest.approx(2.0)
+
+    def test_requires_endpoints(self):
+        """Test that an empty endpoint list is rejected."""
+        with pytest.raises(ValueError):
+            LoadBalancedClient([], client_factory=FakeEndpointClient)
@@ -0,0 +1,75 @@
+import pytest
+
+from src.services.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    """Fixture for an empty MetricsRegistry."""
+    return MetricsRegistry()
+
+
+class TestMetricsRegistry:
+    def test_counter_with_labels(self, registry):
+        """Test that counters are tracked per label set."""
+        registry.increment("requests_total", stage="scrape")
+        registry.increment("requests_total", 2, stage="scrape")
+        registry.increment("requests_total", stage="embed")
+
+        assert registry.get_counter("requests_total", stage="scrape") == 3
+        assert registry.get_counter("requests_total", stage="embed") == 1
+        assert registry.get_counter("requests_total", stage="other") == 0
+
+    def test_gauge(self, registry):
+        """Test that gauges keep the last value and can be removed."""
+        registry.set_gauge("queue_depth", 3)
+        registry.set_gauge("queue_depth", 1)
+        assert registry.get_gauge("queue_depth") == 1
+
+        registry.remove_gauge("queue_depth")
+        assert registry.get_gauge("queue_depth") is None
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        """Test that histogram buckets count every value at or below their bound."""
+        for value in (0.5, 1.5, 3.0):
+            registry.observe("latency_seconds", value, buckets=(1, 2, 5))
+
+        histogram = registry.get_histogram("latency_seconds")
+        assert histogram.count == 3
+        assert histogram.sum == pytest.approx(5.0)
+        assert histogram.bucket_counts == [1, 2, 3]
+
+    def test_reset(self, registry):
+        """Test that reset drops all metrics."""
+        registry.increment("requests_total")
+        registry.reset()
+        assert registry.get_counter("requests_total") == 0
+
+    def test_render_prometheus(self, registry):
+        """Test the Prometheus text exposition of every metric type."""
+        registry.increment("requests_total", stage="scrape")
+        registry.set_gauge("queue_depth", 2.5)
+        registry.observe("latency_seconds", 0.5, buckets=(1, 2), span="search")
+        registry.observe("latency_seconds", 1.5, buckets=(1, 2), span="search")
+
+        lines = registry.render_prometheus().splitlines()
+
+        assert "# TYPE requests_total counter" in lines
+        assert 'requests_total{stage="scrape"} 1' in lines
+        assert "# TYPE queue_depth gauge" in lines
+        assert "queue_depth 2.5" in lines
+        assert "# TYPE latency_seconds histogram" in lines
+        assert 'latency_seconds_bucket{span="search",le="1"} 1' in lines
+        assert 'latency_seconds_bucket{span="search",le="2"} 2' in lines
+        assert 'latency_seconds_bucket{span="search",le="+Inf"} 2' in lines
+        assert 'latency_seconds_sum{span="search"} 2' in lines
+        assert 'latency_seconds_count{span="search"} 2' in lines
+
+    def test_render_prometheus_escapes_label_values(self, registry):
+        """Test that quotes, backslashes and newlines in label values are escaped."""
+        registry.increment("errors_total", reason='bad "url"\n\\')
+
+        assert (
+            'errors_total{reason="bad \\"url\\"\\n\\\\"} 1'
+            in registry.render_prometheus()
+        )
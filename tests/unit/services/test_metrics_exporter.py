@@ -0,0 +1,62 @@
+import urllib.request
+
+import pytest
+
+from src.services.metrics import MetricsRegistry
+from src.services.metrics_exporter import MetricsExporter
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    registry.increment("requests_total", stage="scrape")
+    return registry
+
+
+@pytest.fixture
+def exporter(registry):
+    exporter = MetricsExporter(registry)
+    yield exporter
+    exporter.stop()
+
+
+class TestMetricsExporter:
+    def test_writes_file(self, exporter, tmp_path):
+        """Test that the exposition is written to the configured file."""
+        path = tmp_path / "metrics" / "gist.prom"
+
+        exporter.write_file(str(path))
+
+        assert 'requests_total{stage="scrape"} 1' in path.read_text()
+
+    def test_serves_metrics_endpoint(self, exporter):
+        """Test that /metrics returns the exposition in the Prometheus format."""
+        assert exporter.start(port=0)
+        host, port = exporter.server_address
+
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+            body = response.read().decode("utf-8")
+            content_type = response.headers["Content-Type"]
+
+        assert 'requests_total{stage="scrape"} 1' in body
+        assert content_type.startswith("text/plain; version=0.0.4")
+
+    def test_starts_once(self, exporter, tmp_path):
+        """Test that only the first start() call exports."""
+        assert not exporter.start()
+        assert exporter.start(file_path=str(tmp_path / "a.prom"), interval=60)
+        assert not exporter.start(file_path=str(tmp_path / "b.prom"), interval=60)
+
+    def test_port_in_use(self, exporter, registry):
+        """Test that a busy port raises once and later calls do not retry it."""
+        other = MetricsExporter(registry)
+        try:
+            assert other.start(port=0)
+            _, port = other.server_address
+
+            with pytest.raises(OSError):
+                exporter.start(port=port)
+            assert exporter.server_address is None
+            assert not exporter.start(port=port)
+        finally:
+            other.stop()
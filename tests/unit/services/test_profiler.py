@@ -0,0 +1,90 @@
+import contextlib
+import pstats
+import threading
+import tracemalloc
+
+import pytest
+
+from src.services.profiler import RerunProfiler
+
+
+def busy():
+    return sum(i * i for i in range(1000))
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    return tmp_path / "profiles"
+
+
+class TestRerunProfiler:
+    def test_disabled_returns_null_context(self, profile_dir):
+        """Test that a disabled profiler neither profiles nor writes anything."""
+        profiler = RerunProfiler(sample_every=0, directory=str(profile_dir))
+
+        context = profiler.profile("chat")
+        with context:
+            busy()
+
+        assert isinstance(context, contextlib.nullcontext)
+        assert not profile_dir.exists()
+
+    def test_samples_one_rerun_in_n(self, profile_dir):
+        """Test that only every n-th rerun is profiled, tagged by page."""
+        profiler = RerunProfiler(sample_every=3, directory=str(profile_dir))
+
+        for _ in range(6):
+            with profiler.profile("chat"):
+                busy()
+
+        profiles = sorted(profile_dir.glob("*.prof"))
+        assert len(profiles) == 2
+        assert all(path.stem.endswith("-chat") for path in profiles)
+        stats = pstats.Stats(str(profiles[0]))
+        assert any(func[2] == "busy" for func in stats.stats)
+
+    def test_keeps_newest_runs(self, profile_dir):
+        """Test that the directory is rotated to the newest max_runs reruns."""
+        profiler = RerunProfiler(sample_every=1, directory=str(profile_dir), max_runs=2)
+
+        for page in ("input", "chat", "chat"):
+            with profiler.profile(page):
+                busy()
+
+        assert len(list(profile_dir.glob("*.prof"))) == 2
+
+    def test_tracemalloc_snapshot(self, profile_dir):
+        """Test that a memory snapshot is written next to the profile when enabled."""
+        profiler = RerunProfiler(
+            sample_every=1, directory=str(profile_dir), trace_memory=True
+        )
+
+        with profiler.profile("input"):
+            data = [bytes(1024) for _ in range(100)]
+
+        snapshots = list(profile_dir.glob("*-input.tracemalloc"))
+        assert len(snapshots) == 1
+        assert tracemalloc.Snapshot.load(str(snapshots[0])).statistics("filename")
+        assert not tracemalloc.is_tracing()
+        assert data
+
+    def test_concurrent_rerun_is_not_profiled(self, profile_dir):
+        """Test that a rerun sampled while another one is profiled is skipped."""
+        profiler = RerunProfiler(sample_every=1, directory=str(profile_dir))
+        inside, release = threading.Event(), threading.Event()
+
+        def first_rerun():
+            with profiler.profile("chat"):
+                inside.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=first_rerun)
+        thread.start()
+        inside.wait(5)
+        with profiler.profile("input"):
+            busy()
+        release.set()
+        thread.join()
+
+        profiles = list(profile_dir.glob("*.prof"))
+        assert [path.stem.rsplit("-", 1)[1] for path in profiles] == ["chat"]
@@ -0,0 +1,81 @@
+import pytest
+
+from src.services.render_scheduler import RenderScheduler
+
+
+class FakeClock:
+    """A manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def rendered():
+    return []
+
+
+@pytest.fixture
+def scheduler(clock, rendered):
+    """Fixture for a RenderScheduler recording every rendered state."""
+
+    def render(*state):
+        rendered.append(state)
+        return sum(len(part) for part in state)
+
+    return RenderScheduler(render, flush_interval_ms=100, flush_chars=10, clock=clock)
+
+
+class TestRenderScheduler:
+    def test_first_update_is_flushed_immediately(self, scheduler, rendered):
+        """Test that the first chunk is rendered without waiting."""
+        assert scheduler.update("", "a") is True
+        assert rendered == [("", "a")]
+
+    def test_updates_are_coalesced(self, scheduler, rendered):
+        """Test that small, quick updates are not rendered individually."""
+        scheduler.update("", "a")
+        assert scheduler.update("", "ab") is False
+        assert scheduler.update("", "abc") is False
+        assert rendered == [("", "a")]
+        assert scheduler.chunk_count == 3
+
+    def test_flush_after_interval(self, scheduler, rendered, clock):
+        """Test that the latest state is flushed once the interval has elapsed."""
+        scheduler.update("", "a")
+        scheduler.update("", "ab")
+        clock.now = 0.1
+        assert scheduler.update("", "abc") is True
+        assert rendered[-1] == ("", "abc")
+
+    def test_flush_after_enough_characters(self, scheduler, rendered):
+        """Test that enough new characters force a flush before the interval."""
+        scheduler.update("", "a")
+        assert scheduler.update("thinking", "abc") is True
+        assert rendered[-1] == ("thinking", "abc")
+
+    def test_close_flushes_pending_state(self, scheduler, rendered):
+        """Test that close renders the last coalesced state."""
+        scheduler.update("", "a")
+        scheduler.update("", "ab")
+        scheduler.close()
+        assert rendered[-1] == ("", "ab")
+        # Nothing is pending anymore, so a second close is a no-op
+        scheduler.close()
+        assert len(rendered) == 2
+
+    def test_instrumentation(self, scheduler):
+        """Test that flushes and bytes sent are counted."""
+        scheduler.update("", "a")
+        scheduler.update("", "ab")
+        scheduler.close()
+        assert scheduler.flush_count == 2
+        assert scheduler.bytes_sent == 3
@@ -0,0 +1,252 @@
+import numpy as np
+import pytest
+
+from src.services.metrics import metrics
+from src.services.session_memory import SessionMemoryAccountant, SpillStore
+
+
+class FakeScrapingModel:
+    def __init__(self, content: str | None = None):
+        self.content = content
+
+
+class FakeVectorStore:
+    def __init__(self, texts: list[str], embeddings: np.ndarray | None):
+        self.texts = texts
+        self.embeddings = embeddings
+        self.is_creating = False
+
+    def set_index(self, texts: list[str], embeddings: np.ndarray | None):
+        self.texts, self.embeddings = texts, embeddings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_session(size: int = 10_000):
+    scraping_model = FakeScrapingModel("x" * size)
+    vector_store = FakeVectorStore(
+        ["chunk one", "chunk two"], np.ones((2, 4), dtype=np.float32)
+    )
+    return scraping_model, vector_store
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def accountant(tmp_path, clock) -> SessionMemoryAccountant:
+    return SessionMemoryAccountant(
+        budget_bytes=15_000, idle_seconds=60, spill_dir=str(tmp_path), clock=clock
+    )
+
+
+class TestSpillStore:
+    def test_round_trip_memory_maps_embeddings(self, tmp_path):
+        """Test that saved artifacts are restored, with the embeddings memory-mapped."""
+        store = SpillStore(str(tmp_path))
+        embeddings = np.arange(6, dtype=np.float32).reshape(2, 3)
+
+        store.save("s1", "ページ本文", ["a", "b"], embeddings)
+        content, texts, loaded = store.load("s1")
+
+        assert content == "ページ本文"
+        assert texts == ["a", "b"]
+        assert isinstance(loaded, np.memmap)
+        np.testing.assert_array_equal(loaded, embeddings)
+
+    def test_resave_keeps_existing_mapping_valid(self, tmp_path):
+        """Test that saving again does not truncate a file that is still mapped."""
+        store = SpillStore(str(tmp_path))
+        store.save("s1", "a", ["a"], np.ones((2, 2), dtype=np.float32))
+        _, _, mapped = store.load("s1")
+
+        store.save("s1", "a", ["a"], mapped)
+
+        np.testing.assert_array_equal(mapped, np.ones((2, 2)))
+
+
+class TestSessionMemoryAccountant:
+    def test_measures_session_footprint(self, accountant):
+        """Test that page content, chunks and embeddings are counted."""
+        scraping_model, vector_store = make_session(10_000)
+
+        accountant.register("s1", scraping_model, vector_store)
+
+        size = accountant.session_bytes("s1")
+        assert size > 10_000 + vector_store.embeddings.nbytes
+        assert metrics.get_gauge("session_memory_bytes", session="s1") == size
+
+    def test_within_budget_nothing_is_spilled(self, accountant, clock):
+        """Test that no session is spilled while the total is under budget."""
+        scraping_model, vector_store = make_session(1_000)
+        accountant.register("s1", scraping_model, vector_store)
+        clock.now = 1_000
+
+        assert accountant.enforce_budget() == []
+        assert scraping_model.content is not None
+
+    def test_spills_only_idle_sessions_over_budget(self, accountant, clock):
+        """Test that the idle session is spilled and the active one is kept."""
+        idle = make_session()
+        accountant.register("idle", *idle)
+        clock.now = 100
+        active = make_session()
+        accountant.register("active", *active)
+
+        assert accountant.enforce_budget() == ["idle"]
+        assert accountant.is_spilled("idle")
+        assert idle[0].content is None
+        assert idle[1].texts == [] and idle[1].embeddings is None
+        assert active[0].content is not None
+
+    def test_recent_sessions_are_not_spilled(self, accountant, clock):
+        """Test that sessions accessed within idle_seconds stay in memory."""
+        first, second = make_session(), make_session()
+        accountant.register("s1", *first)
+        accountant.register("s2", *second)
+        clock.now = 30
+
+        assert accountant.enforce_budget() == []
+
+    def test_register_rehydrates_spilled_session(self, accountant, clock):
+        """Test that the next access restores the spilled artifacts."""
+        scraping_model, vector_store = make_session()
+        original_content = scraping_model.content
+        original_embeddings = vector_store.embeddings.copy()
+        accountant.register("s1", scraping_model, vector_store)
+        clock.now = 100
+        assert accountant.spill("s1")
+
+        accountant.register("s1", scraping_model, vector_store)
+
+        assert not accountant.is_spilled("s1")
+        assert scraping_model.content == original_content
+        assert vector_store.texts == ["chunk one", "chunk two"]
+        assert isinstance(vector_store.embeddings, np.memmap)
+        np.testing.assert_array_equal(vector_store.embeddings, original_embeddings)
+
+    def test_memory_mapped_embeddings_are_not_counted(self, accountant, clock):
+        """Test that rehydrated, memory-mapped embeddings are not resident bytes."""
+        scraping_model, vector_store = make_session()
+        accountant.register("s1", scraping_model, vector_store)
+        before = accountant.session_bytes("s1")
+        accountant.spill("s1")
+
+        accountant.register("s1", scraping_model, vector_store)
+
+        assert accountant.session_bytes("s1") == before - 2 * 4 * 4
+
+    def test_skips_session_while_embedding(self, accountant):
+        """Test that a session with an embedding in progress is not spilled."""
+        scraping_model, vector_store = make_session()
+        vector_store.is_creating = True
+        accountant.register("s1", scraping_model, vector_store)
+
+        assert not accountant.spill("s1")
+        assert scraping_model.content is not None
+
+    def test_new_models_discard_spilled_data(self, accountant, tmp_path):
+        """Test that a reset session does not get the previous page back."""
+        previous = make_session()
+        accountant.register("s1", *previous)
+        assert accountant.spill("s1")
+
+        fresh_scraping_model = FakeScrapingModel()
+        accountant.register("s1", fresh_scraping_model, FakeVectorStore([], None))
+
+        assert fresh_scraping_model.content is None
+        assert not (tmp_path / "s1").exists()
+
+    def test_forgets_session_when_models_are_collected(self, accountant, tmp_path):
+        """Test that a closed session's record and spilled data are removed."""
+        scraping_model, vector_store = make_session()
+        accountant.register("s1", scraping_model, vector_store)
+        assert accountant.spill("s1")
+
+        del scraping_model, vector_store
+
+        assert accountant.session_bytes("s1") == 0
+        assert not accountant.is_spilled("s1")
+        assert not (tmp_path / "s1").exists()
+
+    def test_fragment_touch_keeps_session_active(self, accountant, clock):
+        """Test that a session only rerunning fragments is not treated as idle."""
+        chatting = make_session()
+        accountant.register("chatting", *chatting)
+        # 質問のたびにチャットのフラグメントだけが再実行される
+        for now in (50, 100, 150):
+            clock.now = now
+            assert accountant.touch("chatting")
+        other = make_session()
+        accountant.register("other", *other)
+
+        assert accountant.enforce_budget() == []
+        assert chatting[0].content is not None
+
+    def test_touch_rehydrates_spilled_session(self, accountant, clock):
+        """Test that a fragment rerun restores a spilled session before using it."""
+        scraping_model, vector_store = make_session()
+        original_content = scraping_model.content
+        accountant.register("s1", scraping_model, vector_store)
+        clock.now = 100
+        assert accountant.spill("s1")
+
+        assert accountant.touch("s1")
+
+        assert not accountant.is_spilled("s1")
+        assert scraping_model.content == original_content
+        assert vector_store.texts == ["chunk one", "chunk two"]
+
+    def test_touch_unknown_session(self, accountant):
+        """Test that touching a session that never registered is a no-op."""
+        assert not accountant.touch("unknown")
+
+    def test_enforce_budget_uses_recorded_sizes(self, accountant, clock):
+        """Test that enforcing the budget does not re-measure every session."""
+        scraping_model, vector_store = make_session(1_000)
+        accountant.register("s1", scraping_model, vector_store)
+        recorded = accountant.session_bytes("s1")
+        # 次に登録されるまでの変化は測らない
+        vector_store.texts = ["x" * 100_000]
+        clock.now = 1_000
+
+        assert accountant.enforce_budget() == []
+        assert metrics.get_gauge("session_memory_total_bytes") == recorded
+
+        accountant.register("s1", scraping_model, vector_store)
+        assert accountant.session_bytes("s1") > 100_000
+
+    def test_touch_counts_growth_of_resident_session(self, accountant, clock):
+        """Test that a session growing in fragment reruns is measured and spilled."""
+        scraping_model, vector_store = make_session(1_000)
+        accountant.register("s1", scraping_model, vector_store)
+        # 回答の追加はチャットのフラグメント内で行われる
+        vector_store.texts = ["x" * 20_000]
+        assert accountant.touch("s1")
+        assert accountant.session_bytes("s1") > 20_000
+
+        clock.now = 1_000
+        assert accountant.enforce_budget() == ["s1"]
+
+    def test_measure_after_background_embedding(self, accountant):
+        """Test that embeddings published by a worker are counted."""
+        scraping_model, vector_store = make_session(1_000)
+        accountant.register("s1", scraping_model, vector_store)
+        before = accountant.session_bytes("s1")
+
+        vector_store.set_index(["chunk"] * 10, np.ones((10, 384), dtype=np.float32))
+        accountant.measure("s1")
+
+        assert accountant.session_bytes("s1") > before
+        assert metrics.get_gauge("session_memory_bytes", session="s1") == (
+            accountant.session_bytes("s1")
+        )
+        accountant.measure("unknown")
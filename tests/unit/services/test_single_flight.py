@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.services.single_flight import SingleFlightClient
+
+
+class FakeClient:
+    """Upstream client whose stream pauses after the first chunk until released."""
+
+    def __init__(self, chunks=("a", "b", "c"), error=None):
+        self.chunks = list(chunks)
+        self.error = error
+        self.stream_calls = 0
+        self.batch_calls = 0
+        self.first_chunk_sent = threading.Event()
+        self.release = threading.Event()
+        self.closed = threading.Event()
+
+    async def gen_stream(self, prompt, model=None):
+        self.stream_calls += 1
+        try:
+            for i, chunk in enumerate(self.chunks):
+                yield chunk
+                if i == 0:
+                    self.first_chunk_sent.set()
+                    while not self.release.is_set():
+                        await asyncio.sleep(0.005)
+            if self.error:
+                raise self.error
+        finally:
+            self.closed.set()
+
+    async def gen_batch(self, prompt, model=None):
+        self.batch_calls += 1
+        while not self.release.is_set():
+            await asyncio.sleep(0.005)
+        return f"answer to {prompt}"
+
+
+@pytest.fixture(autouse=True)
+def clear_flights():
+    """Start every test without in-flight requests."""
+    SingleFlightClient._flights.clear()
+    yield
+    SingleFlightClient._flights.clear()
+
+
+async def collect(stream) -> list[str]:
+    return [chunk async for chunk in stream]
+
+
+class TestSingleFlightClient:
+    @pytest.mark.asyncio
+    async def test_identical_streams_share_one_upstream(self):
+        """Test that concurrent identical prompts are generated once."""
+        upstream = FakeClient()
+        client = SingleFlightClient(upstream)
+
+        first = asyncio.create_task(collect(client.gen_stream("P", model="m")))
+        second = asyncio.create_task(collect(client.gen_stream("P", model="m")))
+        await asyncio.sleep(0.02)
+        upstream.release.set()
+
+        assert await first == ["a", "b", "c"]
+        assert await second == ["a", "b", "c"]
+        assert upstream.stream_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_late_joiner_gets_replay(self):
+        """Test that a subscriber joining mid-stream first receives earlier chunks."""
+        upstream = FakeClient()
+        client = SingleFlightClient(upstream)
+
+        early = client.gen_stream("P", model="m")
+        assert await anext(early) == "a"
+        assert await asyncio.to_thread(upstream.first_chunk_sent.wait, 5)
+
+        late = asyncio.create_task(collect(client.gen_stream("P", model="m")))
+        await asyncio.sleep(0.02)
+        upstream.release.set()
+
+        assert await collect(early) == ["b", "c"]
+        assert await late == ["a", "b", "c"]
+        assert upstream.stream_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_different_prompts_or_models_are_not_shared(self):
+        """Test that the flight key includes the model and the prompt."""
+        upstream = FakeClient()
+        upstream.release.set()
+        client = SingleFlightClient(upstream)
+
+        await asyncio.gather(
+            collect(client.gen_stream("P", model="m")),
+            collect(client.gen_stream("Q", model="m")),
+            collect(client.gen_stream("P", model="other")),
+        )
+
+        assert upstream.stream_calls == 3
+
+    @pytest.mark.asyncio
+    async def test_batch_requests_are_shared(self):
+        """Test that identical batch requests share one upstream call."""
+        upstream = FakeClient()
+        client = SingleFlightClient(upstream)
+
+        pending = asyncio.gather(
+            client.gen_batch("P", model="m"), client.gen_batch("P", model="m")
+        )
+        await asyncio.sleep(0.02)
+        upstream.release.set()
+
+        assert await pending == ["answer to P", "answer to P"]
+        assert upstream.batch_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_upstream_closed_when_everyone_leaves(self):
+        """Test that the upstream stream is cancelled once all subscribers are gone."""
+        upstream = FakeClient()
+        client = SingleFlightClient(upstream)
+
+        stream = client.gen_stream("P", model="m")
+        assert await anext(stream) == "a"
+        await stream.aclose()
+
+        assert await asyncio.to_thread(upstream.closed.wait, 5)
+        assert SingleFlightClient._flights == {}
+
+    @pytest.mark.asyncio
+    async def test_error_reaches_every_subscriber(self):
+        """Test that upstream errors are raised to all subscribers."""
+        upstream = FakeClient(error=RuntimeError("LLM Error"))
+        client = SingleFlightClient(upstream)
+
+        results = asyncio.gather(
+            collect(client.gen_stream("P", model="m")),
+            collect(client.gen_stream("P", model="m")),
+            return_exceptions=True,
+        )
+        await asyncio.sleep(0.02)
+        upstream.release.set()
+
+        errors = await results
+        assert all(isinstance(e, RuntimeError) for e in errors)
+        assert upstream.stream_calls == 1
+
+    def test_sessions_in_different_threads_share_flight(self):
+        """Test coalescing across threads, each running its own event loop."""
+        upstream = FakeClient()
+        results = []
+
+        def session():
+            client = SingleFlightClient(upstream)
+            results.append(asyncio.run(collect(client.gen_stream("P", model="m"))))
+
+        threads = [threading.Thread(target=session) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        assert upstream.first_chunk_sent.wait(timeout=5)
+        (flight,) = SingleFlightClient._flights.values()
+        deadline = time.monotonic() + 5
+        while flight._subscribers < 3 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        upstream.release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert results == [["a", "b", "c"]] * 3
+        assert upstream.stream_calls == 1
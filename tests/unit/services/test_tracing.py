@@ -0,0 +1,157 @@
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+
+import pytest
+
+from src.services.metrics import metrics
+from src.services.tracing import (
+    JsonLogFormatter,
+    Tracer,
+    current_trace_id,
+    set_span_attribute,
+)
+
+
+@pytest.fixture
+def tracer() -> Tracer:
+    return Tracer()
+
+
+class TestTracer:
+    def test_nested_spans_share_trace_id(self, tracer):
+        """Test that child spans carry the trace id and their parent's span id."""
+        with tracer.trace("question", trace_id="abc") as root:
+            assert current_trace_id() == "abc"
+            with tracer.span("search") as child:
+                pass
+
+        assert child.trace_id == root.trace_id == "abc"
+        assert child.parent_id == root.span_id
+        assert root.parent_id is None
+        assert current_trace_id() is None
+        assert [span.name for span in tracer.recent_spans("abc")] == [
+            "search",
+            "question",
+        ]
+
+    def test_span_duration_is_observed(self, tracer):
+        """Test that every finished span is recorded in the histogram."""
+        before = metrics.get_histogram("span_duration_seconds", span="unit-test-span")
+        count = before.count if before else 0
+
+        with tracer.span("unit-test-span"):
+            pass
+
+        histogram = metrics.get_histogram(
+            "span_duration_seconds", span="unit-test-span"
+        )
+        assert histogram.count == count + 1
+
+    def test_span_records_error(self, tracer):
+        """Test that an exception marks the span as failed and is re-raised."""
+        with pytest.raises(ValueError):
+            with tracer.span("scrape"):
+                raise ValueError("boom")
+
+        span = tracer.recent_spans()[-1]
+        assert span.status == "error"
+        assert span.attributes["error"] == "ValueError: boom"
+
+    def test_traced_function_and_coroutine(self, tracer):
+        """Test that the decorator records sync and async calls."""
+
+        @tracer.traced("sync_step")
+        def sync_step():
+            set_span_attribute("items", 3)
+            return 1
+
+        @tracer.traced("async_step")
+        async def async_step():
+            return 2
+
+        with tracer.trace("job", trace_id="t1"):
+            assert sync_step() == 1
+            assert asyncio.run(async_step()) == 2
+
+        spans = {span.name: span for span in tracer.recent_spans("t1")}
+        assert spans["sync_step"].attributes == {"items": 3}
+        assert spans["async_step"].parent_id == spans["job"].span_id
+
+    def test_traced_async_generator_does_not_leak_span(self, tracer):
+        """Test that a traced async generator is the current span only while it runs."""
+
+        @tracer.traced("stream")
+        async def stream():
+            for i in range(3):
+                set_span_attribute("last", i)
+                yield i
+
+        async def consume():
+            items = []
+            async for item in stream():
+                with tracer.span("render") as render:
+                    items.append(item)
+            return items, render
+
+        with tracer.trace("question", trace_id="t2") as root:
+            items, render = asyncio.run(consume())
+
+        spans = {span.name: span for span in tracer.recent_spans("t2")}
+        assert items == [0, 1, 2]
+        assert spans["stream"].attributes == {"last": 2}
+        # 利用側のスパンは生成器ではなくルートの子になる
+        assert render.parent_id == root.span_id
+
+    def test_trace_follows_copied_context_into_threads(self, tracer):
+        """Test that worker threads started with a copied context join the trace."""
+        spans = []
+
+        def work():
+            with tracer.span("embed") as span:
+                spans.append(span)
+
+        with tracer.trace("ingestion", trace_id="job-1"):
+            thread = threading.Thread(
+                target=contextvars.copy_context().run, args=(work,)
+            )
+            thread.start()
+            thread.join()
+
+        assert spans[0].trace_id == "job-1"
+
+
+class TestJsonLogFormatter:
+    def test_includes_trace_id_of_active_trace(self, tracer):
+        """Test that records logged inside a trace carry its correlation id."""
+        record = logging.LogRecord(
+            "src.test", logging.INFO, __file__, 1, "hello", None, None
+        )
+
+        with tracer.trace("question", trace_id="abc"):
+            entry = json.loads(JsonLogFormatter().format(record))
+
+        assert entry["message"] == "hello"
+        assert entry["trace_id"] == "abc"
+        assert "span_id" in entry
+
+    def test_span_records_carry_span_fields(self, tracer):
+        """Test that finished spans are logged with their structured fields."""
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        span_logger = logging.getLogger("gist.trace")
+        span_logger.addHandler(handler)
+        span_logger.setLevel(logging.INFO)
+        try:
+            with tracer.span("search", chunks=4):
+                pass
+        finally:
+            span_logger.removeHandler(handler)
+
+        entry = json.loads(JsonLogFormatter().format(records[-1]))
+        assert entry["span"] == "search"
+        assert entry["chunks"] == 4
+        assert entry["duration_ms"] >= 0
@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+from src.services.metrics import metrics
+from src.services.warmup import Warmup, warm_up_steps
+
+
+@pytest.fixture
+def warmup() -> Warmup:
+    return Warmup()
+
+
+class TestWarmup:
+    def test_ready_only_after_all_steps(self, warmup):
+        """Test that readiness flips once every step has run, in order."""
+        release = threading.Event()
+        calls = []
+
+        assert warmup.start(
+            [
+                ("first", lambda: calls.append("first")),
+                ("second", lambda: (release.wait(1), calls.append("second"))),
+            ]
+        )
+
+        assert not warmup.is_ready
+        release.set()
+        assert warmup.wait(timeout=1)
+        assert calls == ["first", "second"]
+        assert metrics.get_gauge("server_ready") == 1
+
+    def test_starts_once_per_process(self, warmup):
+        """Test that a second start() is ignored."""
+        calls = []
+
+        assert warmup.start([("step", lambda: calls.append(1))])
+        assert not warmup.start([("step", lambda: calls.append(2))])
+
+        warmup.wait(timeout=1)
+        assert calls == [1]
+
+    def test_records_step_timings(self, warmup):
+        """Test that the duration of each step and of the cold start is recorded."""
+        warmup.start([("encoder", lambda: None), ("llm:qwen3", lambda: None)])
+        warmup.wait(timeout=1)
+
+        assert set(warmup.timings) == {"encoder", "llm:qwen3"}
+        assert metrics.get_gauge("warmup_step_seconds", step="encoder") is not None
+        assert metrics.get_gauge("cold_start_seconds") is not None
+
+    def test_failing_step_does_not_block_readiness(self, warmup):
+        """Test that an unreachable backend is logged and the server still gets ready."""
+
+        def fail():
+            raise ConnectionError("backend down")
+
+        warmup.start([("llm:qwen3", fail), ("after", lambda: None)])
+
+        assert warmup.wait(timeout=1)
+        assert warmup.errors == {"llm:qwen3": "backend down"}
+        assert "after" in warmup.timings
+        assert metrics.get_counter("warmup_failures_total", step="llm:qwen3") >= 1
+
+    def test_writes_readiness_file_when_ready(self, warmup, tmp_path):
+        """Test that a stale readiness file is replaced only when warm-up is done."""
+        readiness_file = tmp_path / "ready"
+        readiness_file.write_text("stale")
+        release = threading.Event()
+
+        warmup.start([("step", lambda: release.wait(1))], str(readiness_file))
+
+        assert not readiness_file.exists()
+        release.set()
+        warmup.wait(timeout=1)
+        assert readiness_file.exists()
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.append(texts)
+
+
+class FakeClient:
+    def __init__(self):
+        self.models = []
+
+    async def gen_batch(self, prompt, model=None):
+        self.models.append(model)
+        return "ok"
+
+
+class TestWarmUpSteps:
+    def test_loads_encoder_and_each_model_once(self):
+        """Test that the app's steps warm the encoder and every distinct LLM."""
+        encoder, client = FakeEncoder(), FakeClient()
+
+        steps = warm_up_steps(client, lambda: encoder, ["small", "small", "large"], 5)
+
+        assert [name for name, _ in steps] == [
+            "imports",
+            "encoder",
+            "llm:small",
+            "llm:large",
+        ]
+        for name, step in steps:
+            if name != "imports":
+                step()
+        assert encoder.encoded == [["warm-up"]]
+        assert client.models == ["small", "large"]